@@ -1,3 +1,4 @@
+from core.admin import ReplicaChangeListMixin
 from django.contrib import admin
 
 from .models import TelegramUser
@@ -5,7 +6,7 @@ from .models import TelegramUser
 
 # Register your models here.
 @admin.register(TelegramUser)
-class TelegramUserAdmin(admin.ModelAdmin):
+class TelegramUserAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "user",
@@ -1,17 +1,38 @@
 import logging
-from typing import Optional
+from typing import Any, Optional
 
+from aiogram import Bot
+from aiogram.methods import TelegramMethod
 from aiogram.types import Update
 from aiogram.dispatcher.event.bases import UNHANDLED, REJECTED
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from ninja import Header, NinjaAPI
 from pydantic import ValidationError
 
 from .bot import bot, dp
+from .metrics import webhook_replies_total
+from .queue import update_queue
 
 logger = logging.getLogger(__name__)
 
+
+def webhook_reply(bot: Bot, method: TelegramMethod) -> dict[str, Any] | None:
+    """
+    Body of a webhook response making the method call, or None if the method
+    uploads files, which can't be sent this way.
+    """
+    files: dict[str, Any] = {}
+    payload = {"method": method.__api_method__}
+    for key, value in method.model_dump(warnings=False).items():
+        value = bot.session.prepare_value(
+            value, bot=bot, files=files, _dumps_json=False
+        )
+        if value is not None:
+            payload[key] = value
+    return None if files else payload
+
+
 api = NinjaAPI(
     openapi_url=None,
     docs_url=None,
@@ -30,6 +51,12 @@ async def index(
 
     try:
         update = Update.model_validate_json(request.body)
+        if update_queue.enabled:
+            # Telegram retries non-2xx responses with a backoff
+            if not update_queue.put(update):
+                return HttpResponse("", status=503)
+            return HttpResponse("", status=200)
+
         response = await dp.feed_update(bot, update)
         if response is UNHANDLED:
             logger.warning("Unhandled update: %s", update)
@@ -39,7 +66,18 @@ async def index(
             logger.warning("Rejected update: %s", update)
             return HttpResponse("", status=200)
 
-        return response
+        if isinstance(response, TelegramMethod):
+            # A single reply returned by the handler rides on the webhook
+            # response instead of a separate Bot API request
+            payload = (
+                webhook_reply(bot, response) if settings.BOT_WEBHOOK_REPLY else None
+            )
+            if payload is not None:
+                webhook_replies_total.inc(response.__api_method__)
+                return JsonResponse(payload)
+            await bot(response)
+
+        return HttpResponse("", status=200)
     except ValidationError as e:
         logger.error("Invalid request", exc_info=True)
         return HttpResponse(e.json(), status=400, content_type="application/json")
@@ -6,3 +6,13 @@ app_name = "bot"
 class BotConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "bot"
+
+    def ready(self):
+        from core.db import db_executor
+        from core.lifespan import on_shutdown
+
+        from . import signals  # noqa: F401
+        from .queue import update_queue
+
+        on_shutdown(update_queue.shutdown)
+        on_shutdown(db_executor.shutdown)
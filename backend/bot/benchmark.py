@@ -0,0 +1,496 @@
+import asyncio
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+from catalogs.cache import bump_catalog_version, catalog_cache
+from catalogs.models import (
+    Operation,
+    PlantOperation,
+    PlantStep,
+    PlantType,
+    PlantVariety,
+    Step,
+)
+from catalogs.periods import ROMAN_MONTHS
+from core.db import track_queries
+from diary.models import Plant, PlantEvent, Profile, SeedStock
+from diary.schedule import chunked, rebuild_schedule
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max
+
+from .fakes import RecordingSession, make_message_update, next_update_id
+from .models import TelegramUser
+
+logger = logging.getLogger(__name__)
+
+# Generated Telegram IDs start here to stay clear of real ones.
+TELEGRAM_ID_BASE = 9_000_000_000
+
+COMMANDS = (
+    "/start",
+    "/myplants",
+    "/today",
+    "/seeds",
+    "/planting",
+    "/addseeds",
+    "/plant",
+)
+
+CROPS = (
+    "Tomato",
+    "Pepper",
+    "Cucumber",
+    "Eggplant",
+    "Cabbage",
+    "Zucchini",
+    "Pumpkin",
+    "Basil",
+    "Lettuce",
+    "Onion",
+    "Garlic",
+    "Strawberry",
+)
+
+TIMEZONES = ("Europe/Moscow", "Asia/Yekaterinburg", "Europe/Berlin", None)
+
+BATCH_SIZE = 2000
+
+ROMAN_BY_MONTH = {number: roman for roman, number in ROMAN_MONTHS.items()}
+
+
+@dataclass(frozen=True)
+class DatasetScale:
+    users: int
+    plants_per_user: int
+    seed_stocks_per_user: int = 5
+    plant_types: int = 12
+    varieties_per_type: int = 4
+
+    @classmethod
+    def parse(cls, value: str) -> "DatasetScale":
+        """Parse a `<users>x<plants per user>` scale such as `100x50`."""
+        users, plants = value.lower().split("x")
+        return cls(users=int(users), plants_per_user=int(plants))
+
+    def __str__(self):
+        return f"{self.users}x{self.plants_per_user}"
+
+
+def _random_period(rng: random.Random, month: int, months: int) -> str:
+    start_day = rng.randint(1, 28)
+    end_month = (month + months - 1) % 12 + 1
+    return (
+        f"{start_day:02d}.{ROMAN_BY_MONTH[month]}-"
+        f"{rng.randint(1, 28):02d}.{ROMAN_BY_MONTH[end_month]}"
+    )
+
+
+def _generate_catalog(
+    scale: DatasetScale, prefix: str, rng: random.Random
+) -> list[PlantType]:
+    plant_types = []
+    for i in range(scale.plant_types):
+        crop = CROPS[i % len(CROPS)]
+        sowing_month = rng.randint(1, 12)
+        # save() keeps the parsed period columns in sync, bulk_create would not
+        plant_type = PlantType(
+            slug=f"{prefix}-{crop.lower()}-{i}",
+            name=f"{crop} {i}",
+            description=f"Synthetic {crop.lower()}",
+            sowing_period=_random_period(rng, sowing_month, 1),
+            planting_period=_random_period(rng, (sowing_month + 1) % 12 + 1, 2),
+            duration_days=rng.randint(60, 150),
+        )
+        plant_type.save()
+        plant_types.append(plant_type)
+
+        for j in range(scale.varieties_per_type):
+            PlantVariety(
+                type=plant_type,
+                slug=f"variety-{j}",
+                name=f"Variety {j}",
+                description="",
+                duration_days=plant_type.duration_days + rng.randint(-20, 20),
+            ).save()
+
+    PlantStep.objects.bulk_create(
+        PlantStep(plant_type=t, step=step, description=f"{step.label} {t.name}")
+        for t in plant_types
+        for step in Step
+    )
+    PlantOperation.objects.bulk_create(
+        PlantOperation(plant_type=t, description="", **rule)
+        for t in plant_types
+        for rule in (
+            dict(
+                operation=Operation.WATERING,
+                since_step=Step.SOWING,
+                until_step=Step.PLANTING,
+                interval_days=2,
+            ),
+            dict(
+                operation=Operation.WATERING,
+                since_step=Step.PLANTING,
+                until_step=Step.HARVESTING,
+                delay_days=1,
+                interval_days=3,
+            ),
+            dict(
+                operation=Operation.FERTILIZING,
+                since_step=Step.PLANTING,
+                until_step=Step.HARVESTING,
+                delay_days=14,
+                interval_days=14,
+                duration_days=60,
+            ),
+            dict(
+                operation=Operation.HARDENING,
+                since_step=Step.PLANTING_PREPARATION,
+                until_step=Step.PLANTING,
+                interval_days=1,
+                duration_days=10,
+            ),
+        )
+    )
+    return plant_types
+
+
+def _generate_events(
+    plant_ids: list[tuple[int, int]],
+    steps_by_type: dict[int, list[PlantStep]],
+    rng: random.Random,
+) -> list[PlantEvent]:
+    today = date.today()
+    events = []
+    for plant_id, type_id in plant_ids:
+        steps = steps_by_type[type_id]
+        day = today - timedelta(days=rng.randint(0, 150))
+        for step in steps[: rng.randint(0, len(steps))]:
+            if day > today:
+                break
+            events.append(PlantEvent(plant_id=plant_id, step=step, date=day))
+            day += timedelta(days=rng.randint(3, 20))
+    return events
+
+
+def generate_dataset(
+    scale: DatasetScale, *, prefix: str = "bench", seed: int = 0
+) -> dict[str, int]:
+    """
+    Create a synthetic catalog, users with profiles and Telegram accounts,
+    plants with event histories and seed stocks. Returns created row counts.
+    """
+    rng = random.Random(seed)
+    UserModel = get_user_model()
+    last_tg_id = TelegramUser.objects.filter(id__gte=TELEGRAM_ID_BASE).aggregate(
+        last=Max("id")
+    )["last"]
+    first_tg_id = TELEGRAM_ID_BASE if last_tg_id is None else last_tg_id + 1
+
+    with transaction.atomic():
+        plant_types = _generate_catalog(scale, prefix, rng)
+        varieties = list(
+            PlantVariety.objects.filter(type__in=plant_types).select_related("type")
+        )
+        steps_by_type: dict[int, list[PlantStep]] = {}
+        for step in PlantStep.objects.filter(plant_type__in=plant_types).order_by(
+            "step"
+        ):
+            steps_by_type.setdefault(step.plant_type_id, []).append(step)
+
+        usernames = [f"{prefix}{first_tg_id + i}" for i in range(scale.users)]
+        UserModel.objects.bulk_create(
+            (
+                UserModel(username=name, first_name=name, password="!")
+                for name in usernames
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        users = list(UserModel.objects.filter(username__in=usernames).order_by("pk"))
+        TelegramUser.objects.bulk_create(
+            (
+                TelegramUser(
+                    id=first_tg_id + i,
+                    user=user,
+                    username=user.username,
+                    first_name=user.first_name,
+                    language_code="ru",
+                )
+                for i, user in enumerate(users)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Profile.objects.bulk_create(
+            (Profile(user=user, timezone=rng.choice(TIMEZONES)) for user in users),
+            batch_size=BATCH_SIZE,
+        )
+
+        Plant.objects.bulk_create(
+            (
+                Plant(
+                    user=user,
+                    type_id=variety.type_id,
+                    variety=variety,
+                    name=f"{variety.type.name} {variety.name} #{j}",
+                )
+                for user in users
+                for j, variety in enumerate(
+                    rng.choices(varieties, k=scale.plants_per_user)
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        plants = Plant.objects.filter(user__in=users)
+        plant_ids = list(plants.order_by("pk").values_list("pk", "type_id"))
+        events = _generate_events(plant_ids, steps_by_type, rng)
+        PlantEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+
+        SeedStock.objects.bulk_create(
+            (
+                SeedStock(
+                    user=user,
+                    type_id=variety.type_id,
+                    variety=variety,
+                    quantity=rng.randint(5, 50),
+                )
+                for user in users
+                for variety in rng.sample(
+                    varieties, k=min(scale.seed_stocks_per_user, len(varieties))
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        # bulk_create skips the signals maintaining the denormalized data
+        plants.update_current_steps()
+        for chunk in chunked(plants.order_by("pk"), 500):
+            rebuild_schedule(chunk)
+
+        transaction.on_commit(bump_catalog_version)
+    catalog_cache.invalidate()
+
+    return {
+        "plant_types": len(plant_types),
+        "varieties": len(varieties),
+        "users": len(users),
+        "plants": len(plant_ids),
+        "events": len(events),
+        "seed_stocks": len(users) * min(scale.seed_stocks_per_user, len(varieties)),
+    }
+
+
+def delete_dataset(prefix: str = "bench"):
+    """Delete everything created by `generate_dataset` with the same prefix."""
+    users = get_user_model().objects.filter(
+        telegramuser__id__gte=TELEGRAM_ID_BASE, username__startswith=prefix
+    )
+    plant_types = PlantType.objects.filter(slug__startswith=f"{prefix}-")
+    with transaction.atomic():
+        Plant.objects.filter(user__in=users).delete()
+        Plant.objects.filter(type__in=plant_types).delete()
+        SeedStock.objects.filter(type__in=plant_types).delete()
+        users.delete()
+        PlantOperation.objects.filter(plant_type__in=plant_types).delete()
+        PlantVariety.objects.filter(type__in=plant_types).delete()
+        plant_types.delete()
+
+
+@dataclass
+class BenchUser:
+    telegram_id: int
+    username: str
+    type_slug: str
+    variety_slug: str
+    seed_stock_ids: list[int] = field(default_factory=list)
+
+
+def load_bench_users(prefix: str = "bench", limit: int = 20) -> list[BenchUser]:
+    bench_users = []
+    tg_users = TelegramUser.objects.filter(
+        id__gte=TELEGRAM_ID_BASE, username__startswith=prefix
+    ).order_by("id")[:limit]
+    for tg_user in tg_users:
+        stocks = list(
+            SeedStock.objects.filter(user_id=tg_user.user_id).select_related(
+                "type", "variety"
+            )
+        )
+        if not stocks:
+            continue
+        bench_users.append(
+            BenchUser(
+                telegram_id=tg_user.id,
+                username=tg_user.username,
+                type_slug=stocks[0].type.slug,
+                variety_slug=stocks[0].variety.slug,
+                seed_stock_ids=[s.pk for s in stocks],
+            )
+        )
+    return bench_users
+
+
+def command_text(command: str, user: BenchUser, iteration: int) -> str:
+    if command == "/addseeds":
+        return f"/addseeds {user.type_slug} 1 {user.variety_slug}"
+    if command == "/plant":
+        return f"/plant {user.seed_stock_ids[iteration % len(user.seed_stock_ids)]}"
+    return command
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Linearly interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(statistics.fmean(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+class BotBenchmark:
+    """Feeds synthetic updates through the dispatcher and measures each command."""
+
+    def __init__(self, users: list[BenchUser], *, api_latency: float = 0.0):
+        from .bot import dp
+
+        if not users:
+            raise ValueError("No benchmark users, generate a dataset first")
+
+        self.dp = dp
+        self.users = users
+        self.session = RecordingSession(latency=api_latency)
+        self.bot = Bot(
+            token=settings.BOT_TOKEN,
+            session=self.session,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+
+    def make_update(self, command: str, iteration: int) -> Update:
+        user = self.users[iteration % len(self.users)]
+        data = make_message_update(
+            next_update_id(),
+            user.telegram_id,
+            command_text(command, user, iteration // len(self.users)),
+            username=user.username,
+        )
+        return Update.model_validate(data, context={"bot": self.bot})
+
+    async def feed(self, command: str, iteration: int) -> bool:
+        try:
+            result = await self.dp.feed_update(
+                self.bot, self.make_update(command, iteration)
+            )
+            # Replies returned by handlers are sent as in polling mode
+            if isinstance(result, TelegramMethod):
+                await self.bot(result)
+        except Exception:
+            logger.debug("Benchmark update for %s failed", command, exc_info=True)
+            return False
+        return True
+
+    async def run_command(
+        self, command: str, iterations: int, memory_iterations: int = 0
+    ) -> dict[str, Any]:
+        latencies, query_counts, api_calls = [], [], []
+        queries_by_alias = Counter()
+        errors = 0
+
+        for i in range(iterations):
+            calls_before = len(self.session.calls)
+            with track_queries() as queries:
+                start = time.perf_counter()
+                ok = await self.feed(command, i)
+                latencies.append((time.perf_counter() - start) * 1000)
+            errors += not ok
+            query_counts.append(queries.count)
+            queries_by_alias.update(queries.by_alias)
+            api_calls.append(len(self.session.calls) - calls_before)
+
+        result = {
+            "iterations": iterations,
+            "errors": errors,
+            "latency_ms": summarize(latencies),
+            "queries": summarize(query_counts),
+            "queries_by_alias": dict(queries_by_alias),
+            "bot_api_calls": summarize(api_calls),
+        }
+
+        if memory_iterations:
+            # Traced separately as tracemalloc slows down every allocation
+            peaks = []
+            tracemalloc.start()
+            try:
+                for i in range(memory_iterations):
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    await self.feed(command, iterations + i)
+                    peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+            finally:
+                tracemalloc.stop()
+            result["peak_memory_kb"] = summarize(peaks)
+
+        return result
+
+    async def run_concurrent(
+        self, commands: tuple[str, ...], updates: int, concurrency: int
+    ) -> dict[str, Any]:
+        """Feed `updates` updates cycling through `commands`, `concurrency` at a time."""
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def feed(i: int) -> bool:
+            async with semaphore:
+                start = time.perf_counter()
+                ok = await self.feed(commands[i % len(commands)], i)
+                latencies.append((time.perf_counter() - start) * 1000)
+                return ok
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(feed(i) for i in range(updates)))
+        duration = time.perf_counter() - start
+        return {
+            "updates": updates,
+            "errors": results.count(False),
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(updates / duration, 2),
+            "latency_ms": summarize(latencies),
+        }
+
+    async def run(
+        self,
+        commands: tuple[str, ...] = COMMANDS,
+        iterations: int = 50,
+        memory_iterations: int = 10,
+    ) -> dict[str, dict[str, Any]]:
+        try:
+            return {
+                command: await self.run_command(command, iterations, memory_iterations)
+                for command in commands
+            }
+        finally:
+            await self.bot.session.close()
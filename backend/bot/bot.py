@@ -2,18 +2,28 @@ import logging
 
 from aiogram import Bot, Dispatcher, html
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.filters.command import Command, CommandStart
-from aiogram.types import Message
-from catalogs.models import PlantType, PlantVariety
-from diary.models import Plant, SeedStock
+from aiogram.types import Message, User
+from catalogs.cache import catalog_cache
+from catalogs.models import PlantType, PlantVariety, Step
+from core.db import db_executor, run_in_db
+from core.routers import read_only
+from diary.context import diary_context_cache
+from diary.models import Plant, ScheduledOperation, SeedStock
+from diary.schedule import get_scheduled_operations_at_date
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import F
 from django.db.utils import IntegrityError
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .dedup import update_deduplication
+from .metrics import BotAPIMetricsMiddleware, UpdateMetricsMiddleware
 from .middlewares import UserMiddleware
 from .models import TelegramUser
 
@@ -22,50 +32,71 @@ logger = logging.getLogger(__name__)
 
 dp = Dispatcher()
 bot = Bot(
-    token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    token=settings.BOT_TOKEN,
+    session=(
+        AiohttpSession(api=TelegramAPIServer.from_base(settings.BOT_API_SERVER))
+        if settings.BOT_API_SERVER
+        else None
+    ),
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
 )
 logger.info("Telegram bot initialized")
 
+dp.update.outer_middleware(update_deduplication)
+dp.update.outer_middleware(UpdateMetricsMiddleware(dp))
 dp.message.middleware(UserMiddleware())
+bot.session.middleware(BotAPIMetricsMiddleware())
 
 
-@dp.message(CommandStart())
-async def start(message: Message) -> None:
-    if not message.from_user:
-        logger.warning("Received message without user information")
-        return
-
-    new_account = False
+def _create_account(from_user: User) -> tuple[TelegramUser, bool]:
+    """The Telegram user of `from_user`, and whether it was created."""
+    base_username = from_user.username or f"tg{from_user.id}"
+    username = base_username
+    suffix = 1
     try:
-        tg_user = await TelegramUser.objects.aget(id=message.from_user.id)
-        logger.info("Existing user %s started the bot", str(tg_user))
-    except TelegramUser.DoesNotExist:
-        logger.info("Creating new user for Telegram ID: %s", str(message.from_user.id))
-        try:
-            base_username = message.from_user.username or f"tg{message.from_user.id}"
-            username = base_username
-            suffix = 1
+        with transaction.atomic():
             while True:
                 try:
-                    user = await get_user_model().objects.acreate(
-                        username=username,
-                        first_name=message.from_user.first_name,
-                        last_name=message.from_user.last_name or "",
-                    )
+                    with transaction.atomic():
+                        user = get_user_model().objects.create(
+                            username=username,
+                            first_name=from_user.first_name,
+                            last_name=from_user.last_name or "",
+                        )
                     break
                 except IntegrityError:
                     username = f"{base_username}{suffix}"
                     suffix += 1
-            tg_user = await TelegramUser.objects.acreate(
-                id=message.from_user.id,
+            tg_user = TelegramUser.objects.create(
+                id=from_user.id,
                 user=user,
                 username=username,
-                first_name=message.from_user.first_name,
-                last_name=message.from_user.last_name,
-                language_code=message.from_user.language_code,
+                first_name=from_user.first_name,
+                last_name=from_user.last_name,
+                language_code=from_user.language_code,
             )
-            new_account = True
-            logger.info("Created new user %s", str(tg_user))
+    except IntegrityError:
+        # Registered by another worker in the meantime, the user created
+        # above is rolled back
+        return TelegramUser.objects.select_related("user").get(id=from_user.id), False
+    return tg_user, True
+
+
+@dp.message(CommandStart())
+async def start(message: Message, tg_user: TelegramUser | None = None) -> None:
+    if not message.from_user:
+        logger.warning("Received message without user information")
+        return
+
+    new_account = False
+    if tg_user:
+        logger.info("Existing user %s started the bot", str(tg_user))
+    else:
+        logger.info("Creating new user for Telegram ID: %s", str(message.from_user.id))
+        try:
+            tg_user, new_account = await run_in_db(_create_account, message.from_user)
+            if new_account:
+                logger.info("Created new user %s", str(tg_user))
         except Exception as e:
             logger.error("Failed to create user: %s", str(e), exc_info=True)
             await message.answer(
@@ -90,27 +121,40 @@ async def start(message: Message) -> None:
 
 
 @dp.message(Command("myplants"))
+@read_only
 async def myplants(message: Message):
     if not message.from_user:
         logger.warning("Received message without user information")
         return
 
-    answer = _("Your plants:") + "\n\n"
+    answer = _("Your plants:") + "\n"
 
     plants_found = False
-    async for plants in Plant.objects.filter(
-        user__telegramuser__id=message.from_user.id
-    ):
-        answer += f"🌱 {plants.name}\n"
+    current_step = None
+    plants = await db_executor.run(
+        list,
+        Plant.objects.filter(user__telegramuser__id=message.from_user.id).order_by(
+            F("current_step").asc(nulls_first=True), "name"
+        ),
+    )
+    for plant in plants:
+        if not plants_found or plant.current_step != current_step:
+            current_step = plant.current_step
+            step_name = (
+                Step(current_step).label if current_step else _("Not started yet")
+            )
+            answer += f"\n<b>{step_name}</b>\n"
+        answer += f"🌱 {plant.name}\n"
         plants_found = True
 
     if not plants_found:
         answer = _("You don't have any plants yet.")
 
-    await message.answer(str(answer))
+    return message.answer(str(answer))
 
 
 @dp.message(Command("today"))
+@read_only
 async def today(message: Message):
     if not message.from_user:
         logger.warning("Received message without user information")
@@ -118,16 +162,14 @@ async def today(message: Message):
 
     answer = _("Tasks for today:") + "\n\n"
 
-    tasks_found = False
-    async for plant in Plant.objects.filter(
-        user__telegramuser__id=message.from_user.id
-    ):
-        operations = [
-            o async for o in plant.aget_operations_at_date(timezone.localdate())
-        ]
-        if len(operations) == 0:
-            continue
+    tasks = await db_executor.run(
+        get_scheduled_operations_at_date,
+        ScheduledOperation.objects.filter(user__telegramuser__id=message.from_user.id),
+        timezone.localdate(),
+    )
 
+    tasks_found = False
+    for plant, operations in tasks:
         tasks_found = True
         answer += f"<b>{plant}:</b>\n"
         for o in operations:
@@ -137,10 +179,11 @@ async def today(message: Message):
     if not tasks_found:
         answer = _("No tasks scheduled for today! 🌱")
 
-    await message.answer(str(answer))
+    return message.answer(str(answer))
 
 
 @dp.message(Command("seeds"))
+@read_only
 async def seeds(message: Message):
     if not message.from_user:
         logger.warning("Received message without user information")
@@ -157,7 +200,7 @@ async def seeds(message: Message):
         .order_by("type__name", "variety__name")
     )
 
-    async for stock in stocks:
+    for stock in await db_executor.run(list, stocks):
         found = True
         plant_name = stock.type.name
         if stock.variety:
@@ -172,82 +215,84 @@ async def seeds(message: Message):
         )
         answer += "\n" + html.quote(_("Use /plant <seed_stock_id> to plant one seed."))
 
-    await message.answer(str(answer))
+    return message.answer(str(answer))
+
+
+def _add_to_stock(
+    user_id: int, plant_type: PlantType, variety: PlantVariety, quantity: int
+) -> SeedStock:
+    stock_qs = SeedStock.objects.filter(
+        user_id=user_id,
+        type=plant_type,
+        variety=variety,
+    )
+    updated = stock_qs.update(quantity=F("quantity") + quantity)
+
+    if updated == 0:
+        try:
+            with transaction.atomic():
+                SeedStock.objects.create(
+                    user_id=user_id,
+                    type=plant_type,
+                    variety=variety,
+                    quantity=quantity,
+                )
+        except IntegrityError:
+            # Row was inserted concurrently; apply increment to the existing row.
+            stock_qs.update(quantity=F("quantity") + quantity)
+
+    # update() sends no signals to drop the cached diary context
+    diary_context_cache.invalidate_on_commit(user_id)
+    return stock_qs.select_related("type", "variety").get()
 
 
 @dp.message(Command("addseeds"))
-async def add_seeds(message: Message):
+async def add_seeds(message: Message, tg_user: TelegramUser | None = None):
     if not message.from_user:
         logger.warning("Received message without user information")
         return
 
     parts = (message.text or "").split()
     if len(parts) != 4 or not parts[2].isdigit():
-        await message.answer(
+        return message.answer(
             html.quote(str(_("Usage: /addseeds <type_slug> <quantity> <variety_slug>")))
         )
-        return
 
     type_slug = parts[1].strip().lower()
     quantity = int(parts[2].strip())
     variety_slug = parts[3].strip().lower()
 
     if quantity <= 0:
-        await message.answer(html.quote(str(_("Quantity must be greater than 0."))))
-        return
+        return message.answer(html.quote(str(_("Quantity must be greater than 0."))))
 
-    try:
-        plant_type = await PlantType.objects.aget(slug=type_slug)
-    except PlantType.DoesNotExist:
-        await message.answer(html.quote(str(_("Plant type not found."))))
-        return
+    catalog = await catalog_cache.aget()
 
-    try:
-        variety = await PlantVariety.objects.aget(type=plant_type, slug=variety_slug)
-    except PlantVariety.DoesNotExist:
-        await message.answer(
+    plant_type = catalog.get_type(type_slug)
+    if plant_type is None:
+        return message.answer(html.quote(str(_("Plant type not found."))))
+
+    variety = catalog.get_variety(plant_type, variety_slug)
+    if variety is None:
+        return message.answer(
             html.quote(str(_("Plant variety not found for this type.")))
         )
-        return
 
-    try:
-        tg_user = await TelegramUser.objects.select_related("user").aget(
-            id=message.from_user.id
-        )
-    except TelegramUser.DoesNotExist:
-        await message.answer(
+    if not tg_user:
+        return message.answer(
             html.quote(
                 str(_("You must be registered to use this command. Use /start."))
             )
         )
-        return
 
-    stock_qs = SeedStock.objects.filter(
-        user=tg_user.user,
-        type=plant_type,
-        variety=variety,
+    stock = await run_in_db(
+        _add_to_stock, tg_user.user_id, plant_type, variety, quantity
     )
-    updated = await stock_qs.aupdate(quantity=F("quantity") + quantity)
-
-    if updated == 0:
-        try:
-            await SeedStock.objects.acreate(
-                user=tg_user.user,
-                type=plant_type,
-                variety=variety,
-                quantity=quantity,
-            )
-        except IntegrityError:
-            # Row was inserted concurrently; apply increment to the existing row.
-            await stock_qs.aupdate(quantity=F("quantity") + quantity)
-
-    stock = await stock_qs.select_related("type", "variety").aget()
 
     plant_name = stock.type.name
     if stock.variety:
         plant_name += f" {stock.variety.name}"
 
-    await message.answer(
+    return message.answer(
         html.quote(
             str(
                 _("Added {count} seeds to stock: {plant_name}. Total: {total}.").format(
@@ -260,6 +305,31 @@ async def add_seeds(message: Message):
     )
 
 
+def _plant_from_stock(
+    stock_id: int, telegram_id: int
+) -> tuple[Plant | None, SeedStock]:
+    """Plant one seed, without a plant if the stock is empty."""
+    stock = SeedStock.objects.select_related("type", "variety").get(
+        id=stock_id, user__telegramuser__id=telegram_id
+    )
+
+    # Atomic decrement with quantity check (prevents race conditions)
+    # Replaces non-atomic in-memory decrement to avoid concurrent request corruption
+    # Uses conditional filter + update for database-level atomicity
+    stock_qs = SeedStock.objects.filter(id=stock.id, quantity__gt=0)
+    updated = stock_qs.update(quantity=F("quantity") - 1)
+
+    if updated == 0:
+        return None, stock
+    diary_context_cache.invalidate_on_commit(stock.user_id)
+
+    plant = Plant(user_id=stock.user_id, type=stock.type, variety=stock.variety)
+    plant.save()
+
+    # Refresh stock to get database-updated quantity for response
+    return plant, SeedStock.objects.get(id=stock.id)
+
+
 @dp.message(Command("plant"))
 async def plant_from_seed_stock(message: Message, user):
     if not message.from_user:
@@ -282,29 +352,17 @@ async def plant_from_seed_stock(message: Message, user):
     stock_id = int(parts[1].strip())
 
     try:
-        stock = await SeedStock.objects.select_related("type", "variety").aget(
-            id=stock_id, user__telegramuser__id=message.from_user.id
+        plant, stock = await run_in_db(
+            _plant_from_stock, stock_id, message.from_user.id
         )
     except SeedStock.DoesNotExist:
         await message.answer(html.quote(str(_("Seed stock not found."))))
         return
 
-    # Atomic decrement with quantity check (prevents race conditions)
-    # Replaces non-atomic in-memory decrement to avoid concurrent request corruption
-    # Uses conditional filter + aupdate for database-level atomicity
-    stock_qs = SeedStock.objects.filter(id=stock.id, quantity__gt=0)
-    updated = await stock_qs.aupdate(quantity=F("quantity") - 1)
-
-    if updated == 0:
+    if plant is None:
         await message.answer(html.quote(str(_("This seed stock is empty."))))
         return
 
-    plant = Plant(user=stock.user, type=stock.type, variety=stock.variety)
-    await plant.asave()
-
-    # Refresh stock to get database-updated quantity for response
-    stock = await SeedStock.objects.aget(id=stock.id)
-
     await message.answer(
         html.quote(
             str(
@@ -317,6 +375,7 @@ async def plant_from_seed_stock(message: Message, user):
 
 
 @dp.message(Command("planting"))
+@read_only
 async def planting(message: Message):
     if not message.from_user:
         logger.warning("Received message without user information")
@@ -325,26 +384,13 @@ async def planting(message: Message):
     answer = _("Your plants ready for transplanting:") + "\n"
 
     plants_found = False
-    now = timezone.localdate()
     plants = (
         Plant.objects.filter(user__telegramuser__id=message.from_user.id)
         .select_related("type", "variety")
-        .prefetch_related("events")
-        .all()
+        .in_planting_period(timezone.localdate())
     )
 
-    for plant in sorted(
-        [p async for p in plants],
-        key=lambda p: p.parsed_planting_period[0] if p.parsed_planting_period else now,
-    ):
-        parsed_period = plant.parsed_planting_period
-        if parsed_period is None:
-            continue
-
-        start_date, end_date = parsed_period
-        if now < start_date or end_date < now:
-            continue
-
+    for plant in await db_executor.run(list, plants):
         plants_found = True
         answer += f"\n🌱 {plant.name}\n"
         answer += f"  {_('Planned transplanting period')}: {plant.planting_period}\n"
@@ -0,0 +1,134 @@
+import logging
+import threading
+from collections import deque
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from core.db import db_executor
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .metrics import update_dedup_total
+from .models import ProcessedUpdate
+
+logger = logging.getLogger(__name__)
+
+# Old rows are deleted after this many claims in a process
+PRUNE_EVERY = 1000
+
+
+class RecentIds:
+    """The last `maxsize` IDs added, in a ring buffer indexed by a set."""
+
+    def __init__(self, maxsize: int):
+        self._order: deque[int] = deque(maxlen=maxsize)
+        self._ids: set[int] = set()
+        self._lock = threading.Lock()
+
+    def add(self, value: int) -> bool:
+        """Add `value`, False if it is already present."""
+        with self._lock:
+            if value in self._ids:
+                return False
+            if len(self._order) == self._order.maxlen:
+                self._ids.discard(self._order[0])
+            self._order.append(value)
+            self._ids.add(value)
+            return True
+
+    def discard(self, value: int):
+        with self._lock:
+            self._ids.discard(value)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def _claim_in_db(update_id: int, retention: timedelta, prune: bool) -> bool:
+    try:
+        with transaction.atomic():
+            ProcessedUpdate.objects.create(update_id=update_id)
+    except IntegrityError:
+        return False
+
+    if prune:
+        ProcessedUpdate.objects.filter(
+            created_at__lt=timezone.now() - retention
+        ).delete()
+    return True
+
+
+def _release_in_db(update_id: int):
+    ProcessedUpdate.objects.filter(update_id=update_id).delete()
+
+
+class DeduplicationMiddleware(BaseMiddleware):
+    """
+    Outer update middleware dropping updates whose `update_id` was already
+    handled, as Telegram redelivers updates after slow or failed responses.
+
+    IDs are remembered in memory, and in the `ProcessedUpdate` table shared by
+    all workers with `BOT_UPDATE_DEDUP_DB`. An update whose handler raises is
+    forgotten, so that its redelivery is handled again.
+    """
+
+    def __init__(self):
+        self._recent: RecentIds | None = None
+        self._claims = 0
+
+    @property
+    def recent(self) -> RecentIds:
+        if self._recent is None:
+            self._recent = RecentIds(settings.BOT_UPDATE_DEDUP_SIZE)
+        return self._recent
+
+    async def claim(self, update_id: int) -> bool:
+        if not self.recent.add(update_id):
+            return False
+        if not settings.BOT_UPDATE_DEDUP_DB:
+            return True
+
+        self._claims += 1
+        claimed = await db_executor.run(
+            _claim_in_db,
+            update_id,
+            timedelta(hours=settings.BOT_UPDATE_DEDUP_RETENTION_HOURS),
+            prune=self._claims % PRUNE_EVERY == 0,
+        )
+        # A duplicate stays in memory, another worker handled the update
+        return claimed
+
+    def clear(self):
+        self._recent = None
+
+    async def release(self, update_id: int):
+        self.recent.discard(update_id)
+        if settings.BOT_UPDATE_DEDUP_DB:
+            await db_executor.run(_release_in_db, update_id)
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not settings.BOT_UPDATE_DEDUP_SIZE:
+            return await handler(event, data)
+
+        if not await self.claim(event.update_id):
+            update_dedup_total.inc("duplicate")
+            logger.info("Dropped duplicate update %s", event.update_id)
+            return None
+
+        update_dedup_total.inc("new")
+        try:
+            return await handler(event, data)
+        except Exception:
+            await self.release(event.update_id)
+            raise
+
+
+update_deduplication = DeduplicationMiddleware()
@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections.abc import AsyncGenerator, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiohttp import web
+
+FAKE_BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "Verdiary",
+    "username": "verdiary_bot",
+}
+
+_message_ids = itertools.count(1)
+# Unique across runs, so that generated updates aren't dropped as redeliveries
+_update_ids = itertools.count(int(time.time() * 1000))
+
+
+def next_update_id() -> int:
+    return next(_update_ids)
+
+
+def fake_api_result(method: str, params: dict[str, Any]) -> Any:
+    """Plausible Bot API `result` for the methods used by the bot."""
+    if method == "getMe":
+        return FAKE_BOT_USER
+
+    if method in {"sendMessage", "editMessageText"}:
+        chat_id = params.get("chat_id")
+        return {
+            "message_id": params.get("message_id") or next(_message_ids),
+            "date": int(time.time()),
+            "chat": {
+                "id": int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0,
+                "type": "private",
+            },
+            "from": FAKE_BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    if method == "getUpdates":
+        return []
+
+    if method == "getWebhookInfo":
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+
+    return True
+
+
+def make_message_update(
+    update_id: int,
+    user_id: int,
+    text: str,
+    *,
+    username: str | None = None,
+    first_name: str = "User",
+    language_code: str = "ru",
+) -> dict[str, Any]:
+    """Private chat message update as it is delivered by Telegram."""
+    user = {
+        "id": user_id,
+        "is_bot": False,
+        "first_name": first_name,
+        "language_code": language_code,
+    }
+    if username:
+        user["username"] = username
+
+    message: dict[str, Any] = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": first_name},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+        ]
+
+    return {"update_id": update_id, "message": message}
+
+
+@dataclass
+class RecordedCall:
+    method: str
+    params: dict[str, Any]
+    sent_at: float = field(default_factory=time.perf_counter)
+
+
+class RecordingSession(BaseSession):
+    """
+    In-process stand-in for the Bot API: records outgoing calls and answers
+    them with fake results after an optional artificial latency.
+
+    `getUpdates` returns the updates in `pending` from the requested offset.
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls: list[RecordedCall] = []
+        self.pending: list[dict[str, Any]] = []
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(
+        self,
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+        timeout: int | None = None,
+    ) -> TelegramType:
+        params = {
+            key: self.prepare_value(value, bot=bot, files={}, _dumps_json=False)
+            for key, value in method.model_dump(warnings=False).items()
+        }
+        self.calls.append(RecordedCall(method.__api_method__, params))
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method.__api_method__ == "getUpdates":
+            offset = params.get("offset") or 0
+            self.pending = [u for u in self.pending if u["update_id"] >= offset]
+            result = self.pending[: params.get("limit") or 100]
+        else:
+            result = fake_api_result(method.__api_method__, params)
+
+        content = json.dumps({"ok": True, "result": result})
+        response = self.check_response(
+            bot=bot, method=method, status_code=200, content=content
+        )
+        return response.result  # type: ignore[return-value]
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: dict[str, Any] | None = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+
+class FakeBotAPIServer:
+    """
+    Local HTTP stand-in for the Telegram Bot API. Bots configured with
+    `api_server` (or `BOT_API_SERVER=<url>`) send their calls here instead of
+    Telegram; calls are recorded, passed to listeners and answered with fake
+    results after `latency` plus up to `jitter` seconds.
+    """
+
+    def __init__(
+        self, *, latency: float = 0.0, jitter: float = 0.0, seed: int | None = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: list[RecordedCall] = []
+        self.listeners: list[Callable[[RecordedCall], None]] = []
+        self.url: str | None = None
+        self._rng = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+
+        self.app = web.Application()
+        self.app.router.add_route("*", "/bot{token}/{method}", self.handle)
+
+    @property
+    def api_server(self) -> TelegramAPIServer:
+        if self.url is None:
+            raise RuntimeError("Fake Bot API server is not started")
+        return TelegramAPIServer.from_base(self.url)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        received_at = time.perf_counter()
+        method = request.match_info["method"]
+
+        params: dict[str, Any] = dict(request.query)
+        if request.content_type == "application/json":
+            params.update(await request.json())
+        elif request.body_exists:
+            form = await request.post()
+            # Uploaded files are not needed to build a result
+            params.update((k, v) for k, v in form.items() if isinstance(v, str))
+
+        call = RecordedCall(method, params, received_at)
+        self.calls.append(call)
+        for listener in self.listeners:
+            listener(call)
+
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        return web.json_response(
+            {"ok": True, "result": fake_api_result(method, params)}
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start listening, port 0 picks a free one. Returns the base URL."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.url = f"http://{bound_host}:{bound_port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        self.url = None
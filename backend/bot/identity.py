@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+
+from core.caching import TTLCache
+from core.db import db_executor
+from core.metrics import REGISTRY, Family
+from diary.models import Profile
+from django.conf import settings
+from django.db.utils import IntegrityError
+
+from .models import TelegramUser
+
+
+@dataclass(frozen=True)
+class Identity:
+    tg_user: TelegramUser
+    profile: Profile
+
+    @property
+    def user(self):
+        return self.tg_user.user
+
+
+class IdentityCache:
+    """
+    Per-process cache resolving Telegram IDs to the user, profile and timezone.
+
+    A miss costs a single JOINed query. Entries are dropped by signals when
+    the Telegram user, user or profile is saved in this process; changes made
+    by other processes show up after `BOT_IDENTITY_CACHE_TTL_SECONDS`.
+    Unregistered Telegram IDs are not cached, so that an account created by
+    another process is found straight away.
+    """
+
+    def __init__(self):
+        self._cache: TTLCache | None = None
+
+    @property
+    def cache(self) -> TTLCache:
+        if self._cache is None:
+            self._cache = TTLCache(
+                maxsize=settings.BOT_IDENTITY_CACHE_SIZE,
+                ttl=settings.BOT_IDENTITY_CACHE_TTL_SECONDS,
+            )
+        return self._cache
+
+    async def aget(self, telegram_id: int) -> Identity | None:
+        identity = self.cache.get(telegram_id)
+        if identity is None:
+            identity = await db_executor.run(self._load, telegram_id)
+            if identity is not None:
+                self.cache.set(telegram_id, identity)
+        return identity
+
+    def _load(self, telegram_id: int) -> Identity | None:
+        try:
+            tg_user = TelegramUser.objects.select_related("user", "user__profile").get(
+                id=telegram_id
+            )
+        except TelegramUser.DoesNotExist:
+            return None
+
+        try:
+            profile = tg_user.user.profile
+        except Profile.DoesNotExist:
+            try:
+                profile = Profile.objects.create(user=tg_user.user)
+            except IntegrityError:
+                profile = Profile.objects.get(user=tg_user.user)
+
+        return Identity(tg_user=tg_user, profile=profile)
+
+    def invalidate(self, telegram_id: int):
+        self.cache.delete(telegram_id)
+
+    def invalidate_user(self, user_id: int):
+        for telegram_id in TelegramUser.objects.filter(user_id=user_id).values_list(
+            "id", flat=True
+        ):
+            self.invalidate(telegram_id)
+
+    def clear(self):
+        self.cache.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def _collect_stats() -> list[Family]:
+    stats = identity_cache.cache.stats
+    return [
+        Family(
+            "bot_identity_cache_lookups_total",
+            "counter",
+            "Identity cache lookups.",
+            [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])],
+        ),
+        Family(
+            "bot_identity_cache_size",
+            "gauge",
+            "Identities held in the cache.",
+            [({}, stats["size"])],
+        ),
+    ]
+
+
+REGISTRY.register_collector(_collect_stats)
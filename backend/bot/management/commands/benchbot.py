@@ -0,0 +1,190 @@
+import asyncio
+import json
+import subprocess
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from bot.benchmark import (
+    COMMANDS,
+    BotBenchmark,
+    DatasetScale,
+    generate_dataset,
+    load_bench_users,
+)
+from catalogs.cache import catalog_cache
+from core.db import install_query_tracking
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark bot command handlers with synthetic updates and report "
+        "latency percentiles, query counts and peak memory per command"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            help=(
+                "Comma separated <users>x<plants per user> scales, e.g. 10x10,100x50. "
+                "Each scale is generated in a temporary test database. Without it "
+                "the configured database and a dataset from generatedata are used."
+            ),
+        )
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument(
+            "--users", type=int, default=20, help="Number of users sending updates"
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument(
+            "--memory-iterations",
+            type=int,
+            default=10,
+            help="Iterations traced with tracemalloc, 0 to skip memory measurement",
+        )
+        parser.add_argument(
+            "--api-latency",
+            type=float,
+            default=0.0,
+            help="Artificial Bot API latency in seconds",
+        )
+        parser.add_argument("--commands", help="Comma separated commands to run")
+        parser.add_argument("--output", help="Write JSON results to this file")
+        parser.add_argument("--compare", help="Compare with a previous JSON result")
+
+    def handle(self, *args, **options):
+        commands = COMMANDS
+        if options["commands"]:
+            commands = tuple(c.strip() for c in options["commands"].split(","))
+            unknown = set(commands) - set(COMMANDS)
+            if unknown:
+                raise CommandError(f"Unknown commands: {', '.join(sorted(unknown))}")
+
+        install_query_tracking()
+
+        if options["scales"]:
+            scales = [DatasetScale.parse(s) for s in options["scales"].split(",")]
+            runs = self._run_scales(scales, commands, options)
+        else:
+            runs = [
+                {"scale": None, "commands": self._run(commands, options)},
+            ]
+
+        results = {
+            "commit": self._git_commit(),
+            "created_at": timezone.now().isoformat(),
+            "iterations": options["iterations"],
+            "runs": runs,
+        }
+
+        for run in runs:
+            self._print_run(run)
+
+        if options["compare"]:
+            self._print_comparison(
+                json.loads(Path(options["compare"]).read_text()), results
+            )
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=2))
+            self.stdout.write(
+                self.style.SUCCESS(f"Results written to {options['output']}")
+            )
+
+    def _run_scales(self, scales, commands, options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            runs = []
+            for scale in scales:
+                call_command("flush", interactive=False, verbosity=0)
+                catalog_cache.invalidate()
+                counts = generate_dataset(scale, prefix=options["prefix"])
+                runs.append(
+                    {
+                        "scale": str(scale),
+                        "dataset": counts,
+                        "commands": self._run(commands, options),
+                    }
+                )
+            return runs
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def _run(self, commands, options):
+        users = load_bench_users(options["prefix"], options["users"])
+        if not users:
+            raise CommandError(
+                "No generated users found, run generatedata or pass --scales"
+            )
+
+        async def run():
+            # Open the ORM thread's connection with query tracking installed
+            await sync_to_async(catalog_cache.get)()
+            benchmark = BotBenchmark(users, api_latency=options["api_latency"])
+            return await benchmark.run(
+                commands, options["iterations"], options["memory_iterations"]
+            )
+
+        return asyncio.run(run())
+
+    def _print_run(self, run):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(f"Scale: {run['scale'] or 'current database'}")
+        )
+        self.stdout.write(
+            f"{'command':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'queries':>10}{'api calls':>10}{'peak KiB':>10}{'errors':>8}"
+        )
+        for command, result in run["commands"].items():
+            self.stdout.write(
+                f"{command:<12}"
+                f"{result['latency_ms']['p50']:>10.2f}"
+                f"{result['latency_ms']['p95']:>10.2f}"
+                f"{result['latency_ms']['p99']:>10.2f}"
+                f"{result['queries']['mean']:>10.1f}"
+                f"{result['bot_api_calls']['mean']:>10.1f}"
+                f"{result.get('peak_memory_kb', {}).get('max', 0):>10.1f}"
+                f"{result['errors']:>8}"
+            )
+
+    def _print_comparison(self, baseline, results):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"Compared with {baseline.get('commit') or 'baseline'}"
+            )
+        )
+        baseline_runs = {run["scale"]: run for run in baseline.get("runs", [])}
+        for run in results["runs"]:
+            previous = baseline_runs.get(run["scale"])
+            if previous is None:
+                continue
+            for command, result in run["commands"].items():
+                before = previous["commands"].get(command)
+                if before is None:
+                    continue
+                p95_before = before["latency_ms"]["p95"]
+                p95_after = result["latency_ms"]["p95"]
+                change = (
+                    (p95_after - p95_before) / p95_before * 100 if p95_before else 0
+                )
+                self.stdout.write(
+                    f"{run['scale'] or '-':<10}{command:<12}"
+                    f"p95 {p95_before:.2f} -> {p95_after:.2f} ms ({change:+.0f}%), "
+                    f"queries {before['queries']['mean']:.1f} -> "
+                    f"{result['queries']['mean']:.1f}"
+                )
+
+    @staticmethod
+    def _git_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from bot.benchmark import COMMANDS, BotBenchmark, load_bench_users
+from bot.identity import identity_cache
+from catalogs.cache import catalog_cache
+from core.db import db_executor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Feed concurrent synthetic updates through the dispatcher with database "
+        "executor pools of several sizes and report throughput for each"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument(
+            "--users", type=int, default=20, help="Number of users sending updates"
+        )
+        parser.add_argument(
+            "--pool-sizes",
+            default="0,1,2,4,8",
+            help="Comma separated DB_EXECUTOR_WORKERS values, 0 is sync_to_async",
+        )
+        parser.add_argument("--updates", type=int, default=500)
+        parser.add_argument(
+            "--concurrency", type=int, default=32, help="Updates handled at once"
+        )
+        parser.add_argument(
+            "--db-latency",
+            type=float,
+            default=0.0,
+            help="Artificial latency added to every query in seconds, e.g. the "
+            "network round trip to a remote database",
+        )
+        parser.add_argument(
+            "--commands", help="Comma separated commands, all of them by default"
+        )
+        parser.add_argument("--output", help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        commands = COMMANDS
+        if options["commands"]:
+            commands = tuple(c.strip() for c in options["commands"].split(","))
+            unknown = set(commands) - set(COMMANDS)
+            if unknown:
+                raise CommandError(f"Unknown commands: {', '.join(sorted(unknown))}")
+
+        users = load_bench_users(options["prefix"], options["users"])
+        if not users:
+            raise CommandError("No generated users found, run generatedata first")
+
+        if options["db_latency"]:
+            self._add_query_latency(options["db_latency"])
+
+        runs = []
+        for size in (int(s) for s in options["pool_sizes"].split(",")):
+            catalog_cache.invalidate()
+            identity_cache.clear()
+            with override_settings(DB_EXECUTOR_WORKERS=size):
+                result = asyncio.run(self._run(users, commands, options))
+            runs.append({"pool_size": size, **result})
+            self.stdout.write(
+                f"pool {size:>3}: {result['throughput_rps']:>8.1f} updates/s, "
+                f"p50 {result['latency_ms']['p50']:.1f} ms, "
+                f"p95 {result['latency_ms']['p95']:.1f} ms, "
+                f"errors {result['errors']}"
+            )
+
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(
+                    {
+                        "concurrency": options["concurrency"],
+                        "db_latency": options["db_latency"],
+                        "runs": runs,
+                    },
+                    indent=2,
+                )
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"Results written to {options['output']}")
+            )
+
+    async def _run(self, users, commands, options):
+        benchmark = BotBenchmark(users)
+        try:
+            # Warm up caches and connections before measuring
+            await benchmark.run_concurrent(
+                commands, len(commands), options["concurrency"]
+            )
+            return await benchmark.run_concurrent(
+                commands, options["updates"], options["concurrency"]
+            )
+        finally:
+            await benchmark.bot.session.close()
+            await db_executor.shutdown()
+
+    @staticmethod
+    def _add_query_latency(latency: float):
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        connection_created.connect(install, weak=False)
+        for connection in connections.all(initialized_only=True):
+            install(None, connection)
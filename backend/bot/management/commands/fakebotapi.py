@@ -0,0 +1,51 @@
+import asyncio
+from collections import Counter
+
+from bot.fakes import FakeBotAPIServer
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake Telegram Bot API server. Point a bot at it with "
+        "BOT_API_SERVER=<printed url>"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Artificial latency of every call in seconds",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.0,
+            help="Random extra latency of up to this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        server = FakeBotAPIServer(latency=options["latency"], jitter=options["jitter"])
+        if options["verbosity"] > 1:
+            server.listeners.append(
+                lambda call: self.stdout.write(f"{call.method} {call.params}")
+            )
+
+        try:
+            asyncio.run(self._serve(server, options["host"], options["port"]))
+        except KeyboardInterrupt:
+            pass
+
+        for method, count in Counter(c.method for c in server.calls).most_common():
+            self.stdout.write(f"{method}: {count}")
+
+    async def _serve(self, server, host, port):
+        url = await server.start(host, port)
+        self.stdout.write(self.style.SUCCESS(f"Fake Bot API listening on {url}"))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
@@ -0,0 +1,48 @@
+from bot.benchmark import DatasetScale, delete_dataset, generate_dataset
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset for benchmarks and load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--plants", type=int, default=20, help="Plants per user")
+        parser.add_argument(
+            "--seed-stocks", type=int, default=5, help="Seed stocks per user"
+        )
+        parser.add_argument("--types", type=int, default=12, help="Plant types")
+        parser.add_argument(
+            "--varieties", type=int, default=4, help="Varieties per plant type"
+        )
+        parser.add_argument(
+            "--prefix",
+            default="bench",
+            help="Prefix of generated usernames and catalog slugs",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete previously generated data with the same prefix first",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            delete_dataset(options["prefix"])
+            self.stdout.write(f"Deleted dataset '{options['prefix']}'")
+
+        scale = DatasetScale(
+            users=options["users"],
+            plants_per_user=options["plants"],
+            seed_stocks_per_user=options["seed_stocks"],
+            plant_types=options["types"],
+            varieties_per_type=options["varieties"],
+        )
+        counts = generate_dataset(scale, prefix=options["prefix"], seed=options["seed"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Generated " + ", ".join(f"{v} {k}" for k, v in counts.items())
+            )
+        )
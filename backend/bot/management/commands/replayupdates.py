@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from bot.benchmark import COMMANDS, load_bench_users
+from bot.bot import bot
+from bot.fakes import FakeBotAPIServer
+from bot.metrics import BotAPIMetricsMiddleware
+from bot.replay import (
+    ASGITransport,
+    HTTPTransport,
+    WebhookReplay,
+    generate_updates,
+    read_updates,
+    write_updates,
+)
+from core.asgi import application
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay Telegram updates against the webhook with a local fake Bot API "
+        "and report throughput, error rate and end-to-end latency"
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument(
+            "--file", help="JSONL file with one Telegram update per line"
+        )
+        source.add_argument(
+            "--generate",
+            type=int,
+            metavar="COUNT",
+            help="Generate COUNT command updates for a generatedata dataset",
+        )
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument(
+            "--users", type=int, default=20, help="Number of generated senders"
+        )
+        parser.add_argument("--commands", help="Comma separated commands to generate")
+        parser.add_argument("--save", help="Write the replayed updates to this file")
+        parser.add_argument(
+            "--rate",
+            type=float,
+            help="Target updates per second, as fast as possible if not set",
+        )
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument(
+            "--url",
+            help=(
+                "Base URL of a running server, e.g. http://localhost:8000. It must "
+                "be started with BOT_API_SERVER pointing to --api-port. Without it "
+                "updates go straight to the in-process ASGI application."
+            ),
+        )
+        parser.add_argument("--path", default="/bot/", help="Webhook path")
+        parser.add_argument(
+            "--api-port",
+            type=int,
+            default=0,
+            help="Port of the fake Bot API, a free one if not set",
+        )
+        parser.add_argument(
+            "--api-latency",
+            type=float,
+            default=0.0,
+            help="Artificial Bot API latency in seconds",
+        )
+        parser.add_argument("--output", help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        if options["url"] and not options["api_port"]:
+            raise CommandError("--url requires a fixed --api-port")
+
+        if options["file"]:
+            updates = read_updates(options["file"])
+        else:
+            commands = COMMANDS
+            if options["commands"]:
+                commands = tuple(c.strip() for c in options["commands"].split(","))
+            users = load_bench_users(options["prefix"], limit=options["users"])
+            try:
+                updates = generate_updates(users, options["generate"], commands)
+            except ValueError as e:
+                raise CommandError(e)
+
+        if options["save"]:
+            write_updates(options["save"], updates)
+
+        results = asyncio.run(self._replay(updates, options))
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
+
+    async def _replay(self, updates, options):
+        api = FakeBotAPIServer(latency=options["api_latency"])
+        api_url = await api.start(port=options["api_port"])
+        self.stderr.write(f"Fake Bot API listening on {api_url}")
+
+        original_session = None
+        if options["url"]:
+            transport = HTTPTransport(options["url"])
+        else:
+            transport = ASGITransport(application)
+            original_session = bot.session
+            bot.session = AiohttpSession(api=api.api_server)
+            bot.session.middleware(BotAPIMetricsMiddleware())
+
+        try:
+            replay = WebhookReplay(
+                transport,
+                api,
+                path=options["path"],
+                secret_token=settings.BOT_WEBHOOK_TOKEN,
+            )
+            return await replay.run(
+                updates, rate=options["rate"], concurrency=options["concurrency"]
+            )
+        finally:
+            await transport.close()
+            if original_session is not None:
+                await bot.session.close()
+                bot.session = original_session
+            await api.stop()
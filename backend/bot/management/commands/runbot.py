@@ -1,10 +1,14 @@
 import asyncio
+import json
 import logging
+import signal
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from bot.bot import bot, dp
+from bot.polling import ShardedPoller
+from core.lifespan import run_shutdown_hooks
 
 logger = logging.getLogger(__name__)
 
@@ -12,17 +16,76 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = "Run Telegram bot in polling mode"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.BOT_POLLING_WORKERS,
+            help="Tasks handling updates; each user's updates go to the same task",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Maximum updates fetched per getUpdates call (1-100)",
+        )
+        parser.add_argument(
+            "--poll-timeout",
+            type=int,
+            default=30,
+            help="Long-poll timeout in seconds",
+        )
+        parser.add_argument(
+            "--allowed-updates",
+            help="Comma-separated update types, defaults to those with handlers",
+        )
+        parser.add_argument(
+            "--stats-interval",
+            type=float,
+            default=60,
+            help="Log throughput and shard stats every N seconds, 0 disables",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Starting Telegram bot in polling mode"))
-        asyncio.run(self._run_polling())
+        stats = asyncio.run(self._run_polling(options))
+        self.stdout.write(json.dumps(stats, indent=2))
+
+    async def _run_polling(self, options):
+        if options["allowed_updates"]:
+            allowed_updates = options["allowed_updates"].split(",")
+        else:
+            allowed_updates = dp.resolve_used_update_types()
+
+        poller = ShardedPoller(
+            dp,
+            bot,
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            poll_timeout=options["poll_timeout"],
+            allowed_updates=allowed_updates,
+        )
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
 
-    async def _run_polling(self):
         try:
             await bot.delete_webhook(
                 drop_pending_updates=settings.BOT_DROP_PENDING_UPDATES
             )
             logger.info("Webhook removed before polling startup")
 
-            await dp.start_polling(bot)
+            await dp.emit_startup(bot=bot, dispatcher=dp)
+            logger.info(
+                "Polling with %d workers for %s", options["workers"], allowed_updates
+            )
+            try:
+                return await poller.run(stop, stats_interval=options["stats_interval"])
+            finally:
+                await dp.emit_shutdown(bot=bot, dispatcher=dp)
         finally:
+            # Save LLM usage and close the clients and database threads, as
+            # the ASGI lifespan does for the webhook
+            await run_shutdown_hooks()
             await bot.session.close()
@@ -0,0 +1,145 @@
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.filters.command import Command
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Update
+from core.db import install_query_tracking, track_queries
+from core.metrics import Counter, Histogram
+
+UPDATE_LABELS = ("update_type", "command")
+
+updates_total = Counter(
+    "bot_updates_total", "Updates fed to the dispatcher.", UPDATE_LABELS
+)
+update_errors_total = Counter(
+    "bot_update_errors_total", "Updates whose handling raised.", UPDATE_LABELS
+)
+update_duration_seconds = Histogram(
+    "bot_update_duration_seconds", "Time spent handling an update.", UPDATE_LABELS
+)
+update_db_queries_total = Counter(
+    "bot_update_db_queries_total",
+    "DB queries made while handling updates.",
+    UPDATE_LABELS,
+)
+update_db_duration_seconds_total = Counter(
+    "bot_update_db_duration_seconds_total",
+    "Time spent in DB queries while handling updates.",
+    UPDATE_LABELS,
+)
+api_requests_total = Counter(
+    "bot_api_requests_total", "Bot API calls.", ("method", "command")
+)
+api_errors_total = Counter(
+    "bot_api_errors_total", "Bot API calls that failed.", ("method", "command")
+)
+api_request_duration_seconds = Histogram(
+    "bot_api_request_duration_seconds", "Bot API call latency.", ("method", "command")
+)
+update_dedup_total = Counter(
+    "bot_update_dedup_total",
+    "Updates checked for redelivery, by result (new or duplicate).",
+    ("result",),
+)
+webhook_replies_total = Counter(
+    "bot_webhook_replies_total",
+    "Bot API calls made through the webhook response.",
+    ("method",),
+)
+update_queue_wait_seconds = Histogram(
+    "bot_update_queue_wait_seconds", "Time updates spent in the webhook queue."
+)
+update_queue_rejected_total = Counter(
+    "bot_update_queue_rejected_total",
+    "Updates refused by the webhook queue.",
+    ("reason",),
+)
+
+# Command of the update being handled, to attribute Bot API calls to it
+_current_command: ContextVar[str] = ContextVar("bot_command", default="")
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Outer update middleware recording latency, DB usage and errors per update
+    type and command. Commands without a handler are counted as `other`.
+    """
+
+    def __init__(self, dispatcher: Dispatcher):
+        self.dispatcher = dispatcher
+        self._commands: frozenset[str] | None = None
+        install_query_tracking()
+
+    def known_commands(self) -> frozenset[str]:
+        if self._commands is None:
+            commands = set()
+            for router in self.dispatcher.chain_tail:
+                for handler in router.message.handlers:
+                    for handler_filter in handler.filters or ():
+                        if isinstance(handler_filter.callback, Command):
+                            commands.update(
+                                c.lower()
+                                for c in handler_filter.callback.commands
+                                if isinstance(c, str)
+                            )
+            self._commands = frozenset(commands)
+        return self._commands
+
+    def command(self, update: Update) -> str:
+        message = update.message
+        if not message or not message.text or not message.text.startswith("/"):
+            return ""
+        name = message.text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+        return f"/{name}" if name in self.known_commands() else "other"
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        command = self.command(event)
+        labels = (event.event_type, command)
+        token = _current_command.set(command)
+        start = time.perf_counter()
+        try:
+            with track_queries() as queries:
+                return await handler(event, data)
+        except Exception:
+            update_errors_total.inc(*labels)
+            raise
+        finally:
+            update_duration_seconds.observe(time.perf_counter() - start, *labels)
+            updates_total.inc(*labels)
+            update_db_queries_total.inc(*labels, amount=queries.count)
+            update_db_duration_seconds_total.inc(*labels, amount=queries.duration)
+            _current_command.reset(token)
+
+
+class BotAPIMetricsMiddleware(BaseRequestMiddleware):
+    """Session middleware recording Bot API call counts, latency and errors."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        labels = (method.__api_method__, _current_command.get())
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            api_errors_total.inc(*labels)
+            raise
+        finally:
+            api_request_duration_seconds.observe(time.perf_counter() - start, *labels)
+            api_requests_total.inc(*labels)
@@ -2,11 +2,9 @@ from typing import Any, Awaitable, Callable, Dict
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message
-from diary.models import Profile
-from django.contrib.auth import get_user_model
 from django.utils import timezone
 
-UserModel = get_user_model()
+from .identity import identity_cache
 
 
 class UserMiddleware(BaseMiddleware):
@@ -19,20 +17,21 @@ class UserMiddleware(BaseMiddleware):
         if not event.from_user:
             return await handler(event, data)
 
-        try:
-            user = await UserModel.objects.aget(telegramuser__id=event.from_user.id)
-            profile = (await Profile.objects.aget_or_create(user=user))[0]
-            if profile.timezone:
-                timezone.activate(profile.timezone)
-            else:
-                timezone.deactivate()
-        except UserModel.DoesNotExist:
+        identity = await identity_cache.aget(event.from_user.id)
+        if identity is None:
+            data["tg_user"] = None
             data["user"] = None
             data["profile"] = None
             return await handler(event, data)
 
-        data["user"] = user
-        data["profile"] = profile
+        if identity.profile.timezone:
+            timezone.activate(identity.profile.timezone)
+        else:
+            timezone.deactivate()
+
+        data["tg_user"] = identity.tg_user
+        data["user"] = identity.user
+        data["profile"] = identity.profile
 
         try:
             return await handler(event, data)
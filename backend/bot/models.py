@@ -34,3 +34,18 @@ class TelegramUser(models.Model):
         if self.first_name and self.last_name:
             return f"{self.first_name} {self.last_name}"
         return f"{self.id}"
+
+
+class ProcessedUpdate(models.Model):
+    """Update IDs claimed by a worker, shared to drop Telegram redeliveries."""
+
+    update_id = models.BigIntegerField(
+        verbose_name=_("ИД обновления"), primary_key=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name=_("Дата обработки"), auto_now_add=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = _("Обработанное обновление")
+        verbose_name_plural = _("Обработанные обновления")
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_CONFIG = BackoffConfig(min_delay=1.0, max_delay=30.0, factor=2, jitter=0.1)
+
+
+@dataclass
+class ShardStats:
+    processed: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    max_depth: int = 0
+
+
+def update_shard_key(update: Update) -> int:
+    """Sender of the update, so that each user's updates stay in order."""
+    user = getattr(update.event, "from_user", None)
+    return user.id if user else update.update_id
+
+
+class ShardedPoller:
+    """
+    Long-polls Telegram and handles updates concurrently in `workers` shards.
+
+    Updates are sharded by sender: one task handles each shard in order, so
+    a user's updates are handled one after another while different users
+    are handled in parallel. Fetching pauses while a shard queue is full.
+
+    Polls continue after the last fetched update, so a slow handler doesn't
+    hold up fetching the updates of other users. Telegram confirms the
+    updates below the offset of a getUpdates call; on shutdown the last call
+    asks from the oldest update not handled yet.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        *,
+        workers: int = 4,
+        batch_size: int = 100,
+        poll_timeout: int = 30,
+        allowed_updates: list[str] | None = None,
+        shard_queue_size: int = 100,
+        drain_timeout: float = 20.0,
+    ):
+        if workers <= 0:
+            raise ValueError("workers must be > 0")
+        self.dp = dp
+        self.bot = bot
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.allowed_updates = allowed_updates
+        self.drain_timeout = drain_timeout
+        # Fetched updates not handled yet, and the last one fetched
+        self._pending: set[int] = set()
+        self._last_fetched: int | None = None
+
+        self.shards = [ShardStats() for _ in range(workers)]
+        self._queues: list[asyncio.Queue[Update]] = [
+            asyncio.Queue(shard_queue_size) for _ in range(workers)
+        ]
+        self.batches = 0
+        self.received = 0
+        self._started_at = time.perf_counter()
+
+    @property
+    def offset(self) -> int | None:
+        """First update not fetched yet."""
+        if self._last_fetched is None:
+            return None
+        return self._last_fetched + 1
+
+    @property
+    def confirmed_offset(self) -> int | None:
+        """First update not handled yet."""
+        if self._pending:
+            return min(self._pending)
+        return self.offset
+
+    async def _poll(self):
+        backoff = Backoff(config=BACKOFF_CONFIG)
+        kwargs = {}
+        if self.bot.session.timeout:
+            # Wait longer than Telegram holds the long poll
+            kwargs["request_timeout"] = int(
+                self.bot.session.timeout + self.poll_timeout
+            )
+
+        while True:
+            try:
+                updates = await self.bot(
+                    GetUpdates(
+                        offset=self.offset,
+                        limit=self.batch_size,
+                        timeout=self.poll_timeout,
+                        allowed_updates=self.allowed_updates,
+                    ),
+                    **kwargs,
+                )
+            except Exception as e:
+                logger.error("Failed to fetch updates - %s: %s", type(e).__name__, e)
+                await backoff.asleep()
+                continue
+            backoff.reset()
+
+            self.batches += 1
+            self.received += len(updates)
+            for update in updates:
+                self._pending.add(update.update_id)
+                self._last_fetched = update.update_id
+                shard = update_shard_key(update) % len(self._queues)
+                queue = self._queues[shard]
+                await queue.put(update)
+                stats = self.shards[shard]
+                stats.max_depth = max(stats.max_depth, queue.qsize())
+
+    async def _work(self, shard: int):
+        queue = self._queues[shard]
+        stats = self.shards[shard]
+        while True:
+            update = await queue.get()
+            start = time.perf_counter()
+            try:
+                result = await self.dp.feed_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    await self.bot(result)
+            except Exception:
+                stats.errors += 1
+                logger.exception("Failed to handle update %s", update.update_id)
+            finally:
+                stats.processed += 1
+                stats.busy_seconds += time.perf_counter() - start
+                queue.task_done()
+            # Not reached when the worker is cancelled, so the update is
+            # left out of the confirmation on shutdown
+            self._pending.discard(update.update_id)
+
+    async def _report(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info("Polling stats: %s", self.stats())
+
+    async def run(
+        self, stop: asyncio.Event, stats_interval: float | None = None
+    ) -> dict[str, Any]:
+        """Poll until `stop` is set, then handle fetched updates and return stats."""
+        self._started_at = time.perf_counter()
+        workers = [
+            asyncio.create_task(self._work(shard), name=f"bot-polling-shard-{shard}")
+            for shard in range(len(self._queues))
+        ]
+        background = [asyncio.create_task(self._poll())]
+        if stats_interval:
+            background.append(asyncio.create_task(self._report(stats_interval)))
+
+        try:
+            await stop.wait()
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(q.join() for q in self._queues)),
+                    self.drain_timeout,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Dropping %d fetched updates after %ss",
+                    sum(q.qsize() for q in self._queues),
+                    self.drain_timeout,
+                )
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        await self._confirm()
+        return self.stats()
+
+    async def _confirm(self):
+        """
+        Mark the updates of the last poll as confirmed, which needs another
+        getUpdates call. It stops at the oldest update dropped after
+        `drain_timeout`; earlier polls already confirmed what they fetched.
+        """
+        if self.confirmed_offset is None:
+            return
+        try:
+            await self.bot(GetUpdates(offset=self.confirmed_offset, limit=1, timeout=0))
+        except Exception as e:
+            logger.warning("Failed to confirm updates - %s: %s", type(e).__name__, e)
+
+    def stats(self) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self._started_at
+        processed = [s.processed for s in self.shards]
+        busy = [s.busy_seconds for s in self.shards]
+        mean_processed = statistics.fmean(processed)
+        mean_busy = statistics.fmean(busy)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "batches": self.batches,
+            "received": self.received,
+            "processed": sum(processed),
+            "errors": sum(s.errors for s in self.shards),
+            "throughput_rps": round(sum(processed) / elapsed, 2) if elapsed else 0,
+            # Busiest shard relative to the average one, 1.0 is perfectly even
+            "imbalance": {
+                "updates": (
+                    round(max(processed) / mean_processed, 2) if mean_processed else 1.0
+                ),
+                "busy_time": round(max(busy) / mean_busy, 2) if mean_busy else 1.0,
+            },
+            "shards": [
+                {
+                    "processed": s.processed,
+                    "errors": s.errors,
+                    "busy_s": round(s.busy_seconds, 3),
+                    "max_depth": s.max_depth,
+                }
+                for s in self.shards
+            ],
+        }
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+from core.metrics import REGISTRY, Family
+from django.conf import settings
+
+from .metrics import update_queue_rejected_total, update_queue_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """
+    Bounded queue between the webhook and a pool of worker tasks feeding the
+    dispatcher, so that the webhook can answer Telegram before the update is
+    handled.
+
+    The queue and its workers live in the event loop of the first `put()`,
+    which requires an ASGI server running a single loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int | None = None,
+        workers: int | None = None,
+        drain_timeout: float | None = None,
+    ):
+        self._maxsize = maxsize
+        self._workers_count = workers
+        self._drain_timeout = drain_timeout
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._closed = False
+
+    @property
+    def maxsize(self) -> int:
+        if self._maxsize is not None:
+            return self._maxsize
+        return settings.BOT_WEBHOOK_QUEUE_SIZE
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+
+        self._loop = loop
+        self._closed = False
+        self._queue = asyncio.Queue(self.maxsize)
+        workers = self._workers_count or settings.BOT_WEBHOOK_WORKERS
+        self._workers = [
+            loop.create_task(self._work(), name=f"bot-update-worker-{i}")
+            for i in range(workers)
+        ]
+        logger.info("Started %d update workers", workers)
+
+    def put(self, update: Update) -> bool:
+        """Enqueue an update, False if the queue is full or shutting down."""
+        self._ensure_started()
+        if self._closed:
+            update_queue_rejected_total.inc("closed")
+            return False
+
+        try:
+            self._queue.put_nowait((time.perf_counter(), update))
+        except asyncio.QueueFull:
+            update_queue_rejected_total.inc("full")
+            return False
+        return True
+
+    async def _work(self):
+        from .bot import bot, dp
+
+        while True:
+            enqueued_at, update = await self._queue.get()
+            update_queue_wait_seconds.observe(time.perf_counter() - enqueued_at)
+            try:
+                result = await dp.feed_update(bot, update)
+                if isinstance(result, TelegramMethod):
+                    await bot(result)
+            except Exception:
+                logger.exception("Failed to handle update %s", update.update_id)
+            finally:
+                self._queue.task_done()
+
+    async def join(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def shutdown(self):
+        """Stop accepting updates and wait for queued ones to be handled."""
+        if self._queue is None:
+            return
+
+        self._closed = True
+        timeout = (
+            self._drain_timeout
+            if self._drain_timeout is not None
+            else settings.BOT_WEBHOOK_DRAIN_TIMEOUT_SECONDS
+        )
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Dropping %d queued updates after %ss", self._queue.qsize(), timeout
+            )
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._loop = None
+
+
+update_queue = UpdateQueue()
+
+
+def _collect_stats() -> list[Family]:
+    return [
+        Family(
+            "bot_update_queue_depth",
+            "gauge",
+            "Updates waiting in the webhook queue.",
+            [({}, update_queue.depth)],
+        ),
+        Family(
+            "bot_update_queue_capacity",
+            "gauge",
+            "Capacity of the webhook queue, 0 if updates are handled inline.",
+            [({}, update_queue.maxsize)],
+        ),
+    ]
+
+
+REGISTRY.register_collector(_collect_stats)
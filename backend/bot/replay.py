@@ -0,0 +1,301 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, deque
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+
+from .benchmark import COMMANDS, BenchUser, command_text, summarize
+from .fakes import (
+    FakeBotAPIServer,
+    RecordedCall,
+    make_message_update,
+    next_update_id,
+)
+
+
+def read_updates(path: str | Path) -> list[dict[str, Any]]:
+    """Updates from a JSONL file, one Telegram update object per line."""
+    updates = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                updates.append(json.loads(line))
+    return updates
+
+
+def write_updates(path: str | Path, updates: Iterable[dict[str, Any]]):
+    with open(path, "w") as f:
+        for update in updates:
+            f.write(json.dumps(update, ensure_ascii=False) + "\n")
+
+
+def generate_updates(
+    users: list[BenchUser], count: int, commands: Iterable[str] = COMMANDS
+) -> list[dict[str, Any]]:
+    """`count` command updates cycling through users and commands."""
+    if not users:
+        raise ValueError("No benchmark users, generate a dataset first")
+
+    updates = []
+    for i, command in zip(range(count), itertools.cycle(commands)):
+        user = users[i % len(users)]
+        text = command_text(command, user, i // len(users))
+        updates.append(
+            make_message_update(
+                next_update_id(), user.telegram_id, text, username=user.username
+            )
+        )
+    return updates
+
+
+def update_chat_id(update: dict[str, Any]) -> int | None:
+    for key in ("message", "edited_message", "callback_query"):
+        if key in update:
+            event = update[key]
+            chat = (event.get("message") or event).get("chat") or event.get("from")
+            return chat and chat.get("id")
+    return None
+
+
+class ASGITransport:
+    """Sends requests straight to an ASGI application, without a server."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def post(
+        self, path: str, body: bytes, headers: dict[str, str]
+    ) -> tuple[int, bytes]:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *((k.lower().encode(), v.encode()) for k, v in headers.items()),
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        request_sent = False
+        response_done = asyncio.Event()
+        status = 500
+        chunks = []
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Django listens for a disconnect while handling the request
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    response_done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            response_done.set()
+        return status, b"".join(chunks)
+
+    async def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Sends requests to a running server."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.session = aiohttp.ClientSession()
+
+    async def post(
+        self, path: str, body: bytes, headers: dict[str, str]
+    ) -> tuple[int, bytes]:
+        async with self.session.post(
+            self.base_url + path,
+            data=body,
+            headers={"Content-Type": "application/json", **headers},
+        ) as response:
+            return response.status, await response.read()
+
+    async def close(self):
+        await self.session.close()
+
+
+@dataclass
+class _Delivery:
+    sent_at: float
+    replied_at: float | None = None
+    replied: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def reply(self, at: float):
+        if self.replied_at is None:
+            self.replied_at = at
+            self.replied.set()
+
+
+class WebhookReplay:
+    """
+    POSTs updates to the webhook at a target rate and measures throughput,
+    errors and latency from webhook receipt to the first outbound Bot API call
+    for the update's chat (or a method returned in the webhook response).
+
+    Replies may arrive after the webhook response when updates are queued, so
+    each update waits up to `reply_timeout` seconds for one.
+    """
+
+    def __init__(
+        self,
+        transport: ASGITransport | HTTPTransport,
+        api: FakeBotAPIServer,
+        *,
+        path: str = "/bot/",
+        secret_token: str | None = None,
+        reply_timeout: float = 10.0,
+    ):
+        self.transport = transport
+        self.api = api
+        self.path = path
+        self.headers = (
+            {"X-Telegram-Bot-Api-Secret-Token": secret_token} if secret_token else {}
+        )
+        self.reply_timeout = reply_timeout
+        self._pending: dict[str, deque[_Delivery]] = {}
+
+    def _on_api_call(self, call: RecordedCall):
+        chat_id = call.params.get("chat_id")
+        if chat_id is None:
+            return
+        for delivery in self._pending.get(str(chat_id), ()):
+            if delivery.replied_at is None:
+                delivery.reply(call.sent_at)
+                return
+
+    async def _deliver(
+        self,
+        update: dict[str, Any],
+        results: dict[str, Any],
+        semaphore: asyncio.Semaphore,
+    ) -> None:
+        pending = self._pending.setdefault(str(update_chat_id(update)), deque())
+        body = json.dumps(update).encode()
+
+        async with semaphore:
+            delivery = _Delivery(sent_at=time.perf_counter())
+            pending.append(delivery)
+            try:
+                status, body = await self.transport.post(self.path, body, self.headers)
+            except Exception as e:
+                status, body = None, b""
+                results["exceptions"][type(e).__name__] += 1
+        finished_at = time.perf_counter()
+
+        try:
+            results["status_codes"][str(status)] += 1
+            if status is None or status >= 400:
+                results["errors"] += 1
+                return
+
+            results["http_latency_ms"].append((finished_at - delivery.sent_at) * 1000)
+            if body.startswith(b"{"):
+                try:
+                    method = json.loads(body).get("method")
+                except ValueError:
+                    method = None
+                if method:
+                    results["webhook_replies"][method] += 1
+                    delivery.reply(finished_at)
+
+            try:
+                await asyncio.wait_for(delivery.replied.wait(), self.reply_timeout)
+            except asyncio.TimeoutError:
+                results["unanswered"] += 1
+                return
+            results["e2e_latency_ms"].append(
+                (delivery.replied_at - delivery.sent_at) * 1000
+            )
+        finally:
+            pending.remove(delivery)
+
+    async def run(
+        self,
+        updates: list[dict[str, Any]],
+        *,
+        rate: float | None = None,
+        concurrency: int = 100,
+    ) -> dict[str, Any]:
+        """
+        Send `updates` at `rate` updates per second (as fast as `concurrency`
+        allows if not set) and wait for all of them to be handled.
+        """
+        results: dict[str, Any] = {
+            "errors": 0,
+            "unanswered": 0,
+            "status_codes": Counter(),
+            "exceptions": Counter(),
+            "webhook_replies": Counter(),
+            "http_latency_ms": [],
+            "e2e_latency_ms": [],
+        }
+        semaphore = asyncio.Semaphore(concurrency)
+        calls_before = len(self.api.calls)
+        self.api.listeners.append(self._on_api_call)
+
+        started_at = time.perf_counter()
+        tasks = []
+        try:
+            for i, update in enumerate(updates):
+                if rate:
+                    delay = started_at + i / rate - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                tasks.append(
+                    asyncio.create_task(self._deliver(update, results, semaphore))
+                )
+            await asyncio.gather(*tasks)
+        finally:
+            self.api.listeners.remove(self._on_api_call)
+        duration = time.perf_counter() - started_at
+
+        sent = len(updates)
+        completed = sent - results["errors"]
+        return {
+            "updates": sent,
+            "target_rate": rate,
+            "concurrency": concurrency,
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(completed / duration, 2) if duration else 0,
+            "errors": results["errors"],
+            "error_rate": round(results["errors"] / sent, 4) if sent else 0,
+            "unanswered": results["unanswered"],
+            "status_codes": dict(results["status_codes"]),
+            "exceptions": dict(results["exceptions"]),
+            "http_latency_ms": summarize(results["http_latency_ms"]),
+            "e2e_latency_ms": summarize(results["e2e_latency_ms"]),
+            "bot_api_calls": dict(
+                Counter(call.method for call in self.api.calls[calls_before:])
+            ),
+            "webhook_replies": dict(results["webhook_replies"]),
+        }
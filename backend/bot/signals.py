@@ -0,0 +1,35 @@
+from diary.models import Profile
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .identity import identity_cache
+from .models import TelegramUser
+
+
+def _invalidate(invalidate, key):
+    invalidate(key)
+    # A concurrent lookup may have cached the old state before the commit
+    transaction.on_commit(lambda: invalidate(key))
+
+
+@receiver(post_save, sender=TelegramUser)
+@receiver(post_delete, sender=TelegramUser)
+def telegram_user_changed(sender, instance: TelegramUser, **kwargs):
+    _invalidate(identity_cache.invalidate, instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance: Profile, raw: bool = False, **kwargs):
+    if raw:
+        return
+    _invalidate(identity_cache.invalidate_user, instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, created: bool, raw: bool = False, **kwargs):
+    if created or raw:
+        return
+    _invalidate(identity_cache.invalidate_user, instance.pk)
@@ -1,3 +1,530 @@
-# from django.test import TestCase
+import asyncio
+import json
+from datetime import date
 
-# Create your tests here.
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message, Update
+from aiogram.types import User as AiogramUser
+from asgiref.sync import sync_to_async
+from catalogs.cache import catalog_cache
+from catalogs.models import Operation, PlantOperation, PlantType, PlantVariety, Step
+from core.asgi import application
+from core.db import QueryStats, install_query_tracking, track_queries
+from core.metrics import REGISTRY
+from core.routers import REPLICA, use_replica
+from diary.context import build_diary_context, diary_context_cache
+from diary.models import Plant, PlantEvent, Profile, ScheduledOperation, SeedStock
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .benchmark import (
+    COMMANDS,
+    BotBenchmark,
+    DatasetScale,
+    generate_dataset,
+    load_bench_users,
+)
+from .bot import _add_to_stock, _create_account, _plant_from_stock, bot
+from .dedup import DeduplicationMiddleware, RecentIds, update_deduplication
+from .fakes import (
+    FakeBotAPIServer,
+    RecordingSession,
+    make_message_update,
+    next_update_id,
+)
+from .identity import identity_cache
+from .models import ProcessedUpdate, TelegramUser
+from .polling import ShardedPoller
+from .queue import UpdateQueue, update_queue
+from .replay import ASGITransport, WebhookReplay, generate_updates
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.counts = generate_dataset(DatasetScale(users=3, plants_per_user=4))
+
+    def setUp(self):
+        catalog_cache.invalidate()
+        identity_cache.clear()
+        install_query_tracking()
+
+    def test_generated_dataset(self):
+        self.assertEqual(TelegramUser.objects.count(), 3)
+        self.assertEqual(Plant.objects.count(), 12)
+        self.assertEqual(PlantEvent.objects.count(), self.counts["events"])
+        self.assertFalse(
+            Plant.objects.filter(
+                events__isnull=False, current_step__isnull=True
+            ).exists()
+        )
+
+    async def test_every_command_is_handled(self):
+        users = await sync_to_async(load_bench_users)()
+        benchmark = BotBenchmark(users)
+
+        results = await benchmark.run(COMMANDS, iterations=3, memory_iterations=1)
+
+        for command, result in results.items():
+            self.assertEqual(result["errors"], 0, command)
+            self.assertEqual(result["bot_api_calls"]["max"], 1, command)
+            self.assertGreater(result["queries"]["mean"], 0, command)
+            self.assertIn("p99", result["peak_memory_kb"], command)
+
+    async def test_update_metrics(self):
+        users = await sync_to_async(load_bench_users)()
+        benchmark = BotBenchmark(users)
+        await benchmark.feed("/myplants", 0)
+        await benchmark.feed("/unknown", 0)
+
+        output = REGISTRY.render()
+        self.assertIn(
+            'bot_update_duration_seconds_count{update_type="message",command="/myplants"}',
+            output,
+        )
+        self.assertRegex(
+            output,
+            r'bot_update_db_queries_total\{update_type="message",command="/myplants"\} [1-9]',
+        )
+        self.assertIn(
+            'bot_updates_total{update_type="message",command="other"}', output
+        )
+
+
+class WebhookReplayTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset(DatasetScale(users=2, plants_per_user=2))
+
+    def setUp(self):
+        catalog_cache.invalidate()
+        identity_cache.clear()
+        # Keep the test database connection open across ASGI requests
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    async def replay(self, updates):
+        api = FakeBotAPIServer()
+        await api.start()
+        original_session = bot.session
+        bot.session = AiohttpSession(api=api.api_server)
+        try:
+            replay = WebhookReplay(ASGITransport(application), api)
+            return await replay.run(updates, concurrency=4)
+        finally:
+            await update_queue.shutdown()
+            await bot.session.close()
+            bot.session = original_session
+            await api.stop()
+
+    async def test_replay_through_fake_bot_api(self):
+        users = await sync_to_async(load_bench_users)()
+        updates = generate_updates(users, 8, ["/start", "/myplants"])
+        updates.append({"update_id": 100, "message": {"malformed": True}})
+
+        with self.assertLogs("bot.api", "ERROR"):
+            results = await self.replay(updates)
+
+        self.assertEqual(results["updates"], 9)
+        self.assertEqual(results["errors"], 1)
+        self.assertEqual(results["status_codes"], {"200": 8, "400": 1})
+        # /myplants replies in the webhook response
+        self.assertEqual(results["bot_api_calls"], {"sendMessage": 4})
+        self.assertEqual(results["webhook_replies"], {"sendMessage": 4})
+        self.assertEqual(results["unanswered"], 0)
+        self.assertIn("p99", results["e2e_latency_ms"])
+        self.assertGreater(results["throughput_rps"], 0)
+
+    @override_settings(BOT_WEBHOOK_QUEUE_SIZE=100, BOT_WEBHOOK_WORKERS=2)
+    async def test_queued_updates_are_answered(self):
+        users = await sync_to_async(load_bench_users)()
+        updates = generate_updates(users, 8, ["/start", "/myplants"])
+
+        results = await self.replay(updates)
+
+        self.assertEqual(results["status_codes"], {"200": 8})
+        self.assertEqual(results["bot_api_calls"], {"sendMessage": 8})
+        self.assertEqual(results["unanswered"], 0)
+
+    async def test_reply_in_webhook_response(self):
+        users = await sync_to_async(load_bench_users)()
+        [update] = generate_updates(users, 1, ["/seeds"])
+        transport = ASGITransport(application)
+
+        status, body = await transport.post("/bot/", json.dumps(update).encode(), {})
+
+        self.assertEqual(status, 200)
+        reply = json.loads(body)
+        self.assertEqual(reply["method"], "sendMessage")
+        self.assertEqual(reply["chat_id"], update["message"]["chat"]["id"])
+        self.assertEqual(reply["parse_mode"], "HTML")
+        self.assertIn("Use /plant", reply["text"])
+
+    @override_settings(BOT_WEBHOOK_REPLY=False)
+    async def test_reply_can_be_sent_through_bot_api(self):
+        users = await sync_to_async(load_bench_users)()
+        results = await self.replay(generate_updates(users, 2, ["/seeds"]))
+
+        self.assertEqual(results["bot_api_calls"], {"sendMessage": 2})
+        self.assertEqual(results["webhook_replies"], {})
+
+    async def test_full_queue_is_rejected(self):
+        queue = UpdateQueue(maxsize=1, workers=1, drain_timeout=5)
+        edited = Update.model_validate(
+            {
+                "update_id": next_update_id(),
+                "edited_message": make_message_update(1, 1, "hi")["message"],
+            }
+        )
+
+        self.assertTrue(queue.put(edited))
+        self.assertFalse(queue.put(edited))
+        await queue.shutdown()
+        self.assertEqual(queue.depth, 0)
+
+
+class IdentityCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset(DatasetScale(users=1, plants_per_user=1))
+
+    def setUp(self):
+        identity_cache.clear()
+        install_query_tracking()
+
+    async def test_warm_user_needs_no_queries(self):
+        users = await sync_to_async(load_bench_users)()
+        telegram_id = users[0].telegram_id
+
+        with track_queries() as queries:
+            identity = await identity_cache.aget(telegram_id)
+        self.assertEqual(queries.count, 1)
+        self.assertEqual(identity.tg_user.pk, telegram_id)
+
+        benchmark = BotBenchmark(users)
+        with track_queries() as queries:
+            await benchmark.feed("/start", 0)
+        self.assertEqual(queries.count, 0)
+
+    async def test_profile_change_invalidates(self):
+        users = await sync_to_async(load_bench_users)()
+        identity = await identity_cache.aget(users[0].telegram_id)
+
+        profile = await Profile.objects.aget(pk=identity.profile.pk)
+        profile.timezone = "Asia/Tokyo"
+        await profile.asave()
+
+        identity = await identity_cache.aget(users[0].telegram_id)
+        self.assertEqual(str(identity.profile.timezone), "Asia/Tokyo")
+
+    async def test_registration_replaces_unknown_entry(self):
+        users = await sync_to_async(load_bench_users)()
+        benchmark = BotBenchmark(users)
+        self.assertIsNone(await identity_cache.aget(42))
+
+        update = Update.model_validate(
+            make_message_update(next_update_id(), 42, "/start", username="newcomer"),
+            context={"bot": benchmark.bot},
+        )
+        await benchmark.dp.feed_update(benchmark.bot, update)
+
+        identity = await identity_cache.aget(42)
+        self.assertEqual(identity.tg_user.pk, 42)
+        self.assertIsNotNone(identity.profile.pk)
+
+    async def test_account_created_by_another_worker(self):
+        self.assertIsNone(await identity_cache.aget(43))
+        user = await get_user_model().objects.acreate(username="elsewhere")
+        # Without signals, like a write of another process
+        await TelegramUser.objects.abulk_create([TelegramUser(id=43, user=user)])
+
+        identity = await identity_cache.aget(43)
+        self.assertEqual(identity.user.pk, user.pk)
+
+        from_user = AiogramUser(id=43, is_bot=False, first_name="Again")
+        users = await get_user_model().objects.acount()
+        tg_user, created = await sync_to_async(_create_account)(from_user)
+
+        self.assertFalse(created)
+        self.assertEqual(tg_user.user_id, user.pk)
+        self.assertEqual(await get_user_model().objects.acount(), users)
+
+
+class SeedStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="gardener")
+        cls.tg_user = TelegramUser.objects.create(id=44, user=cls.user)
+        cls.tomato = PlantType.objects.create(
+            slug="tomato", name="Томат", description="", duration_days=100
+        )
+        cls.cherry = PlantVariety.objects.create(
+            type=cls.tomato, slug="cherry", name="Черри", duration_days=90
+        )
+
+    def setUp(self):
+        catalog_cache.invalidate()
+        diary_context_cache.clear()
+        self.addCleanup(diary_context_cache.clear)
+
+    def test_stock_updates_drop_cached_diary_context(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stock = _add_to_stock(self.user.pk, self.tomato, self.cherry, 5)
+        self.assertIn("Томат Черри: 5", build_diary_context(self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _add_to_stock(self.user.pk, self.tomato, self.cherry, 7)
+        self.assertIn("Томат Черри: 12", build_diary_context(self.user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _plant_from_stock(stock.pk, self.tg_user.pk)
+        self.assertIn("Томат Черри: 11", build_diary_context(self.user.pk))
+
+
+@override_settings(DATABASE_REPLICA_ENABLED=True)
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", REPLICA}
+
+    @classmethod
+    def setUpTestData(cls):
+        # The same user and catalog in both databases, different plants
+        for alias in cls.databases:
+            user = get_user_model()(pk=1, username="gardener")
+            user.save(using=alias)
+            TelegramUser(id=51, user=user).save(using=alias)
+            tomato = PlantType(
+                pk=1, slug="tomato", name="Томат", description="", duration_days=100
+            )
+            tomato.save(using=alias)
+            PlantVariety(
+                pk=1, type=tomato, slug="cherry", name="Черри", duration_days=90
+            ).save(using=alias)
+            Plant(pk=1, user=user, type=tomato, name=f"Томат {alias}").save(using=alias)
+
+        watering = PlantOperation(
+            pk=1,
+            plant_type_id=1,
+            operation=Operation.WATERING,
+            since_step=Step.SOWING,
+            until_step=Step.HARVESTING,
+            interval_days=1,
+            description="",
+        )
+        watering.save(using=REPLICA)
+        ScheduledOperation(
+            user_id=1,
+            plant_id=1,
+            operation=watering,
+            start_date=date(2026, 1, 1),
+            interval_days=1,
+            phase=0,
+        ).save(using=REPLICA)
+        cls.stock = SeedStock.objects.create(
+            user_id=1, type_id=1, variety_id=1, quantity=10
+        )
+
+    def setUp(self):
+        catalog_cache.invalidate()
+        identity_cache.clear()
+        install_query_tracking()
+        self.session = RecordingSession()
+        self.bot = Bot("123:abc", session=self.session)
+
+    async def send(self, text: str) -> tuple[str, QueryStats]:
+        from .bot import dp
+
+        update = Update.model_validate(
+            make_message_update(next_update_id(), 51, text), context={"bot": self.bot}
+        )
+        with track_queries() as queries:
+            result = await dp.feed_update(self.bot, update)
+            if isinstance(result, TelegramMethod):
+                await self.bot(result)
+        return self.session.calls[-1].params["text"], queries
+
+    async def test_read_only_commands_read_from_replica(self):
+        await self.send("/start")
+
+        answer, queries = await self.send("/today")
+
+        self.assertIn("Томат replica", answer)
+        self.assertEqual(dict(queries.by_alias), {REPLICA: 1})
+
+    async def test_writes_and_their_reads_use_primary(self):
+        await self.send("/start")
+
+        answer, queries = await self.send("/addseeds tomato 5 cherry")
+        self.assertIn("15", answer)
+        self.assertNotIn(REPLICA, queries.by_alias)
+
+        answer, queries = await self.send(f"/plant {self.stock.pk}")
+        self.assertIn("14", answer)
+        self.assertNotIn(REPLICA, queries.by_alias)
+
+        def plant_and_count():
+            with use_replica():
+                Plant.objects.create(user_id=1, type_id=1)
+                return Plant.objects.filter(user_id=1).count()
+
+        # Plants of the primary, including the one planted above
+        self.assertEqual(await sync_to_async(plant_and_count)(), 3)
+
+
+class DeduplicationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_dataset(DatasetScale(users=1, plants_per_user=1))
+
+    def setUp(self):
+        catalog_cache.invalidate()
+        identity_cache.clear()
+        update_deduplication.clear()
+
+    def test_recent_ids_are_bounded(self):
+        recent = RecentIds(maxsize=2)
+        self.assertTrue(recent.add(1))
+        self.assertFalse(recent.add(1))
+        recent.add(2)
+        recent.add(3)
+        self.assertEqual(len(recent), 2)
+        self.assertTrue(recent.add(1))
+
+    async def test_concurrent_redeliveries_are_handled_once(self):
+        users = await sync_to_async(load_bench_users)()
+        benchmark = BotBenchmark(users)
+        stock = await SeedStock.objects.aget(pk=users[0].seed_stock_ids[0])
+        quantity = stock.quantity
+        update = benchmark.make_update("/addseeds", 0)
+
+        replies = await asyncio.gather(
+            *(benchmark.dp.feed_update(benchmark.bot, update) for _ in range(5))
+        )
+        replies.append(await benchmark.dp.feed_update(benchmark.bot, update))
+
+        await stock.arefresh_from_db()
+        self.assertEqual(stock.quantity, quantity + 1)
+        self.assertEqual(sum(reply is not None for reply in replies), 1)
+        self.assertRegex(
+            REGISTRY.render(), r'bot_update_dedup_total\{result="duplicate"\} [1-9]'
+        )
+
+    @override_settings(BOT_UPDATE_DEDUP_DB=True)
+    async def test_database_is_shared_between_workers(self):
+        worker, other_worker = DeduplicationMiddleware(), DeduplicationMiddleware()
+
+        self.assertTrue(await worker.claim(1))
+        self.assertFalse(await other_worker.claim(1))
+        self.assertTrue(await ProcessedUpdate.objects.filter(update_id=1).aexists())
+
+        await worker.release(1)
+        self.assertTrue(await DeduplicationMiddleware().claim(1))
+
+
+class ShardedPollerTests(SimpleTestCase):
+    async def test_users_are_handled_in_order_and_in_parallel(self):
+        handled: list[tuple[int, str]] = []
+        running = peak = 0
+        done = asyncio.Event()
+        dp = Dispatcher()
+
+        @dp.message()
+        async def slow_handler(message: Message):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            handled.append((message.from_user.id, message.text))
+            if len(handled) == 12:
+                done.set()
+
+        session = RecordingSession(latency=0.01)
+        session.pending = [
+            make_message_update(next_update_id(), user_id, str(i))
+            for i in range(4)
+            for user_id in (11, 12, 13)
+        ]
+        poller = ShardedPoller(
+            dp, Bot("123:abc", session=session), workers=3, batch_size=5
+        )
+
+        poller_task = asyncio.create_task(poller.run(done))
+        stats = await asyncio.wait_for(poller_task, 5)
+
+        for user_id in (11, 12, 13):
+            self.assertEqual(
+                [text for uid, text in handled if uid == user_id], ["0", "1", "2", "3"]
+            )
+        self.assertEqual(peak, 3)
+        self.assertEqual(stats["received"], 12)
+        self.assertEqual(stats["processed"], 12)
+        self.assertEqual(stats["imbalance"]["updates"], 1.0)
+        self.assertEqual(len(session.pending), 0)
+        batches = [call for call in session.calls if call.method == "getUpdates"]
+        self.assertEqual(batches[0].params["limit"], 5)
+
+    async def test_slow_handler_does_not_hold_up_fetching(self):
+        dp = Dispatcher()
+        handled: list[str] = []
+        done = asyncio.Event()
+
+        @dp.message()
+        async def handler(message: Message):
+            if message.from_user.id == 31:
+                await asyncio.Event().wait()
+            handled.append(message.text)
+            if len(handled) == 5:
+                done.set()
+
+        session = RecordingSession(latency=0.005)
+        session.pending = [make_message_update(next_update_id(), 31, "stuck")] + [
+            make_message_update(next_update_id(), 32, str(i)) for i in range(5)
+        ]
+        poller = ShardedPoller(
+            dp,
+            Bot("123:abc", session=session),
+            workers=2,
+            batch_size=2,
+            drain_timeout=0.05,
+        )
+
+        stats = await asyncio.wait_for(poller.run(done), 5)
+
+        self.assertEqual(handled, ["0", "1", "2", "3", "4"])
+        self.assertEqual(stats["received"], 6)
+
+    async def test_unhandled_updates_are_not_confirmed(self):
+        dp = Dispatcher()
+        handled = asyncio.Event()
+
+        @dp.message()
+        async def handler(message: Message):
+            if message.from_user.id == 21:
+                await asyncio.Event().wait()
+            handled.set()
+
+        session = RecordingSession(latency=0.005)
+        stuck, done = next_update_id(), next_update_id()
+        session.pending = [
+            make_message_update(stuck, 21, "stuck"),
+            make_message_update(done, 22, "done"),
+        ]
+        poller = ShardedPoller(
+            dp, Bot("123:abc", session=session), workers=2, drain_timeout=0.05
+        )
+
+        poller_task = asyncio.create_task(poller.run(handled))
+        stats = await asyncio.wait_for(poller_task, 5)
+
+        self.assertEqual(stats["received"], 2)
+        offsets = [
+            call.params.get("offset")
+            for call in session.calls
+            if call.method == "getUpdates"
+        ]
+        self.assertEqual(offsets[-1], stuck)
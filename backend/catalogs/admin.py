@@ -1,3 +1,4 @@
+from core.admin import ReplicaChangeListMixin
 from django.contrib import admin
 
 from .models import PlantOperation, PlantStep, PlantType, PlantVariety
@@ -30,8 +31,15 @@ class PlantTypeOperationsInline(admin.TabularInline):
 
 
 @admin.register(PlantType)
-class PlantTypeAdmin(admin.ModelAdmin):
-    fields = ("name", "slug", "description", "sowing_period", "planting_period", "duration_days")
+class PlantTypeAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    fields = (
+        "name",
+        "slug",
+        "description",
+        "sowing_period",
+        "planting_period",
+        "duration_days",
+    )
     list_display = ("name", "slug", "sowing_period", "planting_period", "duration_days")
     ordering = ("name",)
     prepopulated_fields = {"slug": ("name",)}
@@ -41,7 +49,7 @@ class PlantTypeAdmin(admin.ModelAdmin):
 
 
 @admin.register(PlantVariety)
-class PlantVarietyAdmin(admin.ModelAdmin):
+class PlantVarietyAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     fields = (
         "type",
         "name",
@@ -51,7 +59,13 @@ class PlantVarietyAdmin(admin.ModelAdmin):
         "planting_period",
         "duration_days",
     )
-    list_display = ("full_name", "type", "sowing_period", "planting_period", "duration_days")
+    list_display = (
+        "full_name",
+        "type",
+        "sowing_period",
+        "planting_period",
+        "duration_days",
+    )
     list_filter = ("type",)
     ordering = ("type__name", "name")
     prepopulated_fields = {"slug": ("name",)}
@@ -6,3 +6,6 @@ app_name = "catalogs"
 class CatalogsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "catalogs"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from core.db import db_executor
+from core.metrics import REGISTRY, Family
+from django.conf import settings
+from django.db.models import F
+
+from .models import CatalogVersion, PlantOperation, PlantStep, PlantType, PlantVariety
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable in-memory copy of the plant catalog. Never modify its objects."""
+
+    version: int
+    types_by_slug: dict[str, PlantType] = field(default_factory=dict)
+    varieties_by_slug: dict[tuple[int, str], PlantVariety] = field(default_factory=dict)
+    operations_by_type: dict[int, list[PlantOperation]] = field(default_factory=dict)
+    steps_by_type: dict[int, list[PlantStep]] = field(default_factory=dict)
+
+    def get_type(self, slug: str) -> PlantType | None:
+        return self.types_by_slug.get(slug)
+
+    def get_variety(self, plant_type: PlantType, slug: str) -> PlantVariety | None:
+        return self.varieties_by_slug.get((plant_type.pk, slug))
+
+    def get_operations(self, plant_type_id: int) -> list[PlantOperation]:
+        return self.operations_by_type.get(plant_type_id, [])
+
+    def get_steps(self, plant_type_id: int) -> list[PlantStep]:
+        return self.steps_by_type.get(plant_type_id, [])
+
+    @classmethod
+    def load(cls, version: int) -> "CatalogSnapshot":
+        types = {t.pk: t for t in PlantType.objects.all()}
+
+        varieties = {}
+        for variety in PlantVariety.objects.all():
+            variety.type = types[variety.type_id]
+            varieties[(variety.type_id, variety.slug)] = variety
+
+        operations = defaultdict(list)
+        for operation in PlantOperation.objects.order_by("id"):
+            operation.plant_type = types[operation.plant_type_id]
+            operations[operation.plant_type_id].append(operation)
+
+        steps = defaultdict(list)
+        for step in PlantStep.objects.order_by("step"):
+            step.plant_type = types[step.plant_type_id]
+            steps[step.plant_type_id].append(step)
+
+        return cls(
+            version=version,
+            types_by_slug={t.slug: t for t in types.values()},
+            varieties_by_slug=varieties,
+            operations_by_type=dict(operations),
+            steps_by_type=dict(steps),
+        )
+
+
+def get_catalog_version() -> int:
+    return (
+        CatalogVersion.objects.filter(pk=1).values_list("version", flat=True).first()
+        or 0
+    )
+
+
+def bump_catalog_version():
+    if CatalogVersion.objects.filter(pk=1).update(version=F("version") + 1) == 0:
+        CatalogVersion.objects.get_or_create(pk=1)
+        CatalogVersion.objects.filter(pk=1).update(version=F("version") + 1)
+
+
+class CatalogCache:
+    """
+    Process-wide, read-mostly cache of the catalog.
+
+    Local changes invalidate the snapshot immediately through signals. Changes
+    made by other workers are picked up once the version counter in the DB is
+    re-checked, at most `check_interval` seconds later.
+    """
+
+    def __init__(self, check_interval: float | None = None):
+        self._check_interval = check_interval
+        self._snapshot: CatalogSnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+
+    @property
+    def check_interval(self) -> float:
+        if self._check_interval is not None:
+            return self._check_interval
+        return settings.CATALOG_CACHE_CHECK_INTERVAL_SECONDS
+
+    def _fresh_snapshot(self) -> CatalogSnapshot | None:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            return None
+        self.hits += 1
+        return snapshot
+
+    def get(self) -> CatalogSnapshot:
+        snapshot = self._fresh_snapshot()
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._fresh_snapshot()
+            if snapshot is not None:
+                return snapshot
+
+            checked_at = time.monotonic()
+            version = get_catalog_version()
+            self.version_checks += 1
+
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                self.hits += 1
+            else:
+                self.misses += 1
+                snapshot = CatalogSnapshot.load(version)
+                logger.info("Loaded catalog snapshot version %s", version)
+
+            self._snapshot = snapshot
+            self._checked_at = checked_at
+            return snapshot
+
+    async def aget(self) -> CatalogSnapshot:
+        snapshot = self._fresh_snapshot()
+        if snapshot is not None:
+            return snapshot
+        return await db_executor.run(self.get)
+
+    def invalidate(self):
+        self._snapshot = None
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "version_checks": self.version_checks,
+        }
+
+
+catalog_cache = CatalogCache()
+
+
+def _collect_stats() -> list[Family]:
+    stats = catalog_cache.stats
+    return [
+        Family(
+            "catalog_cache_lookups_total",
+            "counter",
+            "Catalog cache lookups.",
+            [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])],
+        ),
+        Family(
+            "catalog_cache_version_checks_total",
+            "counter",
+            "Catalog version checks against the DB.",
+            [({}, stats["version_checks"])],
+        ),
+    ]
+
+
+REGISTRY.register_collector(_collect_stats)
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0006_catalogversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="planttype",
+            name="planting_end_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Конец высадки (день года)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="planttype",
+            name="planting_start_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Начало высадки (день года)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="planttype",
+            name="sowing_end_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Конец посадки (день года)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="planttype",
+            name="sowing_start_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Начало посадки (день года)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="plantvariety",
+            name="planting_end_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Конец высадки (день года)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="plantvariety",
+            name="planting_start_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Начало высадки (день года)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="plantvariety",
+            name="sowing_end_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Конец посадки (день года)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="plantvariety",
+            name="sowing_start_day",
+            field=models.PositiveSmallIntegerField(
+                editable=False, null=True, verbose_name="Начало посадки (день года)"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="planttype",
+            index=models.Index(
+                fields=["planting_start_day", "planting_end_day"],
+                name="catalogs_pl_plantin_b19c77_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="plantvariety",
+            index=models.Index(
+                fields=["planting_start_day", "planting_end_day"],
+                name="catalogs_pl_plantin_fccb91_idx",
+            ),
+        ),
+    ]
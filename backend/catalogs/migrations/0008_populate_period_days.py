@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:00
+
+from datetime import date
+
+from django.db import migrations
+
+ROMAN_MONTHS = {
+    "I": 1,
+    "II": 2,
+    "III": 3,
+    "IV": 4,
+    "V": 5,
+    "VI": 6,
+    "VII": 7,
+    "VIII": 8,
+    "IX": 9,
+    "X": 10,
+    "XI": 11,
+    "XII": 12,
+}
+
+
+def period_days(period):
+    if not period:
+        return None, None
+
+    try:
+        bounds = []
+        for bound in period.split("-"):
+            day, month = bound.split(".")
+            bounds.append(date(2000, ROMAN_MONTHS[month], int(day)).timetuple().tm_yday)
+        start_day, end_day = bounds
+    except (ValueError, KeyError):
+        return None, None
+
+    return start_day, end_day
+
+
+def populate_period_days(apps, schema_editor):
+    for model_name in ("PlantType", "PlantVariety"):
+        model = apps.get_model("catalogs", model_name)
+        for obj in model.objects.all():
+            obj.sowing_start_day, obj.sowing_end_day = period_days(obj.sowing_period)
+            obj.planting_start_day, obj.planting_end_day = period_days(
+                obj.planting_period
+            )
+            obj.save(
+                update_fields=[
+                    "sowing_start_day",
+                    "sowing_end_day",
+                    "planting_start_day",
+                    "planting_end_day",
+                ]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0007_period_days"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_period_days, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.core.validators import RegexValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from .periods import period_days
 
 PLANTING_PERIOD_REGEX = r"^(0[1-9]|[12][0-9]|3[01])\.(I|II|III|IV|V|VI|VII|VIII|IX|X|XI|XII)-(0[1-9]|[12][0-9]|3[01])\.(I|II|III|IV|V|VI|VII|VIII|IX|X|XI|XII)$"
 
@@ -26,8 +27,27 @@ class Operation(models.TextChoices):
     HILLING = "hilling", _("🪨 Окучивание")
 
 
+class PeriodDaysMixin:
+    """Keeps parsed day-of-year columns in sync with the period strings."""
+
+    PERIOD_DAY_FIELDS = {
+        "sowing_period": ("sowing_start_day", "sowing_end_day"),
+        "planting_period": ("planting_start_day", "planting_end_day"),
+    }
+
+    def save(self, *args, update_fields=None, **kwargs):
+        for period_field, day_fields in self.PERIOD_DAY_FIELDS.items():
+            start_day, end_day = period_days(getattr(self, period_field))
+            setattr(self, day_fields[0], start_day)
+            setattr(self, day_fields[1], end_day)
+            if update_fields is not None and period_field in update_fields:
+                update_fields = {*update_fields, *day_fields}
+
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
 # Create your models here.
-class PlantType(models.Model):
+class PlantType(PeriodDaysMixin, models.Model):
     id = models.AutoField(verbose_name=_("ИД"), primary_key=True)
     slug = models.SlugField(verbose_name=_("Код"), unique=True)
     name = models.CharField(verbose_name=_("Наименование"), max_length=128)
@@ -63,6 +83,27 @@ class PlantType(models.Model):
         ],
     )
 
+    sowing_start_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Начало посадки (день года)"),
+        null=True,
+        editable=False,
+    )
+    sowing_end_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Конец посадки (день года)"),
+        null=True,
+        editable=False,
+    )
+    planting_start_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Начало высадки (день года)"),
+        null=True,
+        editable=False,
+    )
+    planting_end_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Конец высадки (день года)"),
+        null=True,
+        editable=False,
+    )
+
     duration_days = models.IntegerField(verbose_name=_("Срок созревания (дн.)"))
 
     class Meta:
@@ -70,12 +111,13 @@ class PlantType(models.Model):
         verbose_name_plural = _("Типы")
 
         ordering = ["name"]
+        indexes = [models.Index(fields=["planting_start_day", "planting_end_day"])]
 
     def __str__(self):
         return f"{self.name}"
 
 
-class PlantVariety(models.Model):
+class PlantVariety(PeriodDaysMixin, models.Model):
     id = models.AutoField(verbose_name=_("ИД"), primary_key=True)
     type = models.ForeignKey(
         PlantType,
@@ -117,6 +159,27 @@ class PlantVariety(models.Model):
         ],
     )
 
+    sowing_start_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Начало посадки (день года)"),
+        null=True,
+        editable=False,
+    )
+    sowing_end_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Конец посадки (день года)"),
+        null=True,
+        editable=False,
+    )
+    planting_start_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Начало высадки (день года)"),
+        null=True,
+        editable=False,
+    )
+    planting_end_day = models.PositiveSmallIntegerField(
+        verbose_name=_("Конец высадки (день года)"),
+        null=True,
+        editable=False,
+    )
+
     duration_days = models.IntegerField(verbose_name=_("Срок созревания (дн.)"))
 
     class Meta:
@@ -126,6 +189,7 @@ class PlantVariety(models.Model):
         unique_together = ("type", "slug")
 
         ordering = ["name"]
+        indexes = [models.Index(fields=["planting_start_day", "planting_end_day"])]
 
     def __str__(self):
         return f"{self.name}"
@@ -205,3 +269,17 @@ class PlantOperation(models.Model):
 
     def __str__(self):
         return f"{self.name}"
+
+
+class CatalogVersion(models.Model):
+    """Single-row counter bumped on every catalog change, see `catalogs.cache`."""
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    version = models.PositiveBigIntegerField(verbose_name=_("Версия"), default=0)
+
+    class Meta:
+        verbose_name = _("Версия каталога")
+        verbose_name_plural = _("Версии каталога")
+
+    def __str__(self):
+        return f"{self.version}"
@@ -0,0 +1,93 @@
+from datetime import date
+
+from django.db.models import Case, F, IntegerField, Q, When
+
+ROMAN_MONTHS = {
+    "I": 1,
+    "II": 2,
+    "III": 3,
+    "IV": 4,
+    "V": 5,
+    "VI": 6,
+    "VII": 7,
+    "VIII": 8,
+    "IX": 9,
+    "X": 10,
+    "XI": 11,
+    "XII": 12,
+}
+
+# Days of year are counted in a leap year, so that 29.II has its own day and
+# every other date maps to the same number in any year.
+DAYS_IN_YEAR = 366
+_LEAP_YEAR = 2000
+
+
+def day_of_year(month: int, day: int) -> int:
+    return date(_LEAP_YEAR, month, day).timetuple().tm_yday
+
+
+def date_day_of_year(value: date) -> int:
+    return day_of_year(value.month, value.day)
+
+
+def parse_period(period: str) -> tuple[tuple[int, int], tuple[int, int]]:
+    """
+    Parse a 'DD.MM-DD.MM' period with roman months into (month, day) bounds.
+
+    Raises ValueError or KeyError for malformed values.
+    """
+    start_str, end_str = period.split("-")
+    start_day, start_month = start_str.split(".")
+    end_day, end_month = end_str.split(".")
+
+    start = (ROMAN_MONTHS[start_month], int(start_day))
+    end = (ROMAN_MONTHS[end_month], int(end_day))
+
+    # Reject dates such as 31.II
+    day_of_year(*start)
+    day_of_year(*end)
+
+    return start, end
+
+
+def period_days(period: str | None) -> tuple[int | None, int | None]:
+    """Day-of-year bounds of a period, or (None, None) if it is empty or malformed."""
+    if not period:
+        return None, None
+
+    try:
+        start, end = parse_period(period)
+    except (ValueError, KeyError):
+        return None, None
+
+    return day_of_year(*start), day_of_year(*end)
+
+
+def period_contains(start_field: str, end_field: str, day: date) -> Q:
+    """
+    Condition matching rows whose period contains `day`, including periods
+    wrapping the end of the year such as 01.XI-28.II.
+    """
+    doy = date_day_of_year(day)
+    return (
+        Q(**{f"{start_field}__lte": F(end_field)})
+        & Q(**{f"{start_field}__lte": doy})
+        & Q(**{f"{end_field}__gte": doy})
+    ) | (
+        Q(**{f"{start_field}__gt": F(end_field)})
+        & (Q(**{f"{start_field}__lte": doy}) | Q(**{f"{end_field}__gte": doy}))
+    )
+
+
+def period_start_order(start_field: str, day: date) -> Case:
+    """
+    Sort key placing periods by how long ago they started relative to `day`,
+    counting starts later in the year as belonging to the previous year.
+    """
+    doy = date_day_of_year(day)
+    return Case(
+        When(**{f"{start_field}__gt": doy}, then=F(start_field) - DAYS_IN_YEAR),
+        default=F(start_field),
+        output_field=IntegerField(),
+    )
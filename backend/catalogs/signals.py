@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version, catalog_cache
+from .models import PlantOperation, PlantStep, PlantType, PlantVariety
+
+
+@receiver(post_save, sender=PlantType)
+@receiver(post_save, sender=PlantVariety)
+@receiver(post_save, sender=PlantStep)
+@receiver(post_save, sender=PlantOperation)
+@receiver(post_delete, sender=PlantType)
+@receiver(post_delete, sender=PlantVariety)
+@receiver(post_delete, sender=PlantStep)
+@receiver(post_delete, sender=PlantOperation)
+def catalog_changed(sender, **kwargs):
+    catalog_cache.invalidate()
+    transaction.on_commit(bump_catalog_version)
+    # Another thread may have reloaded the previous state before this
+    # transaction was committed, so drop the snapshot once more afterwards.
+    transaction.on_commit(catalog_cache.invalidate)
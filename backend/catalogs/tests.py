@@ -1,3 +1,99 @@
-# from django.test import TestCase
+from django.db.models import F
+from django.test import TestCase
 
-# Create your tests here.
+from .cache import CatalogCache, catalog_cache
+from .models import CatalogVersion, PlantType, PlantVariety
+from .periods import period_days
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tomato = PlantType.objects.create(
+            slug="tomato", name="Tomato", description="", duration_days=100
+        )
+        cls.cherry = PlantVariety.objects.create(
+            type=cls.tomato,
+            slug="cherry",
+            name="Cherry",
+            description="",
+            duration_days=90,
+        )
+
+    def setUp(self):
+        catalog_cache.invalidate()
+
+    def test_snapshot_indexes(self):
+        snapshot = CatalogCache(check_interval=60).get()
+
+        self.assertEqual(snapshot.get_type("tomato"), self.tomato)
+        self.assertEqual(snapshot.get_variety(self.tomato, "cherry"), self.cherry)
+        self.assertIsNone(snapshot.get_variety(self.tomato, "unknown"))
+        self.assertEqual(snapshot.get_operations(self.tomato.pk), [])
+
+    def test_fresh_snapshot_is_served_without_queries(self):
+        cache = CatalogCache(check_interval=60)
+        cache.get()
+
+        with self.assertNumQueries(0):
+            snapshot = cache.get()
+            snapshot.get_variety(snapshot.get_type("tomato"), "cherry").type
+
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 1, "version_checks": 1})
+
+    def test_unchanged_version_keeps_snapshot(self):
+        cache = CatalogCache(check_interval=0)
+        snapshot = cache.get()
+
+        with self.assertNumQueries(1):
+            self.assertIs(cache.get(), snapshot)
+
+    def test_version_bump_by_another_worker_reloads_snapshot(self):
+        cache = CatalogCache(check_interval=0)
+        cache.get()
+
+        PlantType.objects.filter(pk=self.tomato.pk).update(slug="tomatoes")
+        CatalogVersion.objects.update_or_create(
+            pk=1, defaults={"version": F("version") + 1}, create_defaults={"version": 1}
+        )
+
+        self.assertIsNotNone(cache.get().get_type("tomatoes"))
+        self.assertEqual(cache.misses, 2)
+
+    def test_catalog_change_invalidates_snapshot(self):
+        catalog_cache.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tomato.slug = "tomatoes"
+            self.tomato.save()
+
+        self.assertIsNotNone(catalog_cache.get().get_type("tomatoes"))
+        self.assertEqual(CatalogVersion.objects.get().version, 1)
+
+
+class PeriodDaysTests(TestCase):
+    def test_period_days_follow_period_strings(self):
+        plant_type = PlantType.objects.create(
+            slug="garlic",
+            name="Garlic",
+            description="",
+            duration_days=100,
+            sowing_period="01.III-15.IV",
+            planting_period="01.XI-29.II",
+        )
+        self.assertEqual(
+            (plant_type.sowing_start_day, plant_type.sowing_end_day), (61, 106)
+        )
+        self.assertEqual(
+            (plant_type.planting_start_day, plant_type.planting_end_day), (306, 60)
+        )
+
+        plant_type.planting_period = None
+        plant_type.save(update_fields=["planting_period"])
+        plant_type.refresh_from_db()
+        self.assertIsNone(plant_type.planting_start_day)
+        self.assertIsNone(plant_type.planting_end_day)
+
+    def test_malformed_period_has_no_days(self):
+        self.assertEqual(period_days("31.II-01.III"), (None, None))
+        self.assertEqual(period_days("01.XIII-01.III"), (None, None))
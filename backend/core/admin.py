@@ -0,0 +1,19 @@
+from .routers import use_replica
+
+
+class ReplicaChangeListMixin:
+    """
+    Read admin changelists from the replica. POSTs, i.e. actions and
+    `list_editable` saves, stay on the primary so they act on current rows.
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in ("GET", "HEAD"):
+            return super().changelist_view(request, extra_context)
+
+        with use_replica():
+            response = super().changelist_view(request, extra_context)
+            # Lazy template responses run their queries when rendered
+            if hasattr(response, "render"):
+                response.render()
+            return response
@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from .lifespan import LifespanApplication
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+application = LifespanApplication(get_asgi_application())
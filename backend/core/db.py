@@ -0,0 +1,199 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+
+from .metrics import Counter as MetricCounter
+
+T = TypeVar("T")
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    duration: float = 0.0
+    by_alias: Counter = field(default_factory=Counter)
+
+
+_current_stats: ContextVar[tuple[QueryStats, ...]] = ContextVar(
+    "query_stats", default=()
+)
+
+
+queries_total = MetricCounter(
+    "db_queries_total", "DB queries per database alias.", ("alias",)
+)
+
+
+def _count_queries(execute, sql, params, many, context):
+    alias = context["connection"].alias
+    queries_total.inc(alias)
+    active = _current_stats.get()
+    if not active:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for stats in active:
+            stats.count += 1
+            stats.duration += duration
+            stats.by_alias[alias] += 1
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+def install_query_tracking():
+    """
+    Count queries of every DB connection, in any thread, towards the
+    `track_queries()` block that issued them.
+
+    Connections opened before the call are only covered in the calling thread.
+    """
+    connection_created.connect(_install_wrapper, dispatch_uid="core.db.track_queries")
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(None, connection)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Collect queries issued in the current context, including ORM calls made
+    through `sync_to_async`, which runs them with a copy of the context.
+    Nested blocks count the same queries as the enclosing ones.
+    """
+    stats = QueryStats()
+    token = _current_stats.set((*_current_stats.get(), stats))
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+class DatabaseExecutor:
+    """
+    Thread pool running ORM work of async code.
+
+    `sync_to_async` runs every ORM call on a single thread, so that only one
+    query is in flight per process. The pool runs up to `DB_EXECUTOR_WORKERS`
+    calls in parallel instead. Each call is handled like a request: with
+    `CONN_MAX_AGE` 0 its connections are closed afterwards, otherwise each
+    thread keeps its own connection for `CONN_MAX_AGE` seconds. Connections
+    of a thread that was idle for `IDLE_HEALTH_CHECK_SECONDS` are health
+    checked before reuse. With 0 workers calls go through `sync_to_async`.
+    """
+
+    IDLE_HEALTH_CHECK_SECONDS = 10.0
+
+    def __init__(self, workers: int | None = None):
+        self._workers = workers
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_size = 0
+        self._lock = threading.Lock()
+        # Time of the last call finished by each pool thread
+        self._local = threading.local()
+
+    @property
+    def workers(self) -> int:
+        if self._workers is not None:
+            return self._workers
+        return settings.DB_EXECUTOR_WORKERS
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        workers = self.workers
+        with self._lock:
+            if self._pool is None or self._pool_size != workers:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                self._pool = ThreadPoolExecutor(workers, thread_name_prefix="db")
+                self._pool_size = workers
+            return self._pool
+
+    def _call(self, func: Callable[..., T], args, kwargs) -> T:
+        now = time.monotonic()
+        last_call = getattr(self._local, "last_call", None)
+        idle = last_call is None or now - last_call >= self.IDLE_HEALTH_CHECK_SECONDS
+        for connection in connections.all(initialized_only=True):
+            expired = connection.close_at is not None and now >= connection.close_at
+            if idle or expired or connection.errors_occurred:
+                # Closes obsolete connections, health checks the others on use
+                connection.close_if_unusable_or_obsolete()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for connection in connections.all(initialized_only=True):
+                if connection.settings_dict["CONN_MAX_AGE"] == 0:
+                    connection.close()
+            self._local.last_call = time.monotonic()
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call `func` in the pool with the current context, e.g. query tracking."""
+        if not self.enabled:
+            return await sync_to_async(func)(*args, **kwargs)
+
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_pool(),
+            functools.partial(context.run, self._call, func, args, kwargs),
+        )
+
+    async def shutdown(self):
+        """Close the connections kept by pool threads and stop the threads."""
+        with self._lock:
+            pool, size = self._pool, self._pool_size
+            self._pool = None
+        if pool is None:
+            return
+
+        # Every thread closes its own connections, the barrier keeps each
+        # thread from taking more than one call
+        barrier = threading.Barrier(size)
+
+        def close():
+            connections.close_all()
+            barrier.wait(timeout=5)
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(pool, close) for _ in range(size)),
+            return_exceptions=True,
+        )
+        pool.shutdown(wait=False)
+
+
+db_executor = DatabaseExecutor()
+
+
+async def run_in_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Call `func` with ORM work in a single transaction and a single hop to the
+    database executor, instead of one hop for each async ORM call.
+    """
+
+    def atomic_call():
+        with transaction.atomic():
+            return func(*args, **kwargs)
+
+    return await db_executor.run(atomic_call)
@@ -0,0 +1,73 @@
+"""
+Shutdown hooks for the ASGI application and the polling bot.
+
+Servers speaking the ASGI lifespan protocol (uvicorn, hypercorn) run them on
+`lifespan.shutdown`. Daphne doesn't, so the hooks are attached to the shutdown
+of its Twisted reactor when the first request arrives. `runbot` runs them once
+polling stops.
+"""
+
+import asyncio
+import logging
+import sys
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+ShutdownHook = Callable[[], Awaitable[None]]
+
+_shutdown_hooks: list[ShutdownHook] = []
+
+
+def on_shutdown(hook: ShutdownHook) -> ShutdownHook:
+    if hook not in _shutdown_hooks:
+        _shutdown_hooks.append(hook)
+    return hook
+
+
+async def run_shutdown_hooks():
+    for hook in _shutdown_hooks:
+        try:
+            await hook()
+        except Exception:
+            logger.exception("Shutdown hook %r failed", hook)
+
+
+class LifespanApplication:
+    def __init__(self, app):
+        self.app = app
+        self._hooked = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        if not self._hooked:
+            self._hooked = True
+            self._hook_reactor()
+        await self.app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._hooked = True
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await run_shutdown_hooks()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _hook_reactor(self):
+        reactor = sys.modules.get("twisted.internet.reactor")
+        if reactor is None or not reactor.running:
+            return
+
+        from twisted.internet.defer import Deferred
+
+        reactor.addSystemEventTrigger(
+            "before",
+            "shutdown",
+            lambda: Deferred.fromFuture(asyncio.ensure_future(run_shutdown_hooks())),
+        )
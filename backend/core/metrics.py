@@ -0,0 +1,242 @@
+"""
+Process-local metrics in Prometheus text format.
+
+Every thread writes to its own shard, so recording a value takes no lock; the
+shards are only summed when the metrics are scraped.
+"""
+
+import math
+import threading
+from collections.abc import Callable, Iterable, Sequence
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# (labels, value) pairs of a metric family
+Samples = Iterable[tuple[dict[str, str], float]]
+
+
+class _Shard:
+    __slots__ = ("values", "histograms")
+
+    def __init__(self):
+        self.values: dict[tuple, float] = {}
+        self.histograms: dict[tuple, list[float]] = {}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, "_Metric"] = {}
+        self._collectors: list[Callable[[], Iterable["Family"]]] = []
+        self._shards: list[_Shard] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable["Family"]]):
+        """Register a callable returning families computed at scrape time."""
+        self._collectors.append(collector)
+
+    def _merged(self) -> tuple[dict[tuple, float], dict[tuple, list[float]]]:
+        values: dict[tuple, float] = {}
+        histograms: dict[tuple, list[float]] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # Copies are atomic under the GIL, the owner thread may keep writing
+            for key, value in list(shard.values.items()):
+                values[key] = values.get(key, 0.0) + value
+            for key, counts in list(shard.histograms.items()):
+                merged = histograms.setdefault(key, [0.0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    merged[i] += count
+        return values, histograms
+
+    def collect(self) -> list["Family"]:
+        values, histograms = self._merged()
+        families = [
+            metric.family(values, histograms) for metric in self._metrics.values()
+        ]
+        for collector in self._collectors:
+            families.extend(collector())
+        return families
+
+    def render(self) -> str:
+        lines = []
+        for family in self.collect():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop recorded values, for tests."""
+        with self._lock:
+            for shard in self._shards:
+                shard.values.clear()
+                shard.histograms.clear()
+
+
+class Family:
+    def __init__(self, name: str, type_: str, documentation: str, samples: Samples):
+        self.name = name
+        self.type = type_
+        self.documentation = documentation
+        self.samples = samples
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {_escape_help(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(
+            f"{name}{_format_labels(labels)} {_format_value(value)}"
+            for name, labels, value in self._rows()
+        )
+        return lines
+
+    def _rows(self):
+        for labels, value in self.samples:
+            yield self.name, labels, value
+
+
+class _HistogramFamily(Family):
+    def __init__(self, name, documentation, buckets, samples):
+        super().__init__(name, "histogram", documentation, samples)
+        self.buckets = buckets
+
+    def _rows(self):
+        for labels, counts in self.samples:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": str(bound)}, cumulative
+            cumulative += counts[len(self.buckets)]
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, cumulative
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class _Metric:
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def _key(self, labelvalues: Sequence[str]) -> tuple:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return (self.name, *labelvalues)
+
+    def _labels(self, key: tuple) -> dict[str, str]:
+        return dict(zip(self.labelnames, key[1:]))
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        values = self.registry.shard().values
+        key = self._key(labelvalues)
+        values[key] = values.get(key, 0.0) + amount
+
+    def family(self, values, histograms) -> Family:
+        samples = [
+            (self._labels(key), value)
+            for key, value in values.items()
+            if key[0] == self.name
+        ]
+        return Family(self.name, self.type, self.documentation, samples)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str):
+        histograms = self.registry.shard().histograms
+        key = self._key(labelvalues)
+        # One count per bucket, the +Inf bucket, then the sum
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[len(self.buckets)] += 1
+        counts[-1] += value
+
+    def family(self, values, histograms) -> Family:
+        samples = [
+            (self._labels(key), counts)
+            for key, counts in histograms.items()
+            if key[0] == self.name
+        ]
+        return _HistogramFamily(self.name, self.documentation, self.buckets, samples)
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
@@ -0,0 +1,66 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from .db import install_query_tracking, track_queries
+from .metrics import Counter, Histogram
+
+REQUEST_LABELS = ("view", "method")
+
+requests_total = Counter(
+    "http_requests_total", "HTTP requests.", (*REQUEST_LABELS, "status")
+)
+request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", REQUEST_LABELS
+)
+request_db_queries_total = Counter(
+    "http_request_db_queries_total", "DB queries made by HTTP requests.", REQUEST_LABELS
+)
+request_db_duration_seconds_total = Counter(
+    "http_request_db_duration_seconds_total",
+    "Time spent in DB queries by HTTP requests.",
+    REQUEST_LABELS,
+)
+
+
+def _record(request, response, start, queries):
+    match = request.resolver_match
+    labels = (match.view_name if match else "unmatched", request.method)
+    status = str(response.status_code) if response is not None else "500"
+    request_duration_seconds.observe(time.perf_counter() - start, *labels)
+    requests_total.inc(*labels, status)
+    request_db_queries_total.inc(*labels, amount=queries.count)
+    request_db_duration_seconds_total.inc(*labels, amount=queries.duration)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Record latency, status and DB usage of every request per view."""
+    install_query_tracking()
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            response = None
+            start = time.perf_counter()
+            with track_queries() as queries:
+                try:
+                    response = await get_response(request)
+                    return response
+                finally:
+                    _record(request, response, start, queries)
+
+    else:
+
+        def middleware(request):
+            response = None
+            start = time.perf_counter()
+            with track_queries() as queries:
+                try:
+                    response = get_response(request)
+                    return response
+                finally:
+                    _record(request, response, start, queries)
+
+    return middleware
@@ -0,0 +1,86 @@
+"""
+Routing of reads to a read replica.
+
+Reads go to the `replica` database inside `use_replica()` blocks, such as bot
+handlers decorated with `read_only`. The first write of a block pins the rest
+of it to the primary, so that the block reads its own writes.
+"""
+
+import functools
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = "replica"
+
+
+@dataclass
+class _Routing:
+    pinned: bool = False
+
+
+# Shared by copies of the context, e.g. in the database executor, so that a
+# write in any of them pins the whole block
+_routing: ContextVar[_Routing | None] = ContextVar("db_routing", default=None)
+
+
+def replica_configured() -> bool:
+    return settings.DATABASE_REPLICA_ENABLED
+
+
+@contextmanager
+def use_replica() -> Iterator[None]:
+    if _routing.get() is not None:
+        # Nested blocks share the pinning of the outer one
+        yield
+        return
+
+    token = _routing.set(_Routing())
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def read_only(handler):
+    """Route reads of an async handler to the replica."""
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        with use_replica():
+            return await handler(*args, **kwargs)
+
+    return wrapper
+
+
+def pin_primary():
+    """Read from the primary for the rest of the current block."""
+    routing = _routing.get()
+    if routing is not None:
+        routing.pinned = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or routing.pinned or not replica_configured():
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        # Objects read from the replica are saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica receives the schema through replication, only the
+        # separate database of tests is migrated
+        return db != REPLICA or not replica_configured()
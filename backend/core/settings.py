@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 import environ
@@ -74,6 +75,7 @@ if DEBUG:
     INSTALLED_APPS.append("debug_toolbar")
 
 MIDDLEWARE = [
+    "core.middleware.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -112,9 +114,42 @@ ASGI_APPLICATION = "core.asgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# CONN_MAX_AGE also applies to each call of the database executor, set
+# DATABASE_CONN_MAX_AGE to keep its threads' connections open between calls
 DATABASES = {
-    "default": env.db(),
+    "default": {
+        "CONN_MAX_AGE": env.int("DATABASE_CONN_MAX_AGE", default=0),
+        "CONN_HEALTH_CHECKS": True,
+        **env.db(),
+    },
 }
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # SQLite has a single writer: take the write lock when a transaction starts,
+    # so that concurrent transactions wait for it instead of failing
+    DATABASES["default"].setdefault("OPTIONS", {}).setdefault(
+        "transaction_mode", "IMMEDIATE"
+    )
+
+TESTING = sys.argv[1:2] == ["test"]
+
+# Read-only bot commands and admin changelists read from this database
+DATABASE_REPLICA_ENABLED = bool(env("DATABASE_REPLICA_URL", default=None))
+if TESTING:
+    # A separate database, so that tests of the replica routing, which enable
+    # it with override_settings, can tell which database was read
+    DATABASE_REPLICA_ENABLED = False
+    DATABASES["replica"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+elif DATABASE_REPLICA_ENABLED:
+    DATABASES["replica"] = {
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "CONN_HEALTH_CHECKS": True,
+        **env.db("DATABASE_REPLICA_URL"),
+    }
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+
+# Threads running ORM calls of the bot in parallel, 0 runs them on the single
+# thread of `sync_to_async`
+DB_EXECUTOR_WORKERS = env.int("DB_EXECUTOR_WORKERS", default=0)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -177,6 +212,23 @@ BOT_TOKEN = env("BOT_TOKEN")
 BOT_WEBHOOK_URL = env("BOT_WEBHOOK_URL", default=None)
 BOT_WEBHOOK_TOKEN = env("BOT_WEBHOOK_TOKEN", default=None)
 BOT_DROP_PENDING_UPDATES = env.bool("BOT_DROP_PENDING_UPDATES", default=True)
+BOT_API_SERVER = env("BOT_API_SERVER", default=None)
+BOT_WEBHOOK_REPLY = env.bool("BOT_WEBHOOK_REPLY", default=True)
+BOT_WEBHOOK_QUEUE_SIZE = env.int("BOT_WEBHOOK_QUEUE_SIZE", default=0)
+BOT_WEBHOOK_WORKERS = env.int("BOT_WEBHOOK_WORKERS", default=8)
+BOT_WEBHOOK_DRAIN_TIMEOUT_SECONDS = env.float(
+    "BOT_WEBHOOK_DRAIN_TIMEOUT_SECONDS", default=20
+)
+BOT_POLLING_WORKERS = env.int("BOT_POLLING_WORKERS", default=4)
+BOT_UPDATE_DEDUP_SIZE = env.int("BOT_UPDATE_DEDUP_SIZE", default=10000)
+BOT_UPDATE_DEDUP_DB = env.bool("BOT_UPDATE_DEDUP_DB", default=False)
+BOT_UPDATE_DEDUP_RETENTION_HOURS = env.int(
+    "BOT_UPDATE_DEDUP_RETENTION_HOURS", default=24
+)
+BOT_IDENTITY_CACHE_SIZE = env.int("BOT_IDENTITY_CACHE_SIZE", default=10000)
+BOT_IDENTITY_CACHE_TTL_SECONDS = env.float(
+    "BOT_IDENTITY_CACHE_TTL_SECONDS", default=300
+)
 
 # LLM providers
 
@@ -184,3 +236,43 @@ OPENROUTER_API_KEY = env("OPENROUTER_API_KEY", default="")
 LLM_DEFAULT_MODEL = env("LLM_DEFAULT_MODEL", default="openai/gpt-4o-mini")
 LLM_REQUEST_TIMEOUT_SECONDS = env.int("LLM_REQUEST_TIMEOUT_SECONDS", default=30)
 LLM_MAX_RETRIES = env.int("LLM_MAX_RETRIES", default=2)
+LLM_MAX_CONNECTIONS = env.int("LLM_MAX_CONNECTIONS", default=20)
+LLM_USER_DAILY_TOKEN_QUOTA = env.int("LLM_USER_DAILY_TOKEN_QUOTA", default=0)
+LLM_USAGE_FLUSH_INTERVAL_SECONDS = env.float(
+    "LLM_USAGE_FLUSH_INTERVAL_SECONDS", default=30
+)
+LLM_USAGE_FLUSH_SIZE = env.int("LLM_USAGE_FLUSH_SIZE", default=500)
+LLM_HEDGE_TARGETS = env.list("LLM_HEDGE_TARGETS", default=[])
+LLM_HEDGE_PERCENTILE = env.float("LLM_HEDGE_PERCENTILE", default=0.95)
+LLM_HEDGE_DELAY_SECONDS = env.float("LLM_HEDGE_DELAY_SECONDS", default=5)
+LLM_BATCH_CONCURRENCY = env.int("LLM_BATCH_CONCURRENCY", default=8)
+LLM_REQUESTS_PER_MINUTE = env.float("LLM_REQUESTS_PER_MINUTE", default=600)
+LLM_TOKENS_PER_MINUTE = env.float("LLM_TOKENS_PER_MINUTE", default=0)
+LLM_CIRCUIT_BREAKER_FAILURES = env.int("LLM_CIRCUIT_BREAKER_FAILURES", default=5)
+LLM_CIRCUIT_BREAKER_RESET_SECONDS = env.float(
+    "LLM_CIRCUIT_BREAKER_RESET_SECONDS", default=30
+)
+LLM_COALESCE_REQUESTS = env.bool("LLM_COALESCE_REQUESTS", default=True)
+LLM_CACHE_SIZE = env.int("LLM_CACHE_SIZE", default=1000)
+LLM_CACHE_TTL_SECONDS = env.float("LLM_CACHE_TTL_SECONDS", default=86400)
+LLM_CACHE_DIR = env("LLM_CACHE_DIR", default=None)
+LLM_CACHE_DISK_MAX_MB = env.int("LLM_CACHE_DISK_MAX_MB", default=100)
+LLM_CACHE_MAX_TEMPERATURE = env.float("LLM_CACHE_MAX_TEMPERATURE", default=0.7)
+
+# Diary context of LLM prompts
+
+DIARY_CONTEXT_TOKEN_BUDGET = env.int("DIARY_CONTEXT_TOKEN_BUDGET", default=1500)
+DIARY_CONTEXT_CACHE_SIZE = env.int("DIARY_CONTEXT_CACHE_SIZE", default=1000)
+DIARY_CONTEXT_CACHE_TTL_SECONDS = env.float(
+    "DIARY_CONTEXT_CACHE_TTL_SECONDS", default=300
+)
+
+# Catalog cache
+
+CATALOG_CACHE_CHECK_INTERVAL_SECONDS = env.float(
+    "CATALOG_CACHE_CHECK_INTERVAL_SECONDS", default=30
+)
+
+# Metrics
+
+METRICS_TOKEN = env("METRICS_TOKEN", default=None)
@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from . import lifespan
+from .admin import ReplicaChangeListMixin
+from .caching import TTLCache
+from .db import DatabaseExecutor, install_query_tracking, run_in_db, track_queries
+from .metrics import Counter, Histogram, Registry
+from .routers import REPLICA, ReplicaRouter, read_only, use_replica
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=10, ttl=5)
+        with patch("core.caching.time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=20)
+        with patch("core.caching.time.monotonic", return_value=110):
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), 2)
+        self.assertEqual(len(cache), 1)
+
+
+class RegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counters_are_summed_across_threads(self):
+        counter = Counter("jobs_total", "Jobs.", ("kind",), registry=self.registry)
+
+        def work():
+            for _ in range(1000):
+                counter.inc("a")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc("b", amount=2.5)
+
+        output = self.registry.render()
+        self.assertIn("# TYPE jobs_total counter", output)
+        self.assertIn('jobs_total{kind="a"} 4000', output)
+        self.assertIn('jobs_total{kind="b"} 2.5', output)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram(
+            "latency_seconds", "Latency.", buckets=(0.1, 1), registry=self.registry
+        )
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value)
+
+        output = self.registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', output)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', output)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', output)
+        self.assertIn("latency_seconds_sum 4.25", output)
+        self.assertIn("latency_seconds_count 4", output)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("text_total", "Text.", ("value",), registry=self.registry)
+        counter.inc('say "hi"\n')
+        self.assertIn(r'text_total{value="say \"hi\"\n"} 1', self.registry.render())
+
+
+class MetricsViewTests(TestCase):
+    def test_scrape(self):
+        self.client.get("/metrics/")
+        response = self.client.get("/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            'http_requests_total{view="metrics",method="GET",status="200"}',
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 401)
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN=None)
+    def test_only_internal_ips_without_token(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 200)
+        response = self.client.get("/metrics/", REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(response.status_code, 403)
+
+
+class LifespanTests(SimpleTestCase):
+    async def test_shutdown_hooks_run_on_lifespan_shutdown(self):
+        calls = []
+
+        async def hook():
+            calls.append("shutdown")
+
+        self.addCleanup(lifespan._shutdown_hooks.remove, hook)
+        lifespan.on_shutdown(hook)
+
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        app = lifespan.LifespanApplication(None)
+        await app({"type": "lifespan"}, receive, send)
+
+        self.assertEqual(calls, ["shutdown"])
+        self.assertEqual(
+            sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
+
+
+class DatabaseExecutorTests(TransactionTestCase):
+    def setUp(self):
+        self.executor = DatabaseExecutor(workers=2)
+
+    def tearDown(self):
+        async_to_sync(self.executor.shutdown)()
+
+    async def test_calls_run_in_parallel(self):
+        barrier = threading.Barrier(2)
+
+        def wait():
+            barrier.wait(timeout=5)
+            return threading.current_thread().name
+
+        names = await asyncio.gather(self.executor.run(wait), self.executor.run(wait))
+        self.assertEqual(len(set(names)), 2)
+        self.assertTrue(all(name.startswith("db") for name in names))
+
+    async def test_queries_are_tracked_in_pool_threads(self):
+        install_query_tracking()
+        with track_queries() as queries:
+            await self.executor.run(Group.objects.create, name="a")
+            await self.executor.run(Group.objects.count)
+        self.assertEqual(queries.count, 2)
+
+    async def test_health_check_only_after_idle(self):
+        executor = DatabaseExecutor(workers=1)
+        self.addCleanup(async_to_sync(executor.shutdown))
+        wrapper = type(connections["default"])
+
+        with (
+            patch.dict(connection.settings_dict, CONN_MAX_AGE=None),
+            patch.object(wrapper, "is_usable", return_value=True) as is_usable,
+        ):
+            await executor.run(Group.objects.count)
+            await executor.run(Group.objects.count)
+            self.assertEqual(is_usable.call_count, 0)
+
+            executor.IDLE_HEALTH_CHECK_SECONDS = 0
+            await executor.run(Group.objects.count)
+            self.assertEqual(is_usable.call_count, 1)
+
+    async def test_connections_are_closed_after_calls_without_max_age(self):
+        wrapper = type(connections["default"])
+        with (
+            patch.dict(connection.settings_dict, CONN_MAX_AGE=0),
+            patch.object(wrapper, "close") as close,
+        ):
+            await self.executor.run(Group.objects.count)
+        close.assert_called()
+
+    async def test_run_in_db_rolls_back_on_error(self):
+        def create_and_fail():
+            Group.objects.create(name="a")
+            raise ValueError
+
+        with (
+            patch("core.db.db_executor", self.executor),
+            self.assertRaises(ValueError),
+        ):
+            await run_in_db(create_and_fail)
+        self.assertFalse(await Group.objects.filter(name="a").aexists())
+
+
+@patch("core.routers.replica_configured", return_value=True)
+class ReplicaRouterTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def test_reads_use_replica_in_block(self, _):
+        self.assertIsNone(self.router.db_for_read(Group))
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Group), REPLICA)
+        self.assertIsNone(self.router.db_for_read(Group))
+
+    def test_write_pins_rest_of_block_to_primary(self, _):
+        with use_replica():
+            # e.g. from the database executor, which runs with a copied context
+            write_db = contextvars.copy_context().run(self.router.db_for_write, Group)
+            self.assertEqual(write_db, "default")
+            self.assertIsNone(self.router.db_for_read(Group))
+            with use_replica():
+                self.assertIsNone(self.router.db_for_read(Group))
+
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Group), REPLICA)
+
+    def test_admin_changelist_posts_use_primary(self, _):
+        routes = []
+
+        class ChangeList:
+            def changelist_view(self, request, extra_context=None):
+                routes.append(ReplicaRouter().db_for_read(Group))
+                return HttpResponse()
+
+        class Admin(ReplicaChangeListMixin, ChangeList):
+            pass
+
+        factory = RequestFactory()
+        Admin().changelist_view(factory.get("/"))
+        Admin().changelist_view(factory.post("/", {"action": "delete_selected"}))
+
+        self.assertEqual(routes, [REPLICA, None])
+
+    async def test_read_only_handler(self, _):
+        @read_only
+        async def handler(message, user=None):
+            return self.router.db_for_read(Group)
+
+        self.assertEqual(await handler("message", user=None), REPLICA)
+        self.assertIsNone(self.router.db_for_read(Group))
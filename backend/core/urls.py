@@ -23,6 +23,8 @@ from django.urls import include, path
 from django.views.debug import technical_500_response
 from django.views.defaults import server_error
 
+from .views import metrics
+
 
 def handler500(request):
     if request.user.is_superuser:
@@ -34,6 +36,7 @@ def handler500(request):
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("bot/", include("bot.urls")),
+    path("metrics/", metrics, name="metrics"),
 ]
 
 if conf.settings.DEBUG:
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.http import HttpResponse
+
+from .metrics import REGISTRY
+
+
+def metrics(request):
+    """
+    Metrics of this process in Prometheus text format. Without
+    `METRICS_TOKEN`, only `INTERNAL_IPS` may scrape them unless DEBUG is on.
+    """
+    if settings.METRICS_TOKEN:
+        if request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+            return HttpResponse("", status=401)
+    elif not settings.DEBUG and request.META.get("REMOTE_ADDR") not in (
+        settings.INTERNAL_IPS
+    ):
+        return HttpResponse("", status=403)
+
+    return HttpResponse(
+        REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
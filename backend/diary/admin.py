@@ -1,9 +1,12 @@
+from datetime import timedelta
 from typing import Any, Iterator
 
 from catalogs.models import PlantStep
+from core.admin import ReplicaChangeListMixin
 from django.contrib import admin
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from .models import Plant, PlantEvent, Profile, SeedStock
@@ -11,7 +14,7 @@ from .models import Plant, PlantEvent, Profile, SeedStock
 
 # Register your models here.
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
+class ProfileAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ("user", "timezone")
     list_filter = ("timezone",)
     search_fields = ("user__username", "user__email")
@@ -44,19 +47,61 @@ class PlantEventInline(admin.TabularInline):
         return super().get_queryset(request).prefetch_related("step")
 
 
+class HarvestDateFilter(admin.SimpleListFilter):
+    title = _("Дата сбора")
+    parameter_name = "harvest"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("past", _("Прошла")),
+            ("week", _("В ближайшие 7 дней")),
+            ("month", _("В ближайшие 30 дней")),
+            ("later", _("Позже")),
+            ("unknown", _("Неизвестна")),
+        )
+
+    def queryset(self, request, queryset):
+        today = timezone.localdate()
+        if self.value() == "past":
+            return queryset.filter(harvest_date__lt=today)
+        if self.value() == "week":
+            return queryset.filter(
+                harvest_date__gte=today, harvest_date__lt=today + timedelta(days=7)
+            )
+        if self.value() == "month":
+            return queryset.filter(
+                harvest_date__gte=today, harvest_date__lt=today + timedelta(days=30)
+            )
+        if self.value() == "later":
+            return queryset.filter(harvest_date__gte=today + timedelta(days=30))
+        if self.value() == "unknown":
+            return queryset.filter(harvest_date__isnull=True)
+        return queryset
+
+
 @admin.register(Plant)
-class PlantAdmin(admin.ModelAdmin):
+class PlantAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = (
         "name",
         "type_name",
         "variety_name",
         "planting_period",
+        "current_step",
+        "current_step_date",
         "planned_harvest_date",
         "user",
         "created_at",
         "updated_at",
     )
-    list_filter = ("user", "type", "variety", "created_at", "updated_at")
+    list_filter = (
+        "user",
+        "type",
+        "variety",
+        "current_step",
+        HarvestDateFilter,
+        "created_at",
+        "updated_at",
+    )
     search_fields = ("name",)
     date_hierarchy = "created_at"
     inlines = [PlantEventInline]
@@ -73,12 +118,17 @@ class PlantAdmin(admin.ModelAdmin):
     def planting_period(self, obj):
         return obj.planting_period
 
-    @admin.display(description=_("Дата сбора"))
+    @admin.display(ordering="harvest_date", description=_("Дата сбора"))
     def planned_harvest_date(self, obj):
         return obj.planned_harvest_date
 
     def get_queryset(self, request: HttpRequest) -> QuerySet:
-        return super().get_queryset(request).select_related("type", "variety", "user")
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("type", "variety", "user")
+            .with_harvest_date()
+        )
 
     def get_formsets_with_inlines(
         self, request: HttpRequest, obj=None
@@ -95,7 +145,7 @@ class PlantAdmin(admin.ModelAdmin):
 
 
 @admin.register(SeedStock)
-class SeedStockAdmin(admin.ModelAdmin):
+class SeedStockAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ("user", "type", "variety", "quantity")
     list_filter = ("user", "type", "variety")
     search_fields = ("user__username", "type__name", "variety__name")
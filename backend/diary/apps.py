@@ -6,3 +6,6 @@ app_name = "diary"
 class DiaryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "diary"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,317 @@
+"""
+Compact description of a user's diary for LLM prompts.
+
+`build_diary_context` renders the user's plants with their current steps,
+recent events, seed stock and the catalog descriptions of the current steps
+and their operations, as text or JSON. It runs three queries, plus those of
+the catalog cache when its snapshot is stale. Rendered contexts are cached
+per user until the diary of the user changes.
+"""
+
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any
+
+from catalogs.cache import CatalogSnapshot, catalog_cache
+from catalogs.models import Operation, Step
+from core.caching import TTLCache
+from core.db import db_executor
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Plant, PlantEvent, SeedStock
+
+# Events of all plants included, newest first
+RECENT_EVENTS = 20
+# Length catalog descriptions are cut to when the full context is too long
+SHORT_DESCRIPTION_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 characters per token."""
+    return math.ceil(len(text) / 4)
+
+
+def _step_name(step: str) -> str:
+    # Labels start with emojis, which only cost tokens
+    return str(Step(step).label).split(" ", 1)[-1]
+
+
+def _operation_name(operation: str) -> str:
+    return str(Operation(operation).label).split(" ", 1)[-1]
+
+
+def _shorten(text: str, limit: int | None) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    if limit is None or len(text) <= limit:
+        return text
+    return text[: limit - 1].rstrip() + "…"
+
+
+@dataclass
+class _Section:
+    key: str
+    title: str
+    # Text line and JSON object of each item, most important first
+    items: list[tuple[str, dict[str, Any]]] = field(default_factory=list)
+    omitted: int = 0
+
+
+@dataclass
+class DiaryData:
+    today: date
+    plants: list[Plant]
+    events: list[PlantEvent]
+    seeds: list[SeedStock]
+    catalog: CatalogSnapshot
+
+
+def load_diary_data(user_id: int, today: date | None = None) -> DiaryData:
+    """Everything the context shows, in three queries and the catalog cache."""
+    plants = list(
+        Plant.objects.filter(user_id=user_id)
+        .select_related("type", "variety")
+        .with_harvest_date()
+        .order_by("pk")
+    )
+    events = list(
+        PlantEvent.objects.filter(plant__user_id=user_id)
+        .select_related("step", "plant")
+        .order_by("-date", "-pk")[:RECENT_EVENTS]
+    )
+    seeds = list(
+        SeedStock.objects.filter(user_id=user_id, quantity__gt=0)
+        .select_related("type", "variety")
+        .order_by("type__name", "variety__name")
+    )
+    return DiaryData(
+        today=today or timezone.localdate(),
+        plants=plants,
+        events=events,
+        seeds=seeds,
+        catalog=catalog_cache.get(),
+    )
+
+
+def _sections(data: DiaryData, description_chars: int | None) -> list[_Section]:
+    plants = _Section("plants", "Растения")
+    steps = _Section("steps", "Описание этапов")
+    operations = _Section("operations", "Операции")
+    events = _Section("events", "Недавние события")
+    seeds = _Section("seeds", "Запас семян")
+
+    seen_steps = set()
+    seen_operations = set()
+    for plant in data.plants:
+        line = plant.name
+        item: dict[str, Any] = {"name": plant.name}
+        if plant.current_step:
+            step = _step_name(plant.current_step)
+            line += f": {step} с {plant.current_step_date:%Y-%m-%d}"
+            item.update(step=step, since=f"{plant.current_step_date:%Y-%m-%d}")
+        if plant.harvest_date:
+            line += f", урожай ~{plant.harvest_date:%Y-%m-%d}"
+            item["harvest"] = f"{plant.harvest_date:%Y-%m-%d}"
+        plants.items.append((line, item))
+
+        if not plant.current_step:
+            continue
+        plant_type = plant.type
+        for plant_step in data.catalog.get_steps(plant_type.pk):
+            key = (plant_type.pk, plant_step.step)
+            if (
+                plant_step.step != plant.current_step
+                or key in seen_steps
+                or not plant_step.description
+            ):
+                continue
+            seen_steps.add(key)
+            description = _shorten(plant_step.description, description_chars)
+            step = _step_name(plant_step.step)
+            steps.items.append(
+                (
+                    f"{plant_type.name}, {step}: {description}",
+                    {"type": plant_type.name, "step": step, "text": description},
+                )
+            )
+        for operation in data.catalog.get_operations(plant_type.pk):
+            if operation.pk in seen_operations or not (
+                operation.since_step <= plant.current_step <= operation.until_step
+            ):
+                continue
+            seen_operations.add(operation.pk)
+            name = _operation_name(operation.operation)
+            line = f"{plant_type.name}, {name} каждые {operation.interval_days} дн."
+            item = {
+                "type": plant_type.name,
+                "operation": name,
+                "interval_days": operation.interval_days,
+            }
+            if operation.description:
+                description = _shorten(operation.description, description_chars)
+                line += f": {description}"
+                item["text"] = description
+            operations.items.append((line, item))
+
+    for event in data.events:
+        step = _step_name(event.step.step)
+        line = f"{event.date:%Y-%m-%d} {event.plant.name}: {step}"
+        item = {
+            "date": f"{event.date:%Y-%m-%d}",
+            "plant": event.plant.name,
+            "step": step,
+        }
+        if event.comment:
+            comment = _shorten(event.comment, description_chars)
+            line += f" ({comment})"
+            item["comment"] = comment
+        events.items.append((line, item))
+
+    for stock in data.seeds:
+        name = f"{stock.type.name} {stock.variety.name}"
+        seeds.items.append(
+            (f"{name}: {stock.quantity}", {"name": name, "quantity": stock.quantity})
+        )
+
+    # In the order they are given up to fit the budget, least important last
+    return [plants, steps, operations, events, seeds]
+
+
+def _render(data: DiaryData, sections: list[_Section], as_json: bool) -> str:
+    if as_json:
+        document: dict[str, Any] = {"today": f"{data.today:%Y-%m-%d}"}
+        for section in sections:
+            document[section.key] = [item for _, item in section.items]
+            if section.omitted:
+                document[f"{section.key}_omitted"] = section.omitted
+        return json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+
+    lines = [f"Сегодня: {data.today:%Y-%m-%d}"]
+    for section in sections:
+        if not section.items and not section.omitted:
+            continue
+        lines.append(f"{section.title}:")
+        lines.extend(f"- {line}" for line, _ in section.items)
+        if section.omitted:
+            lines.append(f"- … и ещё {section.omitted}")
+    return "\n".join(lines)
+
+
+def render_diary_context(
+    data: DiaryData, *, budget: int | None = None, as_json: bool = False
+) -> str:
+    """
+    Render `data` within `budget` estimated tokens. Catalog descriptions are
+    shortened first, then items are left out, least important first.
+    """
+    sections = _sections(data, None)
+    context = _render(data, sections, as_json)
+    if budget is None or estimate_tokens(context) <= budget:
+        return context
+
+    sections = _sections(data, SHORT_DESCRIPTION_CHARS)
+    context = _render(data, sections, as_json)
+    for section in reversed(sections):
+        while section.items and estimate_tokens(context) > budget:
+            section.items.pop()
+            section.omitted += 1
+            context = _render(data, sections, as_json)
+    return context
+
+
+class DiaryContextCache:
+    """
+    Rendered contexts per user. Entries are dropped by signals on diary writes
+    in this process, and by `invalidate_on_commit` after writes that send no
+    signals such as `QuerySet.update()`; writes of other processes show up
+    after `DIARY_CONTEXT_CACHE_TTL_SECONDS`.
+
+    Each invalidation bumps the generation of the user, and contexts loaded
+    before an invalidation are not stored.
+    """
+
+    def __init__(self):
+        self._cache: TTLCache | None = None
+        self._generations: dict[int, int] = {}
+
+    @property
+    def cache(self) -> TTLCache:
+        if self._cache is None:
+            self._cache = TTLCache(
+                maxsize=settings.DIARY_CONTEXT_CACHE_SIZE,
+                ttl=settings.DIARY_CONTEXT_CACHE_TTL_SECONDS,
+            )
+        return self._cache
+
+    def get(self, user_id: int, params: tuple) -> str | None:
+        entry = self.cache.get(user_id)
+        # One entry per user, for the parameters last asked for
+        if entry is None or entry[0] != params:
+            return None
+        return entry[1]
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def set(self, user_id: int, params: tuple, context: str, generation: int):
+        """Store `context`, unless the user's diary changed since `generation`."""
+        if generation == self.generation(user_id):
+            self.cache.set(user_id, (params, context))
+
+    def invalidate(self, user_id: int):
+        self._generations[user_id] = self.generation(user_id) + 1
+        self.cache.delete(user_id)
+
+    def invalidate_on_commit(self, user_id: int):
+        transaction.on_commit(lambda: self.invalidate(user_id))
+
+    def clear(self):
+        self._cache = None
+
+
+diary_context_cache = DiaryContextCache()
+
+
+def build_diary_context(
+    user_id: int, *, budget: int | None = None, as_json: bool = False
+) -> str:
+    """
+    Diary context of the user within `budget` estimated tokens,
+    `DIARY_CONTEXT_TOKEN_BUDGET` by default.
+    """
+    budget = budget if budget is not None else settings.DIARY_CONTEXT_TOKEN_BUDGET
+    params = (
+        timezone.localdate(),
+        catalog_cache.get().version,
+        budget,
+        as_json,
+    )
+    context = diary_context_cache.get(user_id, params)
+    if context is None:
+        generation = diary_context_cache.generation(user_id)
+        data = load_diary_data(user_id, params[0])
+        context = render_diary_context(data, budget=budget, as_json=as_json)
+        diary_context_cache.set(user_id, params, context, generation)
+    return context
+
+
+async def abuild_diary_context(
+    user_id: int, *, budget: int | None = None, as_json: bool = False
+) -> str:
+    budget = budget if budget is not None else settings.DIARY_CONTEXT_TOKEN_BUDGET
+    params = (
+        timezone.localdate(),
+        (await catalog_cache.aget()).version,
+        budget,
+        as_json,
+    )
+    context = diary_context_cache.get(user_id, params)
+    if context is None:
+        context = await db_executor.run(
+            build_diary_context, user_id, budget=budget, as_json=as_json
+        )
+    return context
@@ -0,0 +1,35 @@
+from django.db.models import DateField, Func
+
+
+class AddDays(Func):
+    """`date + days` for a DateField and an integer expression."""
+
+    arity = 2
+    output_field = DateField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="(%(expressions)s * INTERVAL '1 day')",
+            arg_joiner=" + ",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="DATE_ADD(%(expressions)s DAY)",
+            arg_joiner=", INTERVAL ",
+            **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="DATE(%(expressions)s || ' days')",
+            arg_joiner=", '+' || ",
+            **extra_context,
+        )
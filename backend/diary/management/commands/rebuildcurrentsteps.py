@@ -0,0 +1,30 @@
+from diary.models import Plant
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized current step of plants from their events"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of plant ids updated per UPDATE statement",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        bounds = Plant.objects.aggregate(first=Min("pk"), last=Max("pk"))
+        if bounds["first"] is None:
+            self.stdout.write(self.style.SUCCESS("No plants to update"))
+            return
+
+        total = 0
+        for start in range(bounds["first"], bounds["last"] + 1, chunk_size):
+            total += Plant.objects.filter(
+                pk__gte=start, pk__lt=start + chunk_size
+            ).update_current_steps()
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {total} plants"))
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from diary.models import Plant, ScheduledOperation
+from diary.schedule import (
+    chunked,
+    evaluate_operations_at_date,
+    get_scheduled_operations_at_date,
+    plant_events,
+    plant_operations,
+    rebuild_schedule,
+)
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized plant care schedule from plant events"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Compare the stored schedule with the live computation instead of rebuilding it",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Number of days starting today to compare in --check mode",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        plants = Plant.objects.order_by("pk")
+        chunk_size = options["chunk_size"]
+
+        if options["check"]:
+            self._check(plants, chunk_size, options["days"])
+            return
+
+        # Each chunk replaces the rows of its plants in a transaction, so the
+        # schedule stays readable during the rebuild. Rows of deleted plants
+        # are removed with them.
+        total = sum(rebuild_schedule(chunk) for chunk in chunked(plants, chunk_size))
+        self.stdout.write(self.style.SUCCESS(f"Scheduled {total} operations"))
+
+    def _check(self, plants, chunk_size, days):
+        today = timezone.localdate()
+        mismatches = 0
+
+        for chunk in chunked(plants, chunk_size):
+            events = list(plant_events(chunk))
+            operations = list(plant_operations(chunk))
+            scheduled = ScheduledOperation.objects.filter(
+                plant_id__in=[p.pk for p in chunk]
+            )
+
+            for offset in range(days):
+                day = today + timedelta(days=offset)
+                expected = self._as_set(
+                    evaluate_operations_at_date(chunk, events, operations, day)
+                )
+                actual = self._as_set(get_scheduled_operations_at_date(scheduled, day))
+                for plant_id, operation_id in expected ^ actual:
+                    mismatches += 1
+                    self.stderr.write(
+                        f"{day}: plant {plant_id} operation {operation_id} "
+                        + (
+                            "missing"
+                            if (plant_id, operation_id) in expected
+                            else "stale"
+                        )
+                    )
+
+        if mismatches:
+            raise CommandError(
+                f"Schedule differs from live computation in {mismatches} places"
+            )
+        self.stdout.write(self.style.SUCCESS("Schedule matches live computation"))
+
+    @staticmethod
+    def _as_set(tasks):
+        return {
+            (plant.pk, operation.pk)
+            for plant, operations in tasks
+            for operation in operations
+        }
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0005_planttype_sowing_period_plantvariety_sowing_period"),
+        ("diary", "0003_seedstock"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduledOperation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_date", models.DateField(verbose_name="Дата начала")),
+                (
+                    "end_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="Дата окончания"
+                    ),
+                ),
+                (
+                    "interval_days",
+                    models.PositiveIntegerField(verbose_name="Периодичность (дн.)"),
+                ),
+                ("phase", models.PositiveIntegerField(verbose_name="Фаза")),
+                (
+                    "operation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="catalogs.plantoperation",
+                        verbose_name="Операция",
+                    ),
+                ),
+                (
+                    "plant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scheduled_operations",
+                        to="diary.plant",
+                        verbose_name="Растение",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запланированная операция",
+                "verbose_name_plural": "Запланированные операции",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "start_date"],
+                        name="diary_sched_user_id_6b56a5_idx",
+                    )
+                ],
+                "unique_together": {("plant", "operation")},
+            },
+        ),
+    ]
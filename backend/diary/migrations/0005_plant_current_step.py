@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0008_populate_period_days"),
+        ("diary", "0004_scheduledoperation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plant",
+            name="current_step",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("10-seed_preparation", "🌱🛠️ Подготовка семян"),
+                    ("20-sowing", "🌱👐 Посев"),
+                    ("30-sprouting", "🌱🌞 Всходы"),
+                    ("40-transplanting", "🪴🚜 Пересадка"),
+                    ("50-planting_preparation", "🌿🛠️ Подготовка к высадке"),
+                    ("60-planting", "🌱🏞️ Высадка"),
+                    ("65-blooming", "🌸🌼 Цветение"),
+                    ("70-pinching_out", "✂️🌿 Пасынкование"),
+                    ("80-tie_up", "🌿🪢 Подвязка"),
+                    ("90-harvesting", "🧺🍅 Сбор урожая"),
+                ],
+                editable=False,
+                max_length=32,
+                null=True,
+                verbose_name="Текущий этап",
+            ),
+        ),
+        migrations.AddField(
+            model_name="plant",
+            name="current_step_date",
+            field=models.DateField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Дата текущего этапа",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="plant",
+            index=models.Index(
+                fields=["user", "current_step"], name="diary_plant_user_id_818598_idx"
+            ),
+        ),
+    ]
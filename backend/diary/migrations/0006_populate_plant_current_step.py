@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:03
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def populate_current_step(apps, schema_editor):
+    Plant = apps.get_model("diary", "Plant")
+    PlantEvent = apps.get_model("diary", "PlantEvent")
+
+    latest = PlantEvent.objects.filter(plant=OuterRef("pk")).order_by("-step__step")
+    Plant.objects.update(
+        current_step=Subquery(latest.values("step__step")[:1]),
+        current_step_date=Subquery(latest.values("date")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diary", "0005_plant_current_step"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_current_step, migrations.RunPython.noop),
+    ]
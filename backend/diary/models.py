@@ -2,14 +2,19 @@ import logging
 from datetime import date, timedelta
 from typing import Optional
 
-from catalogs.models import PlantOperation, Step
+from catalogs.models import Step
+from catalogs.periods import parse_period, period_contains, period_start_order
 from django.conf import settings
-from django.db import models
-from django.utils.functional import cached_property
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Mod
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from timezone_field import TimeZoneField
 
+from .expressions import AddDays
+
 logger = logging.getLogger(__name__)
 
 # Create your models here.
@@ -37,6 +42,51 @@ class Profile(models.Model):
         verbose_name_plural = _("Профили")
 
 
+class PlantQuerySet(models.QuerySet):
+    def with_planting_days(self):
+        """Annotate effective planting period bounds, preferring the variety's."""
+        return self.annotate(
+            planting_start_day=Coalesce(
+                "variety__planting_start_day", "type__planting_start_day"
+            ),
+            planting_end_day=Coalesce(
+                "variety__planting_end_day", "type__planting_end_day"
+            ),
+        )
+
+    def with_harvest_date(self):
+        """
+        Annotate the sprouting date, effective maturity duration and planned
+        harvest date, so they can be listed, sorted and filtered in one query.
+        """
+        sprouting = PlantEvent.objects.filter(
+            plant=OuterRef("pk"), step__step=Step.SPROUTING
+        ).values("date")[:1]
+        return self.annotate(
+            sprouting_date=Subquery(sprouting),
+            effective_duration_days=Coalesce(
+                "variety__duration_days", "type__duration_days"
+            ),
+            harvest_date=AddDays("sprouting_date", "effective_duration_days"),
+        )
+
+    def update_current_steps(self) -> int:
+        """Recompute `current_step` and `current_step_date` in a single UPDATE."""
+        latest = PlantEvent.objects.filter(plant=OuterRef("pk")).order_by("-step__step")
+        return self.update(
+            current_step=Subquery(latest.values("step__step")[:1]),
+            current_step_date=Subquery(latest.values("date")[:1]),
+        )
+
+    def in_planting_period(self, day: date):
+        """Plants whose planting period contains `day`, earliest started first."""
+        return (
+            self.with_planting_days()
+            .filter(period_contains("planting_start_day", "planting_end_day", day))
+            .order_by(period_start_order("planting_start_day", day), "pk")
+        )
+
+
 class Plant(models.Model):
     user = models.ForeignKey(
         UserModel, verbose_name=_("Пользователь"), on_delete=models.RESTRICT
@@ -59,6 +109,19 @@ class Plant(models.Model):
         blank=True,
     )
 
+    # Latest step reached by the plant, maintained from PlantEvent writes
+    current_step = models.CharField(
+        verbose_name=_("Текущий этап"),
+        max_length=32,
+        choices=Step,
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    current_step_date = models.DateField(
+        verbose_name=_("Дата текущего этапа"), null=True, blank=True, editable=False
+    )
+
     @property
     def duration_days(self):
         if self.variety:
@@ -70,76 +133,39 @@ class Plant(models.Model):
     )
     updated_at = models.DateTimeField(verbose_name=_("Дата обновления"), auto_now=True)
 
+    objects = PlantQuerySet.as_manager()
+
     @property
     def planned_harvest_date(self) -> Optional[date]:
-        sprouting = self.events.get(step__step=Step.SPROUTING)
+        if hasattr(self, "harvest_date"):
+            # Annotated by PlantQuerySet.with_harvest_date()
+            return self.harvest_date
+
+        sprouting = self.events.filter(step__step=Step.SPROUTING).first()
         if not sprouting:
             return None
 
         return sprouting.date + timedelta(days=self.duration_days)
 
     async def aget_operations_at_date(self, today: date):
-        events = [
-            s
-            async for s in PlantEvent.objects.filter(plant=self)
-            .prefetch_related("step")
-            .all()
-        ]
-
-        operations = [
-            o
-            async for o in PlantOperation.objects.filter(
-                plant_type=self.type_id, since_step__in=[x.step.step for x in events]
-            )
-            .exclude(until_step__in=[x.step.step for x in events])
-            .all()
-        ]
-
-        events = {e.step.step: e for e in events}
-        for operation in operations:
-            related_event = events[operation.since_step]
-
-            start_date = related_event.date  # type: date
-            if operation.delay_days:
-                start_date += timedelta(days=operation.delay_days)
-
-            if start_date > today:
-                continue
-
-            days = (today - start_date).days
-            if operation.duration_days and days > operation.duration_days:
-                continue
+        from .schedule import aget_operations_at_date
 
-            if days % operation.interval_days == 0:
+        for _plant, operations in await aget_operations_at_date([self], today):
+            for operation in operations:
                 yield operation
 
     def get_operations_at_date(self, today: date):
-        operations = self.type.operations.exclude(
-            until_step__in=self.events.values_list("step")
-        )
-        for operation in operations:
-            related_event = self.events.filter(step__step=operation.since_step).first()
-            if related_event is None:
-                continue
-
-            start_date = related_event.date  # type: date
-            if operation.delay_days:
-                start_date += timedelta(days=operation.delay_days)
+        from .schedule import get_operations_at_date
 
-            if start_date > today:
-                continue
-
-            days = (today - start_date).days
-            if operation.duration_days and days > operation.duration_days:
-                continue
-
-            if days % operation.interval_days == 0:
-                yield operation
+        for _plant, operations in get_operations_at_date([self], today):
+            yield from operations
 
     class Meta:
         verbose_name = _("Растение")
         verbose_name_plural = _("Растения")
 
+        indexes = [models.Index(fields=["user", "current_step"])]
+
     def save(self, *args, **kwargs):
         if self.variety:
             self.type = self.variety.type
@@ -155,32 +181,12 @@ class Plant(models.Model):
         if not period:
             return None
 
-        roman_months = {
-            "I": 1,
-            "II": 2,
-            "III": 3,
-            "IV": 4,
-            "V": 5,
-            "VI": 6,
-            "VII": 7,
-            "VIII": 8,
-            "IX": 9,
-            "X": 10,
-            "XI": 11,
-            "XII": 12,
-        }
-
         try:
-            start_str, end_str = period.split("-")
-            start_day, start_month = start_str.split(".")
-            end_day, end_month = end_str.split(".")
+            (start_month_i, start_day_i), (end_month_i, end_day_i) = parse_period(
+                period
+            )
 
             today = timezone.localdate()
-            start_day_i = int(start_day)
-            end_day_i = int(end_day)
-            start_month_i = roman_months[start_month]
-            end_month_i = roman_months[end_month]
-
             wraps_year = (end_month_i, end_day_i) < (start_month_i, start_day_i)
             start_year = today.year
             end_year = today.year
@@ -279,6 +285,12 @@ class PlantEvent(models.Model):
     def name(self):
         return f"{self.step.name}"
 
+    def save(self, *args, **kwargs):
+        # Keeps the plant's current step, updated from post_save, in the same
+        # transaction as the event.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = _("Событие")
         verbose_name_plural = _("События")
@@ -287,3 +299,60 @@ class PlantEvent(models.Model):
 
     def __str__(self):
         return f"{self.name}"
+
+
+class ScheduledOperationQuerySet(models.QuerySet):
+    def due_at(self, day: date):
+        return self.annotate(
+            day_phase=Mod(Value(day.toordinal()), F("interval_days"))
+        ).filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=day),
+            start_date__lte=day,
+            phase=F("day_phase"),
+        )
+
+
+class ScheduledOperation(models.Model):
+    """
+    Materialized recurrence of a care operation for a plant.
+
+    Rows are derived from `PlantEvent` and `PlantOperation` by
+    `diary.schedule.rebuild_schedule` and must not be edited by hand.
+    """
+
+    user = models.ForeignKey(
+        UserModel,
+        verbose_name=_("Пользователь"),
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    plant = models.ForeignKey(
+        Plant,
+        verbose_name=_("Растение"),
+        on_delete=models.CASCADE,
+        related_name="scheduled_operations",
+    )
+    operation = models.ForeignKey(
+        "catalogs.PlantOperation",
+        verbose_name=_("Операция"),
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    start_date = models.DateField(_("Дата начала"))
+    end_date = models.DateField(_("Дата окончания"), null=True, blank=True)
+    interval_days = models.PositiveIntegerField(_("Периодичность (дн.)"))
+    # start_date.toordinal() % interval_days, so that "is due at day D" is a
+    # plain comparison instead of DB-specific date arithmetic.
+    phase = models.PositiveIntegerField(_("Фаза"))
+
+    objects = ScheduledOperationQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("Запланированная операция")
+        verbose_name_plural = _("Запланированные операции")
+
+        unique_together = ("plant", "operation")
+        indexes = [models.Index(fields=["user", "start_date"])]
+
+    def __str__(self):
+        return f"{self.plant}: {self.operation}"
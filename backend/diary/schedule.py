@@ -0,0 +1,253 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from datetime import date, timedelta
+
+from catalogs.cache import CatalogSnapshot, catalog_cache
+from catalogs.models import PlantOperation
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+from .models import Plant, PlantEvent, ScheduledOperation
+
+logger = logging.getLogger(__name__)
+
+PlantTasks = list[tuple[Plant, list[PlantOperation]]]
+
+
+def operation_start_date(operation: PlantOperation, event_date: date) -> date:
+    """Date of the first occurrence of `operation` started by an event on `event_date`."""
+    if operation.delay_days:
+        return event_date + timedelta(days=operation.delay_days)
+    return event_date
+
+
+def operation_end_date(operation: PlantOperation, event_date: date) -> date | None:
+    """Date of the last possible occurrence, or None for open-ended operations."""
+    if not operation.duration_days:
+        return None
+    return operation_start_date(operation, event_date) + timedelta(
+        days=operation.duration_days
+    )
+
+
+def is_operation_due(operation: PlantOperation, event_date: date, today: date) -> bool:
+    start_date = operation_start_date(operation, event_date)
+    if start_date > today:
+        return False
+
+    days = (today - start_date).days
+    if operation.duration_days and days > operation.duration_days:
+        return False
+
+    return days % operation.interval_days == 0
+
+
+def active_operations(
+    events: Iterable[PlantEvent], operations: Iterable[PlantOperation]
+) -> list[tuple[PlantOperation, date]]:
+    """
+    Operations which are started by one of `events` and not finished by another,
+    paired with the date of the starting event.
+    """
+    event_dates = {e.step.step: e.date for e in events}
+    return [
+        (o, event_dates[o.since_step])
+        for o in operations
+        if o.since_step in event_dates and o.until_step not in event_dates
+    ]
+
+
+def _group_active_operations(
+    plants: Iterable[Plant],
+    events: Iterable[PlantEvent],
+    operations: Iterable[PlantOperation],
+) -> Iterator[tuple[Plant, list[tuple[PlantOperation, date]]]]:
+    events_by_plant = defaultdict(list)
+    for event in events:
+        events_by_plant[event.plant_id].append(event)
+
+    operations_by_type = defaultdict(list)
+    for operation in operations:
+        operations_by_type[operation.plant_type_id].append(operation)
+
+    for plant in plants:
+        yield plant, active_operations(
+            events_by_plant[plant.pk], operations_by_type[plant.type_id]
+        )
+
+
+def evaluate_operations_at_date(
+    plants: Iterable[Plant],
+    events: Iterable[PlantEvent],
+    operations: Iterable[PlantOperation],
+    today: date,
+) -> PlantTasks:
+    """Match preloaded events against operation rules without touching the DB."""
+    tasks = []
+    for plant, active in _group_active_operations(plants, events, operations):
+        due = [
+            operation
+            for operation, event_date in active
+            if is_operation_due(operation, event_date, today)
+        ]
+        if due:
+            tasks.append((plant, due))
+
+    return tasks
+
+
+def build_schedule(
+    plants: Iterable[Plant],
+    events: Iterable[PlantEvent],
+    operations: Iterable[PlantOperation],
+) -> list[ScheduledOperation]:
+    """Unsaved `ScheduledOperation` rows equivalent to the live computation."""
+    rows = []
+    for plant, active in _group_active_operations(plants, events, operations):
+        for operation, event_date in active:
+            if operation.interval_days <= 0:
+                logger.warning(
+                    "Skipping operation %s with non-positive interval", operation.pk
+                )
+                continue
+
+            start_date = operation_start_date(operation, event_date)
+            rows.append(
+                ScheduledOperation(
+                    user_id=plant.user_id,
+                    plant=plant,
+                    operation=operation,
+                    start_date=start_date,
+                    end_date=operation_end_date(operation, event_date),
+                    interval_days=operation.interval_days,
+                    phase=start_date.toordinal() % operation.interval_days,
+                )
+            )
+
+    return rows
+
+
+def plant_events(plants: list[Plant]) -> QuerySet[PlantEvent]:
+    return PlantEvent.objects.filter(
+        plant_id__in=[p.pk for p in plants]
+    ).select_related("step")
+
+
+def plant_operations(
+    plants: list[Plant], catalog: CatalogSnapshot | None = None
+) -> list[PlantOperation]:
+    """Operation rules of the types of `plants`, from the catalog cache."""
+    catalog = catalog or catalog_cache.get()
+    return sorted(
+        (
+            operation
+            for type_id in {p.type_id for p in plants}
+            for operation in catalog.get_operations(type_id)
+        ),
+        key=lambda operation: operation.pk,
+    )
+
+
+def get_operations_at_date(
+    plants: QuerySet[Plant] | Iterable[Plant], today: date
+) -> PlantTasks:
+    """
+    Operations due at `today` for every plant that has any.
+
+    Runs a fixed number of queries regardless of the number of plants: one for
+    the plants (if a queryset is given) and one for their events. The
+    operation rules of their types come from the catalog cache.
+    """
+    plants = list(plants)
+    if not plants:
+        return []
+
+    events = list(plant_events(plants))
+    operations = plant_operations(plants)
+    return evaluate_operations_at_date(plants, events, operations, today)
+
+
+async def aget_operations_at_date(
+    plants: QuerySet[Plant] | Iterable[Plant], today: date
+) -> PlantTasks:
+    """Async version of `get_operations_at_date`."""
+    if isinstance(plants, QuerySet):
+        plants = [p async for p in plants]
+    else:
+        plants = list(plants)
+    if not plants:
+        return []
+
+    events = [e async for e in plant_events(plants)]
+    operations = plant_operations(plants, await catalog_cache.aget())
+    return evaluate_operations_at_date(plants, events, operations, today)
+
+
+def rebuild_schedule(plants: QuerySet[Plant] | Iterable[Plant]) -> int:
+    """
+    Replace materialized schedule rows of `plants` with freshly computed ones.
+
+    Returns the number of rows written.
+    """
+    plants = list(plants)
+    if not plants:
+        return 0
+
+    rows = build_schedule(plants, plant_events(plants), plant_operations(plants))
+    with transaction.atomic():
+        ScheduledOperation.objects.filter(plant_id__in=[p.pk for p in plants]).delete()
+        ScheduledOperation.objects.bulk_create(rows)
+
+    return len(rows)
+
+
+def rebuild_plant_type_schedule(plant_type_id: int, chunk_size: int = 500) -> int:
+    """Rebuild materialized schedule rows of every plant of a type."""
+    plants = Plant.objects.filter(type_id=plant_type_id).order_by("pk")
+    return sum(rebuild_schedule(chunk) for chunk in chunked(plants, chunk_size))
+
+
+def chunked(plants: QuerySet[Plant], chunk_size: int) -> Iterator[list[Plant]]:
+    chunk = []
+    for plant in plants.iterator(chunk_size=chunk_size):
+        chunk.append(plant)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _group_scheduled(rows: Iterable[ScheduledOperation]) -> PlantTasks:
+    tasks: dict[int, tuple[Plant, list[PlantOperation]]] = {}
+    for row in rows:
+        tasks.setdefault(row.plant_id, (row.plant, []))[1].append(row.operation)
+    return list(tasks.values())
+
+
+def _scheduled_queryset(
+    scheduled: QuerySet[ScheduledOperation], today: date
+) -> QuerySet[ScheduledOperation]:
+    return (
+        scheduled.due_at(today)
+        .select_related("plant", "operation")
+        .order_by("plant_id", "operation_id")
+    )
+
+
+def get_scheduled_operations_at_date(
+    scheduled: QuerySet[ScheduledOperation], today: date
+) -> PlantTasks:
+    """
+    Same result as `get_operations_at_date`, read from the materialized
+    schedule in a single query.
+    """
+    return _group_scheduled(_scheduled_queryset(scheduled, today))
+
+
+async def aget_scheduled_operations_at_date(
+    scheduled: QuerySet[ScheduledOperation], today: date
+) -> PlantTasks:
+    """Async version of `get_scheduled_operations_at_date`."""
+    return _group_scheduled([r async for r in _scheduled_queryset(scheduled, today)])
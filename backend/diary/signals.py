@@ -0,0 +1,118 @@
+import threading
+from functools import partial
+
+from catalogs.models import PlantOperation
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .context import diary_context_cache
+from .models import Plant, PlantEvent, SeedStock
+from .schedule import rebuild_plant_type_schedule, rebuild_schedule
+
+# Plants changed in this thread whose schedule is not rebuilt yet
+_pending = threading.local()
+
+
+def _pending_plant_ids() -> set[int]:
+    if not hasattr(_pending, "plant_ids"):
+        _pending.plant_ids = set()
+    return _pending.plant_ids
+
+
+def _rebuild_plant_schedule(plant_id: int):
+    # The first callback of a plant in a transaction rebuilds it, later
+    # ones find it done. Ids of rolled back transactions are only rebuilt
+    # when the plant changes again.
+    plant_ids = _pending_plant_ids()
+    if plant_id in plant_ids:
+        plant_ids.discard(plant_id)
+        rebuild_schedule(Plant.objects.filter(pk=plant_id))
+
+
+def _rebuild_plant_schedule_on_commit(plant_id: int):
+    # Deferred so that cascading deletes of a plant don't recreate its rows
+    # and bulk admin edits see the final set of events
+    _pending_plant_ids().add(plant_id)
+    transaction.on_commit(partial(_rebuild_plant_schedule, plant_id))
+
+
+@receiver(post_save, sender=Plant)
+def plant_saved(sender, instance: Plant, created: bool, raw: bool = False, **kwargs):
+    if created or raw:
+        return
+    _rebuild_plant_schedule_on_commit(instance.pk)
+
+
+def _deleted_with_plant(origin) -> bool:
+    """Whether a delete cascades from its plant, which is deleted too."""
+    if isinstance(origin, QuerySet):
+        return origin.model is Plant
+    return isinstance(origin, Plant)
+
+
+@receiver(post_save, sender=PlantEvent)
+@receiver(post_delete, sender=PlantEvent)
+def plant_event_changed(
+    sender, instance: PlantEvent, raw: bool = False, origin=None, **kwargs
+):
+    if raw or _deleted_with_plant(origin):
+        return
+    Plant.objects.filter(pk=instance.plant_id).update_current_steps()
+    _rebuild_plant_schedule_on_commit(instance.plant_id)
+
+
+@receiver(pre_save, sender=PlantOperation)
+def plant_operation_saving(
+    sender, instance: PlantOperation, raw: bool = False, **kwargs
+):
+    if raw or instance.pk is None:
+        return
+    # Plants of the type an operation is moved away from are rebuilt too
+    instance._previous_plant_type_id = (
+        PlantOperation.objects.filter(pk=instance.pk)
+        .values_list("plant_type_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=PlantOperation)
+@receiver(post_delete, sender=PlantOperation)
+def plant_operation_changed(
+    sender, instance: PlantOperation, raw: bool = False, **kwargs
+):
+    if raw:
+        return
+    plant_type_ids = {
+        instance.plant_type_id,
+        getattr(instance, "_previous_plant_type_id", None),
+    }
+    for plant_type_id in plant_type_ids - {None}:
+        transaction.on_commit(partial(rebuild_plant_type_schedule, plant_type_id))
+
+
+@receiver(post_save, sender=Plant)
+@receiver(post_delete, sender=Plant)
+@receiver(post_save, sender=SeedStock)
+@receiver(post_delete, sender=SeedStock)
+def diary_changed(sender, instance: Plant | SeedStock, **kwargs):
+    diary_context_cache.invalidate_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=PlantEvent)
+@receiver(post_delete, sender=PlantEvent)
+def plant_event_context_changed(sender, instance: PlantEvent, origin=None, **kwargs):
+    if _deleted_with_plant(origin):
+        # Invalidated by diary_changed for the plant
+        return
+    if PlantEvent.plant.is_cached(instance):
+        user_id = instance.plant.user_id
+    else:
+        user_id = (
+            Plant.objects.filter(pk=instance.plant_id)
+            .values_list("user_id", flat=True)
+            .first()
+        )
+    if user_id is not None:
+        diary_context_cache.invalidate_on_commit(user_id)
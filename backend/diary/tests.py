@@ -1,3 +1,553 @@
-# from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from catalogs.cache import catalog_cache
+from catalogs.models import (
+    Operation,
+    PlantOperation,
+    PlantStep,
+    PlantType,
+    PlantVariety,
+    Step,
+)
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .context import (
+    build_diary_context,
+    diary_context_cache,
+    estimate_tokens,
+    load_diary_data,
+)
+from .models import Plant, PlantEvent, ScheduledOperation, SeedStock
+from .schedule import (
+    aget_operations_at_date,
+    get_operations_at_date,
+    get_scheduled_operations_at_date,
+    rebuild_schedule,
+)
+
+TODAY = date(2026, 4, 10)
+
+
+class ScheduleTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="gardener")
+        cls.tomato = PlantType.objects.create(
+            slug="tomato", name="Tomato", description="", duration_days=100
+        )
+        cls.sowing = PlantStep.objects.create(
+            plant_type=cls.tomato, step=Step.SOWING, description=""
+        )
+        cls.planting = PlantStep.objects.create(
+            plant_type=cls.tomato, step=Step.PLANTING, description=""
+        )
+        cls.watering = PlantOperation.objects.create(
+            plant_type=cls.tomato,
+            operation=Operation.WATERING,
+            since_step=Step.SOWING,
+            until_step=Step.PLANTING,
+            delay_days=2,
+            interval_days=3,
+            description="",
+        )
+        cls.fertilizing = PlantOperation.objects.create(
+            plant_type=cls.tomato,
+            operation=Operation.FERTILIZING,
+            since_step=Step.PLANTING,
+            until_step=Step.HARVESTING,
+            interval_days=7,
+            duration_days=14,
+            description="",
+        )
+
+    def setUp(self):
+        # Catalog changes of previous tests were rolled back
+        catalog_cache.invalidate()
+
+    def create_plant(self, sown_at=None, planted_at=None):
+        plant = Plant.objects.create(user=self.user, type=self.tomato)
+        if sown_at:
+            PlantEvent.objects.create(plant=plant, step=self.sowing, date=sown_at)
+        if planted_at:
+            PlantEvent.objects.create(plant=plant, step=self.planting, date=planted_at)
+        return plant
+
+
+class ScheduleEngineTests(ScheduleTestCase):
+    def test_operation_due_after_delay_and_interval(self):
+        plant = self.create_plant(sown_at=TODAY - timedelta(days=5))
+
+        self.assertEqual(
+            get_operations_at_date([plant], TODAY), [(plant, [self.watering])]
+        )
+        self.assertEqual(get_operations_at_date([plant], TODAY - timedelta(days=1)), [])
+        self.assertEqual(get_operations_at_date([plant], TODAY - timedelta(days=4)), [])
+
+    def test_until_step_finishes_operation(self):
+        plant = self.create_plant(
+            sown_at=TODAY - timedelta(days=5), planted_at=TODAY - timedelta(days=7)
+        )
+
+        self.assertEqual(
+            get_operations_at_date([plant], TODAY), [(plant, [self.fertilizing])]
+        )
+        self.assertEqual(
+            get_operations_at_date([plant], TODAY + timedelta(days=14)), []
+        )
+
+    def test_plant_wrapper_matches_engine(self):
+        plant = self.create_plant(sown_at=TODAY - timedelta(days=5))
+
+        self.assertEqual(list(plant.get_operations_at_date(TODAY)), [self.watering])
+
+    def test_query_count_does_not_depend_on_plant_count(self):
+        for plant_count in (1, 25):
+            Plant.objects.all().delete()
+            for _ in range(plant_count):
+                self.create_plant(sown_at=TODAY - timedelta(days=5))
+            catalog_cache.get()
+
+            with self.assertNumQueries(2):
+                tasks = get_operations_at_date(
+                    Plant.objects.filter(user=self.user), TODAY
+                )
+            self.assertEqual(len(tasks), plant_count)
+
+    async def test_async_engine_matches_sync_engine(self):
+        plant = await Plant.objects.acreate(user=self.user, type=self.tomato)
+        await PlantEvent.objects.acreate(
+            plant=plant, step=self.sowing, date=TODAY - timedelta(days=5)
+        )
+
+        tasks = await aget_operations_at_date(
+            Plant.objects.filter(user=self.user), TODAY
+        )
+
+        self.assertEqual(tasks, [(plant, [self.watering])])
+
+
+class MaterializedScheduleTests(ScheduleTestCase):
+    def create_plant(self, sown_at=None, planted_at=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().create_plant(sown_at=sown_at, planted_at=planted_at)
+
+    def assertMatchesLiveSchedule(self, plants, days=30):
+        for offset in range(-days, days):
+            day = TODAY + timedelta(days=offset)
+            self.assertEqual(
+                get_scheduled_operations_at_date(
+                    ScheduledOperation.objects.filter(user=self.user), day
+                ),
+                get_operations_at_date(plants, day),
+                day,
+            )
+
+    def test_event_changes_update_schedule(self):
+        plant = self.create_plant(sown_at=TODAY - timedelta(days=5))
+        self.assertMatchesLiveSchedule([plant])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PlantEvent.objects.create(
+                plant=plant, step=self.planting, date=TODAY - timedelta(days=2)
+            )
+        self.assertEqual(
+            list(ScheduledOperation.objects.values_list("operation", flat=True)),
+            [self.fertilizing.pk],
+        )
+        self.assertMatchesLiveSchedule([plant])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PlantEvent.objects.filter(step=self.planting).get().delete()
+        self.assertMatchesLiveSchedule([plant])
+
+    def test_event_changes_rebuild_schedule_once_per_transaction(self):
+        plants = [
+            Plant.objects.create(user=self.user, type=self.tomato) for _ in range(2)
+        ]
+
+        with patch("diary.signals.rebuild_schedule") as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                for plant in plants:
+                    PlantEvent.objects.create(plant=plant, step=self.sowing, date=TODAY)
+                    PlantEvent.objects.create(
+                        plant=plant, step=self.planting, date=TODAY
+                    )
+
+        self.assertCountEqual(
+            [list(call.args[0]) for call in rebuild.call_args_list],
+            [[plant] for plant in plants],
+        )
+
+    def test_rolled_back_changes_are_not_rebuilt(self):
+        rolled_back, changed = [
+            Plant.objects.create(user=self.user, type=self.tomato) for _ in range(2)
+        ]
+
+        with patch("diary.signals.rebuild_schedule") as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    PlantEvent.objects.create(
+                        plant=rolled_back, step=self.sowing, date=TODAY
+                    )
+                    raise IntegrityError
+                PlantEvent.objects.create(plant=changed, step=self.sowing, date=TODAY)
+
+        self.assertEqual(
+            [list(call.args[0]) for call in rebuild.call_args_list], [[changed]]
+        )
+
+    def test_operation_changes_update_schedule_of_its_type(self):
+        plants = [
+            self.create_plant(sown_at=TODAY - timedelta(days=i)) for i in range(5)
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.watering.interval_days = 2
+            self.watering.save()
+
+        self.assertMatchesLiveSchedule(plants)
+
+    def test_moved_operation_leaves_schedule_of_previous_type(self):
+        pepper = PlantType.objects.create(
+            slug="pepper", name="Pepper", description="", duration_days=120
+        )
+        tomato = self.create_plant(sown_at=TODAY - timedelta(days=5))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.watering.plant_type = pepper
+            self.watering.save()
+
+        self.assertFalse(
+            ScheduledOperation.objects.filter(operation=self.watering).exists()
+        )
+        self.assertMatchesLiveSchedule([tomato])
+
+    def test_scheduled_operations_are_read_in_one_query(self):
+        for i in range(10):
+            self.create_plant(sown_at=TODAY - timedelta(days=i))
+
+        with self.assertNumQueries(1):
+            get_scheduled_operations_at_date(
+                ScheduledOperation.objects.filter(user=self.user), TODAY
+            )
+
+    def test_rebuild_command_check(self):
+        self.create_plant(sown_at=TODAY - timedelta(days=5))
+        ScheduledOperation.objects.all().delete()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuildschedule", "--check", stderr=StringIO())
+
+        call_command("rebuildschedule", stdout=StringIO())
+        call_command("rebuildschedule", "--check", stdout=StringIO())
+
+    def test_rebuild_command_keeps_other_chunks_readable(self):
+        for i in range(3):
+            self.create_plant(sown_at=TODAY - timedelta(days=i))
+        rows = ScheduledOperation.objects.count()
+        counts = []
+
+        def rebuild(chunk):
+            counts.append(ScheduledOperation.objects.count())
+            return rebuild_schedule(chunk)
+
+        with patch(
+            "diary.management.commands.rebuildschedule.rebuild_schedule", rebuild
+        ):
+            call_command("rebuildschedule", "--chunk-size", "1", stdout=StringIO())
+
+        self.assertEqual(counts, [rows] * 3)
+
+
+class PlantingPeriodTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="gardener")
+        cls.garlic = PlantType.objects.create(
+            slug="garlic",
+            name="Garlic",
+            description="",
+            duration_days=100,
+            planting_period="01.XI-28.II",
+        )
+        cls.tomato = PlantType.objects.create(
+            slug="tomato",
+            name="Tomato",
+            description="",
+            duration_days=100,
+            planting_period="15.V-15.VI",
+        )
+        cls.early_tomato = PlantVariety.objects.create(
+            type=cls.tomato,
+            slug="early",
+            name="Early",
+            description="",
+            duration_days=80,
+            planting_period="15.I-15.III",
+        )
+        cls.garlic_plant = Plant.objects.create(user=cls.user, type=cls.garlic)
+        cls.tomato_plant = Plant.objects.create(user=cls.user, type=cls.tomato)
+        cls.early_tomato_plant = Plant.objects.create(
+            user=cls.user, variety=cls.early_tomato
+        )
+
+    def in_planting_period(self, day):
+        return list(Plant.objects.in_planting_period(day))
+
+    def test_period_wrapping_year_end(self):
+        self.assertEqual(
+            self.in_planting_period(date(2026, 11, 20)), [self.garlic_plant]
+        )
+        self.assertEqual(self.in_planting_period(date(2026, 10, 20)), [])
+
+    def test_variety_period_overrides_type_and_order_follows_start(self):
+        self.assertEqual(
+            self.in_planting_period(date(2026, 2, 1)),
+            [self.garlic_plant, self.early_tomato_plant],
+        )
+        self.assertEqual(self.in_planting_period(date(2026, 6, 1)), [self.tomato_plant])
+
+    def test_matches_parsed_planting_period(self):
+        for day in (date(2026, 1, 1) + timedelta(days=i) for i in range(0, 365, 7)):
+            with patch("django.utils.timezone.localdate", return_value=day):
+                expected = {
+                    p
+                    for p in Plant.objects.select_related("type", "variety")
+                    if p.parsed_planting_period
+                    and p.parsed_planting_period[0]
+                    <= day
+                    <= p.parsed_planting_period[1]
+                }
+            self.assertEqual(set(self.in_planting_period(day)), expected, day)
+
+
+@override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        }
+    }
+)
+class HarvestDateTests(ScheduleTestCase):
+    def setUp(self):
+        self.sprouting = PlantStep.objects.create(
+            plant_type=self.tomato, step=Step.SPROUTING, description=""
+        )
+        self.early = PlantVariety.objects.create(
+            type=self.tomato,
+            slug="early",
+            name="Early",
+            description="",
+            duration_days=60,
+        )
+
+    def create_sprouted_plant(self, sprouted_at, **kwargs):
+        plant = Plant.objects.create(user=self.user, type=self.tomato, **kwargs)
+        PlantEvent.objects.create(plant=plant, step=self.sprouting, date=sprouted_at)
+        return plant
+
+    def test_annotation_matches_property(self):
+        plants = [
+            self.create_sprouted_plant(date(2026, 3, 1)),
+            self.create_sprouted_plant(date(2026, 3, 1), variety=self.early),
+            Plant.objects.create(user=self.user, type=self.tomato),
+        ]
+
+        annotated = {
+            p.pk: p.planned_harvest_date for p in Plant.objects.with_harvest_date()
+        }
+
+        self.assertEqual(
+            annotated,
+            {p.pk: p.planned_harvest_date for p in plants},
+        )
+        self.assertEqual(
+            list(annotated.values()), [date(2026, 6, 9), date(2026, 4, 30), None]
+        )
+
+    def test_changelist_query_count_does_not_depend_on_plant_count(self):
+        admin_user = get_user_model().objects.create_superuser(username="admin")
+        self.client.force_login(admin_user)
+        url = reverse("admin:diary_plant_changelist")
+        self.client.get(url)
+
+        query_counts = []
+        for plant_count in (1, 10):
+            for _ in range(plant_count):
+                self.create_sprouted_plant(date(2026, 3, 1))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {"o": "5", "harvest": "later"})
+            self.assertEqual(response.status_code, 200)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class CurrentStepTests(ScheduleTestCase):
+    def assertCurrentStep(self, plant, step, step_date):
+        plant.refresh_from_db()
+        self.assertEqual(
+            (plant.current_step, plant.current_step_date), (step, step_date)
+        )
+
+    def test_event_writes_maintain_current_step(self):
+        plant = self.create_plant(sown_at=date(2026, 3, 1))
+        self.assertCurrentStep(plant, Step.SOWING, date(2026, 3, 1))
+
+        planting = PlantEvent.objects.create(
+            plant=plant, step=self.planting, date=date(2026, 5, 1)
+        )
+        self.assertCurrentStep(plant, Step.PLANTING, date(2026, 5, 1))
+
+        planting.delete()
+        self.assertCurrentStep(plant, Step.SOWING, date(2026, 3, 1))
+
+    def test_plant_save_writes_current_step(self):
+        plant = Plant.objects.create(user=self.user, type=self.tomato)
+
+        plant.current_step = Step.SOWING
+        plant.current_step_date = date(2026, 3, 1)
+        plant.save()
+
+        self.assertCurrentStep(plant, Step.SOWING, date(2026, 3, 1))
+
+    def test_plant_delete_skips_current_step_of_its_events(self):
+        plant = self.create_plant(sown_at=date(2026, 3, 1), planted_at=date(2026, 5, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            plant.delete()
+
+        self.assertFalse(
+            [q for q in queries if q["sql"].startswith('UPDATE "diary_plant"')]
+        )
+
+    def test_rebuild_command_repairs_current_steps(self):
+        plants = [self.create_plant(sown_at=date(2026, 3, 1)) for _ in range(3)]
+        Plant.objects.update(current_step=None, current_step_date=None)
+
+        call_command("rebuildcurrentsteps", "--chunk-size", "2", stdout=StringIO())
+
+        for plant in plants:
+            self.assertCurrentStep(plant, Step.SOWING, date(2026, 3, 1))
+
+
+class DiaryContextTests(ScheduleTestCase):
+    def setUp(self):
+        catalog_cache.invalidate()
+        catalog_cache.get()
+        diary_context_cache.clear()
+        self.addCleanup(diary_context_cache.clear)
+
+    def test_query_count_does_not_depend_on_diary_size(self):
+        variety = PlantVariety.objects.create(
+            type=self.tomato, slug="cherry", name="Cherry", duration_days=90
+        )
+        SeedStock.objects.create(user=self.user, variety=variety, quantity=10)
+        for plant_count in (1, 25):
+            for _ in range(plant_count):
+                self.create_plant(sown_at=TODAY - timedelta(days=5))
+            diary_context_cache.clear()
+            catalog_cache.get()
+
+            with self.assertNumQueries(3):
+                context = build_diary_context(self.user.pk, budget=10000)
+            self.assertIn("Tomato Cherry: 10", context)
+
+    def test_output_is_deterministic(self):
+        self.create_plant(sown_at=date(2026, 3, 1), planted_at=date(2026, 4, 1))
+        self.create_plant(sown_at=date(2026, 3, 2))
+
+        for as_json in (False, True):
+            context = build_diary_context(self.user.pk, as_json=as_json)
+            diary_context_cache.clear()
+            self.assertEqual(
+                build_diary_context(self.user.pk, as_json=as_json), context
+            )
+
+        self.assertIn('"step":"Высадка","since":"2026-04-01"', context)
+        self.assertIn("Высадка с 2026-04-01", build_diary_context(self.user.pk))
+
+    def test_context_loaded_before_a_change_is_not_cached(self):
+        variety = PlantVariety.objects.create(
+            type=self.tomato, slug="cherry", name="Cherry", duration_days=90
+        )
+
+        def load_then_change(user_id, today):
+            data = load_diary_data(user_id, today)
+            # Committed by another request while this one renders
+            with self.captureOnCommitCallbacks(execute=True):
+                SeedStock.objects.create(user=self.user, variety=variety, quantity=3)
+            return data
+
+        with patch("diary.context.load_diary_data", load_then_change):
+            self.assertNotIn("Запас семян", build_diary_context(self.user.pk))
+
+        self.assertIn("Tomato Cherry: 3", build_diary_context(self.user.pk))
+
+    def test_plant_delete_reads_no_user_per_event(self):
+        query_counts = []
+        for planted_at in (None, date(2026, 5, 1)):
+            plant = self.create_plant(sown_at=date(2026, 3, 1), planted_at=planted_at)
+            with CaptureQueriesContext(connection) as queries:
+                plant.delete()
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertNotIn("🌱", context)
+
+    def test_budget_drops_least_important_items(self):
+        for day in range(30):
+            self.create_plant(sown_at=date(2026, 3, 1) + timedelta(days=day))
+
+        context = build_diary_context(self.user.pk, budget=300)
+
+        self.assertLessEqual(estimate_tokens(context), 300)
+        self.assertIn("Недавние события:\n- … и ещё", context)
+        self.assertIn("Растения:", context)
+
+    def test_cached_until_diary_changes(self):
+        plant = self.create_plant(sown_at=date(2026, 3, 1))
+        build_diary_context(self.user.pk)
+
+        with self.assertNumQueries(0):
+            build_diary_context(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PlantEvent.objects.create(
+                plant=plant, step=self.planting, date=date(2026, 4, 1)
+            )
+        self.assertIn("Высадка с 2026-04-01", build_diary_context(self.user.pk))
+
+    def test_context_loaded_before_a_change_is_not_cached(self):
+        variety = PlantVariety.objects.create(
+            type=self.tomato, slug="cherry", name="Cherry", duration_days=90
+        )
+
+        def load_then_change(user_id, today):
+            data = load_diary_data(user_id, today)
+            # Committed by another request while this one renders
+            with self.captureOnCommitCallbacks(execute=True):
+                SeedStock.objects.create(user=self.user, variety=variety, quantity=3)
+            return data
+
+        with patch("diary.context.load_diary_data", load_then_change):
+            self.assertNotIn("Запас семян", build_diary_context(self.user.pk))
+
+        self.assertIn("Tomato Cherry: 3", build_diary_context(self.user.pk))
+
+    def test_plant_delete_reads_no_user_per_event(self):
+        query_counts = []
+        for planted_at in (None, date(2026, 5, 1)):
+            plant = self.create_plant(sown_at=date(2026, 3, 1), planted_at=planted_at)
+            with CaptureQueriesContext(connection) as queries:
+                plant.delete()
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
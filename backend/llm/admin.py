@@ -0,0 +1,63 @@
+from core.admin import ReplicaChangeListMixin
+from django.contrib import admin
+from django.db.models import Count, F, Sum
+from django.utils.translation import gettext_lazy as _
+
+from .models import LLMUsage
+
+# Heaviest users listed in the summary of the changelist
+TOP_USERS = 10
+
+
+@admin.register(LLMUsage)
+class LLMUsageAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = (
+        "day",
+        "user",
+        "model",
+        "requests",
+        "prompt_tokens",
+        "completion_tokens",
+        "total_tokens",
+        "average_latency",
+    )
+    list_filter = ("day", "model")
+    search_fields = ("user__username", "model")
+    date_hierarchy = "day"
+    ordering = ("-day", "-completion_tokens")
+    list_select_related = ("user",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description=_("Токены"))
+    def total_tokens(self, obj):
+        return obj.total_tokens
+
+    @admin.display(description=_("Среднее время ответа, с"))
+    def average_latency(self, obj):
+        if not obj.requests:
+            return None
+        return round(obj.latency_seconds / obj.requests, 2)
+
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        # Summary of the filtered rows, shown above them
+        queryset = changelist.queryset.order_by()
+        tokens = F("prompt_tokens") + F("completion_tokens")
+        changelist.usage_totals = queryset.aggregate(
+            users=Count("user", distinct=True),
+            total_requests=Sum("requests"),
+            total_prompt_tokens=Sum("prompt_tokens"),
+            total_completion_tokens=Sum("completion_tokens"),
+            total_tokens=Sum(tokens),
+        )
+        changelist.top_users = (
+            queryset.values("user__username")
+            .annotate(total_requests=Sum("requests"), total_tokens=Sum(tokens))
+            .order_by("-total_tokens")[:TOP_USERS]
+        )
+        return changelist
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class LlmConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "llm"
+
+    def ready(self):
+        from core.lifespan import on_shutdown
+
+        from .usage import usage_tracker
+
+        on_shutdown(usage_tracker.shutdown)
@@ -0,0 +1,304 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+from typing import Any
+
+from core.caching import TTLCache
+from django.conf import settings
+from llm.interfaces import LLMClient
+from llm.metrics import llm_cache_lookups_total
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(
+    namespace: str,
+    *,
+    model: str | None,
+    messages: list[dict[str, str]],
+    system_message: str | None,
+    temperature: float,
+    max_tokens: int | None,
+    tools: list[dict[str, Any]] | None,
+) -> str:
+    """SHA-256 of the canonical JSON of everything that shapes the response."""
+    request = {
+        "namespace": namespace,
+        "model": model,
+        "messages": messages,
+        "system_message": system_message,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "tools": tools or None,
+    }
+    canonical = json.dumps(
+        request, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    JSON values kept in files under `directory` for `ttl` seconds. Once the
+    files exceed `max_bytes`, the least recently used ones are deleted.
+
+    Files are replaced atomically, so several processes can share a directory.
+    """
+
+    def __init__(self, directory: str | Path, *, max_bytes: int, ttl: float):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._size: int | None = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _files(self) -> list[tuple[Path, os.stat_result]]:
+        files = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                pass
+        return files
+
+    def get(self, key: str) -> Any | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Dropping unreadable LLM cache file %s", path)
+            self.delete(key)
+            return None
+
+        if entry["created_at"] + self.ttl < time.time():
+            self.delete(key)
+            return None
+
+        # Modification time tracks the last use for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry["value"]
+
+    def set(self, key: str, value: Any):
+        path = self._path(key)
+        data = json.dumps({"created_at": time.time(), "value": value}).encode()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, suffix=".tmp", delete=False
+        ) as file:
+            file.write(data)
+        os.replace(file.name, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(stat.st_size for _, stat in self._files())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        files = sorted(self._files(), key=lambda file: file[1].st_mtime)
+        size = sum(stat.st_size for _, stat in files)
+        # Evict below the limit, so that eviction doesn't run on every write
+        target = self.max_bytes * 0.9
+        for path, stat in files:
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+        self._size = size
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            for path, _ in self._files():
+                path.unlink(missing_ok=True)
+            self._size = 0
+
+
+class CachingLLMClient(LLMClient):
+    """
+    Serves repeated chat completions from an in-memory LRU cache, backed by
+    an optional disk cache shared by all workers.
+
+    Calls with a temperature above `max_temperature`, which are expected to
+    vary, and calls made with `cache=False` go to the client directly, as do
+    streamed completions. Without a memory or disk cache, every call does,
+    so callers may pass `cache` whether caching is configured or not.
+
+    Entries are keyed by `namespace`, the provider name, and the request.
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        *,
+        namespace: str | None = None,
+        memory: TTLCache | None = None,
+        disk: DiskCache | None = None,
+        max_temperature: float | None = None,
+    ):
+        self.client = client
+        self.namespace = namespace or type(client).__name__
+        self.memory = memory
+        self.disk = disk
+        self.max_temperature = (
+            max_temperature
+            if max_temperature is not None
+            else settings.LLM_CACHE_MAX_TEMPERATURE
+        )
+
+    @classmethod
+    def from_settings(
+        cls, client: LLMClient, namespace: str | None = None
+    ) -> "CachingLLMClient":
+        memory = None
+        if settings.LLM_CACHE_SIZE:
+            memory = TTLCache(
+                maxsize=settings.LLM_CACHE_SIZE, ttl=settings.LLM_CACHE_TTL_SECONDS
+            )
+        disk = None
+        if settings.LLM_CACHE_DIR:
+            disk = DiskCache(
+                settings.LLM_CACHE_DIR,
+                max_bytes=settings.LLM_CACHE_DISK_MAX_MB * 1024 * 1024,
+                ttl=settings.LLM_CACHE_TTL_SECONDS,
+            )
+        return cls(client, namespace=namespace, memory=memory, disk=disk)
+
+    def _key(self, request: dict[str, Any], cache: bool) -> str | None:
+        if self.memory is None and self.disk is None:
+            return None
+        if not cache or request["temperature"] > self.max_temperature:
+            llm_cache_lookups_total.inc("bypass")
+            return None
+        return cache_key(
+            self.namespace,
+            **{
+                **request,
+                "model": request["model"]
+                or getattr(self.client, "default_model", None),
+            },
+        )
+
+    def _get_from_memory(self, key: str) -> Any | None:
+        if self.memory is None:
+            return None
+        return self.memory.get(key)
+
+    def _hit(self, result: str, response: dict[str, Any]) -> dict[str, Any]:
+        llm_cache_lookups_total.inc(result)
+        # Callers may modify the response
+        return copy.deepcopy(response)
+
+    def _store(self, key: str, response: dict[str, Any]):
+        if self.memory is not None:
+            self.memory.set(key, copy.deepcopy(response))
+
+    def chat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+        cache: bool = True,
+    ) -> dict[str, Any]:
+        request = {
+            "messages": messages,
+            "system_message": system_message,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": tools,
+        }
+        key = self._key(request, cache)
+        if key is None:
+            return self.client.chat_completion(**request)
+
+        if (response := self._get_from_memory(key)) is not None:
+            return self._hit("memory_hit", response)
+        if self.disk is not None and (response := self.disk.get(key)) is not None:
+            self._store(key, response)
+            return self._hit("disk_hit", response)
+
+        llm_cache_lookups_total.inc("miss")
+        response = self.client.chat_completion(**request)
+        self._store(key, response)
+        if self.disk is not None:
+            self.disk.set(key, response)
+        return response
+
+    async def achat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+        cache: bool = True,
+    ) -> dict[str, Any]:
+        request = {
+            "messages": messages,
+            "system_message": system_message,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": tools,
+        }
+        key = self._key(request, cache)
+        if key is None:
+            return await self.client.achat_completion(**request)
+
+        if (response := self._get_from_memory(key)) is not None:
+            return self._hit("memory_hit", response)
+        if self.disk is not None:
+            response = await asyncio.to_thread(self.disk.get, key)
+            if response is not None:
+                self._store(key, response)
+                return self._hit("disk_hit", response)
+
+        llm_cache_lookups_total.inc("miss")
+        response = await self.client.achat_completion(**request)
+        self._store(key, response)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, response)
+        return response
+
+    def stream_chat_completion(
+        self, *, cache: bool = True, **kwargs: Any
+    ) -> Iterator[dict[str, Any]]:
+        return self.client.stream_chat_completion(**kwargs)
+
+    def astream_chat_completion(
+        self, *, cache: bool = True, **kwargs: Any
+    ) -> AsyncIterator[dict[str, Any]]:
+        return self.client.astream_chat_completion(**kwargs)
+
+    def supports_tools(self) -> bool:
+        return self.client.supports_tools()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -1,18 +1,48 @@
+import asyncio
+import copy
+import http.client
 import json
 import socket
 import time
 import urllib.error
 import urllib.request
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
 from typing import Any
 
+import aiohttp
 from django.conf import settings
 
-from llm.errors import LLMProviderError, LLMRateLimitError, LLMTimeoutError
-from llm.interfaces import LLMClient
+from llm.errors import (
+    LLMClientError,
+    LLMProviderError,
+    LLMRateLimitError,
+    LLMTimeoutError,
+)
+from llm.interfaces import BatchResult, LLMClient, ProgressCallback
+from llm.metrics import (
+    llm_request_duration_seconds,
+    llm_requests_total,
+    llm_stream_first_token_seconds,
+)
+from llm.ratelimit import CircuitBreaker, RateLimiter
+from llm.streaming import SSEParser
+
+# Read from streams as soon as any bytes arrive, up to this many
+STREAM_CHUNK_SIZE = 65536
 
 
 class OpenRouterClient(LLMClient):
-    """OpenRouter adapter implementing the provider-agnostic LLM interface."""
+    """
+    OpenRouter adapter implementing the provider-agnostic LLM interface.
+
+    `achat_completion` sends requests over a keep-alive connection pool of at
+    most `max_connections` connections, one pool per event loop.
+
+    Streamed completions yield the provider's chunks as they arrive; the
+    timeout applies to the wait for each chunk rather than the whole stream.
+
+    Requests of a client share its rate limiter and circuit breaker.
+    """
 
     endpoint = "https://openrouter.ai/api/v1/chat/completions"
 
@@ -23,7 +53,13 @@ class OpenRouterClient(LLMClient):
         default_model: str | None = None,
         timeout_seconds: int | None = None,
         max_retries: int | None = None,
+        max_connections: int | None = None,
+        endpoint: str | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
     ):
+        if endpoint:
+            self.endpoint = endpoint
         self.api_key = api_key or settings.OPENROUTER_API_KEY
         self.default_model = default_model or settings.LLM_DEFAULT_MODEL
         self.timeout_seconds = timeout_seconds or settings.LLM_REQUEST_TIMEOUT_SECONDS
@@ -35,6 +71,29 @@ class OpenRouterClient(LLMClient):
             raise ValueError("LLM_REQUEST_TIMEOUT_SECONDS must be > 0")
         if self.max_retries < 0:
             raise ValueError("LLM_MAX_RETRIES must be >= 0")
+        self.max_connections = (
+            max_connections
+            if max_connections is not None
+            else settings.LLM_MAX_CONNECTIONS
+        )
+        if self.max_connections <= 0:
+            raise ValueError("LLM_MAX_CONNECTIONS must be > 0")
+        # Sessions can't be shared across event loops: one per loop, with the
+        # generator closing it, see `_close_with_loop`
+        self._sessions: dict[
+            asyncio.AbstractEventLoop,
+            tuple[aiohttp.ClientSession, AsyncGenerator[None, None]],
+        ] = {}
+        self.rate_limiter = rate_limiter or RateLimiter(
+            "openrouter",
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+        )
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(
+            "openrouter",
+            failure_threshold=settings.LLM_CIRCUIT_BREAKER_FAILURES,
+            reset_timeout=settings.LLM_CIRCUIT_BREAKER_RESET_SECONDS,
+        )
 
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY is required for OpenRouterClient")
@@ -49,10 +108,194 @@ class OpenRouterClient(LLMClient):
         max_tokens: int | None = None,
         tools: list[dict[str, Any]] | None = None,
     ) -> dict[str, Any]:
-        request_messages = self._compose_messages(messages, system_message)
+        payload = self._build_payload(
+            messages, system_message, model, temperature, max_tokens, tools
+        )
+
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            return self._post_with_retries(payload)
+        except LLMClientError as error:
+            outcome = type(error).__name__
+            raise
+        finally:
+            self._observe(payload["model"], start, outcome)
+
+    async def achat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        payload = self._build_payload(
+            messages, system_message, model, temperature, max_tokens, tools
+        )
+
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            return await self._apost_with_retries(payload)
+        except LLMClientError as error:
+            outcome = type(error).__name__
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            self._observe(payload["model"], start, outcome)
+
+    def stream_chat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        payload = self._build_payload(
+            messages, system_message, model, temperature, max_tokens, tools
+        )
+        payload["stream"] = True
+
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            with self._post_with_retries(payload, stream=True) as response:
+                parser = SSEParser()
+                first_event = True
+                while chunk := self._read_stream_chunk(response):
+                    for data in parser.feed(chunk):
+                        event = self._parse_stream_event(data)
+                        if event is None:
+                            return
+                        if first_event:
+                            first_event = False
+                            self._observe_first_token(payload["model"], start)
+                        yield event
+            raise LLMProviderError("OpenRouter stream ended unexpectedly")
+        except LLMClientError as error:
+            outcome = type(error).__name__
+            raise
+        except GeneratorExit:
+            outcome = "closed"
+            raise
+        finally:
+            self._observe(payload["model"], start, outcome)
+
+    async def astream_chat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        payload = self._build_payload(
+            messages, system_message, model, temperature, max_tokens, tools
+        )
+        payload["stream"] = True
+
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            async with await self._apost_with_retries(payload, stream=True) as response:
+                parser = SSEParser()
+                first_event = True
+                while chunk := await self._aread_stream_chunk(response):
+                    for data in parser.feed(chunk):
+                        event = self._parse_stream_event(data)
+                        if event is None:
+                            return
+                        if first_event:
+                            first_event = False
+                            self._observe_first_token(payload["model"], start)
+                        yield event
+            raise LLMProviderError("OpenRouter stream ended unexpectedly")
+        except LLMClientError as error:
+            outcome = type(error).__name__
+            raise
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "closed"
+            raise
+        finally:
+            self._observe(payload["model"], start, outcome)
+
+    def chat_completion_many(
+        self,
+        requests: list[dict[str, Any]],
+        *,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+        progress: ProgressCallback | None = None,
+    ) -> list[BatchResult]:
+        """
+        Runs the batch on the async path, in an event loop and connection pool
+        of its own. The rate limiter and circuit breaker stay shared.
+        """
+        client = copy.copy(self)
+        client._sessions = {}
+
+        async def run():
+            try:
+                return await client.achat_completion_many(
+                    requests,
+                    concurrency=concurrency,
+                    timeout=timeout,
+                    progress=progress,
+                )
+            finally:
+                await client.aclose()
+
+        return asyncio.run(run())
+
+    def supports_tools(self) -> bool:
+        return True
+
+    async def aclose(self) -> None:
+        """Close the sessions of every event loop the client was used in."""
+        sessions = list(self._sessions.items())
+        self._sessions = {}
+        for loop, (_, closer) in sessions:
+            if loop.is_running() and loop is not asyncio.get_running_loop():
+                # In use by another thread, closed there
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(closer.aclose(), loop)
+                )
+            else:
+                await closer.aclose()
+
+    @staticmethod
+    async def _close_with_loop(
+        session: aiohttp.ClientSession,
+    ) -> AsyncGenerator[None, None]:
+        # Left suspended; asyncio.run() and async_to_sync() close the async
+        # generators of their loop before closing it, and so the session
+        try:
+            yield
+        finally:
+            await session.close()
+
+    def _build_payload(
+        self,
+        messages: list[dict[str, str]],
+        system_message: str | None,
+        model: str | None,
+        temperature: float,
+        max_tokens: int | None,
+        tools: list[dict[str, Any]] | None,
+    ) -> dict[str, Any]:
         payload: dict[str, Any] = {
             "model": model or self.default_model,
-            "messages": request_messages,
+            "messages": self._compose_messages(messages, system_message),
             "temperature": temperature,
         }
 
@@ -62,10 +305,55 @@ class OpenRouterClient(LLMClient):
         if tools:
             payload["tools"] = tools
 
-        return self._post_with_retries(payload)
+        return payload
 
-    def supports_tools(self) -> bool:
-        return True
+    @staticmethod
+    def _observe(model: str, start: float, outcome: str):
+        llm_request_duration_seconds.observe(
+            time.perf_counter() - start, "openrouter", model
+        )
+        llm_requests_total.inc("openrouter", model, outcome)
+
+    @staticmethod
+    def _observe_first_token(model: str, start: float):
+        llm_stream_first_token_seconds.observe(
+            time.perf_counter() - start, "openrouter", model
+        )
+
+    @staticmethod
+    def _parse_stream_event(data: str) -> dict[str, Any] | None:
+        """Chunk of a streamed completion, None once the stream is done."""
+        if data.strip() == "[DONE]":
+            return None
+
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError as error:
+            raise LLMProviderError(
+                "Failed to decode OpenRouter stream event"
+            ) from error
+
+        # Errors after the response started are sent as events
+        if "error" in event:
+            error = event["error"]
+            if isinstance(error, dict):
+                code = error.get("code")
+                raise LLMProviderError(
+                    f"OpenRouter stream failed: {error.get('message', error)}",
+                    status_code=code if isinstance(code, int) else None,
+                )
+            raise LLMProviderError(f"OpenRouter stream failed: {error}")
+        return event
+
+    def _headers(self) -> dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    @staticmethod
+    def _retry_delay(attempt: int) -> float:
+        return 2**attempt
 
     def _compose_messages(
         self, messages: list[dict[str, str]], system_message: str | None
@@ -76,31 +364,49 @@ class OpenRouterClient(LLMClient):
         composed_messages.extend(messages)
         return composed_messages
 
-    def _post_with_retries(self, payload: dict[str, Any]) -> dict[str, Any]:
+    def _post_with_retries(self, payload: dict[str, Any], *, stream: bool = False):
+        """Parsed response, or the open response of a streamed request."""
+        probe = self.circuit_breaker.before_request()
+        try:
+            response = self._send_with_retries(payload, stream=stream)
+        except BaseException as error:
+            self.circuit_breaker.record(error, probe=probe)
+            raise
+        self.circuit_breaker.record(probe=probe)
+        return response
+
+    def _send_with_retries(self, payload: dict[str, Any], *, stream: bool):
         encoded_payload = json.dumps(payload).encode("utf-8")
+        estimated_tokens = self.rate_limiter.estimate_tokens(payload)
 
         for attempt in range(self.max_retries + 1):
+            if delay := self.rate_limiter.reserve(estimated_tokens):
+                time.sleep(delay)
             try:
                 request = urllib.request.Request(
                     self.endpoint,
                     data=encoded_payload,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
+                    headers=self._headers(),
                     method="POST",
                 )
-                with urllib.request.urlopen(
+                response = urllib.request.urlopen(
                     request,
                     timeout=self.timeout_seconds,
-                ) as response:
+                )
+                self.rate_limiter.on_response(response.headers)
+                if stream:
+                    return response
+                with response:
                     raw_body = response.read().decode("utf-8")
                     parsed = json.loads(raw_body)
                     return parsed
             except urllib.error.HTTPError as error:
                 if error.code == 429:
+                    # The next attempt waits for the limiter to resume
+                    self.rate_limiter.on_rate_limited(
+                        error.headers, self._retry_delay(attempt)
+                    )
                     if attempt < self.max_retries:
-                        time.sleep(2**attempt)
                         continue
                     raise LLMRateLimitError("OpenRouter rate limit exceeded") from error
 
@@ -112,7 +418,7 @@ class OpenRouterClient(LLMClient):
             except urllib.error.URLError as error:
                 is_timeout = isinstance(error.reason, (TimeoutError, socket.timeout))
                 if is_timeout and attempt < self.max_retries:
-                    time.sleep(2**attempt)
+                    time.sleep(self._retry_delay(attempt))
                     continue
                 if is_timeout:
                     raise LLMTimeoutError("OpenRouter request timed out") from error
@@ -121,10 +427,111 @@ class OpenRouterClient(LLMClient):
                 ) from error
             except (TimeoutError, socket.timeout) as error:
                 if attempt < self.max_retries:
-                    time.sleep(2**attempt)
+                    time.sleep(self._retry_delay(attempt))
                     continue
                 raise LLMTimeoutError("OpenRouter request timed out") from error
             except json.JSONDecodeError as error:
                 raise LLMProviderError(
                     "Failed to decode OpenRouter response"
                 ) from error
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if loop in self._sessions and not self._sessions[loop][0].closed:
+            return self._sessions[loop][0]
+
+        # Forget loops that have ended, closing sessions still open if they
+        # were closed without finalizing their async generators
+        for ended in [other for other in self._sessions if other.is_closed()]:
+            await self._sessions.pop(ended)[1].aclose()
+
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+            headers=self._headers(),
+        )
+        closer = self._close_with_loop(session)
+        await anext(closer)
+        self._sessions[loop] = (session, closer)
+        return session
+
+    @staticmethod
+    def _read_stream_chunk(response) -> bytes:
+        try:
+            return response.read1(STREAM_CHUNK_SIZE)
+        except (TimeoutError, socket.timeout) as error:
+            raise LLMTimeoutError("OpenRouter stream timed out") from error
+        except (OSError, http.client.HTTPException) as error:
+            raise LLMProviderError(f"OpenRouter stream interrupted: {error}") from error
+
+    @staticmethod
+    async def _aread_stream_chunk(response: aiohttp.ClientResponse) -> bytes:
+        try:
+            return await response.content.readany()
+        except TimeoutError as error:
+            raise LLMTimeoutError("OpenRouter stream timed out") from error
+        except aiohttp.ClientError as error:
+            raise LLMProviderError(f"OpenRouter stream interrupted: {error}") from error
+
+    async def _apost_with_retries(
+        self, payload: dict[str, Any], *, stream: bool = False
+    ):
+        """Parsed response, or the open response of a streamed request."""
+        probe = self.circuit_breaker.before_request()
+        try:
+            response = await self._asend_with_retries(payload, stream=stream)
+        except BaseException as error:
+            self.circuit_breaker.record(error, probe=probe)
+            raise
+        self.circuit_breaker.record(probe=probe)
+        return response
+
+    async def _asend_with_retries(self, payload: dict[str, Any], *, stream: bool):
+        session = await self._get_session()
+        estimated_tokens = self.rate_limiter.estimate_tokens(payload)
+        options = {}
+        if stream:
+            options["timeout"] = aiohttp.ClientTimeout(
+                sock_connect=self.timeout_seconds, sock_read=self.timeout_seconds
+            )
+
+        for attempt in range(self.max_retries + 1):
+            if delay := self.rate_limiter.reserve(estimated_tokens):
+                await asyncio.sleep(delay)
+            try:
+                response = await session.post(self.endpoint, json=payload, **options)
+                if response.status < 400:
+                    self.rate_limiter.on_response(response.headers)
+                if stream and response.status < 400:
+                    return response
+                async with response:
+                    status = response.status
+                    raw_body = await response.read()
+            except TimeoutError as error:
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._retry_delay(attempt))
+                    continue
+                raise LLMTimeoutError("OpenRouter request timed out") from error
+            except aiohttp.ClientError as error:
+                raise LLMProviderError(f"OpenRouter network error: {error}") from error
+
+            if status == 429:
+                self.rate_limiter.on_rate_limited(
+                    response.headers, self._retry_delay(attempt)
+                )
+                if attempt < self.max_retries:
+                    continue
+                raise LLMRateLimitError("OpenRouter rate limit exceeded")
+
+            if status >= 400:
+                error_body = raw_body.decode("utf-8", errors="replace")
+                raise LLMProviderError(
+                    f"OpenRouter request failed: {error_body}", status_code=status
+                )
+
+            try:
+                return json.loads(raw_body)
+            except json.JSONDecodeError as error:
+                raise LLMProviderError(
+                    "Failed to decode OpenRouter response"
+                ) from error
@@ -0,0 +1,141 @@
+import asyncio
+import copy
+import threading
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+from llm.cache import cache_key
+from llm.interfaces import LLMClient
+from llm.metrics import llm_coalesced_requests_total
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: dict[str, Any] | None = None
+        self.error: BaseException | None = None
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class CoalescingLLMClient(LLMClient):
+    """
+    Lets concurrent identical chat completions share one upstream request.
+
+    The first caller sends the request, the others wait for it and receive
+    a copy of its response, or its error. Streamed completions are not shared.
+    """
+
+    def __init__(self, client: LLMClient):
+        self.client = client
+        self.default_model = getattr(client, "default_model", None)
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self._async_calls: dict[tuple[asyncio.AbstractEventLoop, str], _AsyncCall] = {}
+
+    def _key(self, request: dict[str, Any]) -> str:
+        return cache_key(
+            type(self.client).__name__,
+            **{
+                **request,
+                "model": request["model"]
+                or getattr(self.client, "default_model", None),
+            },
+        )
+
+    def chat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        request = {
+            "messages": messages,
+            "system_message": system_message,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": tools,
+        }
+        key = self._key(request)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            llm_coalesced_requests_total.inc("sync")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = self.client.chat_completion(**request)
+            return copy.deepcopy(call.result)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def achat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        request = {
+            "messages": messages,
+            "system_message": system_message,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": tools,
+        }
+        key = (asyncio.get_running_loop(), self._key(request))
+        call = self._async_calls.get(key)
+        if call is None:
+            # The request runs in its own task, so that a cancelled caller
+            # doesn't cancel it for the others
+            task = asyncio.create_task(self.client.achat_completion(**request))
+            call = self._async_calls[key] = _AsyncCall(task)
+            task.add_done_callback(lambda _: self._async_calls.pop(key, None))
+        else:
+            llm_coalesced_requests_total.inc("async")
+
+        call.waiters += 1
+        try:
+            return copy.deepcopy(await asyncio.shield(call.task))
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # Every caller gave up
+                call.task.cancel()
+
+    def stream_chat_completion(self, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        return self.client.stream_chat_completion(**kwargs)
+
+    def astream_chat_completion(self, **kwargs: Any) -> AsyncIterator[dict[str, Any]]:
+        return self.client.astream_chat_completion(**kwargs)
+
+    def supports_tools(self) -> bool:
+        return self.client.supports_tools()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -16,3 +16,7 @@ class LLMProviderError(LLMClientError):
     def __init__(self, message: str, *, status_code: int | None = None):
         super().__init__(message)
         self.status_code = status_code
+
+
+class LLMQuotaExceededError(LLMClientError):
+    """Raised before sending a request of a user out of daily tokens."""
@@ -1,15 +1,62 @@
+import threading
+
+from core.lifespan import on_shutdown
+from django.conf import settings
+from llm.cache import CachingLLMClient
 from llm.clients import OpenRouterClient
+from llm.coalescing import CoalescingLLMClient
+from llm.hedging import HedgedLLMClient, Target
 from llm.interfaces import LLMClient
+from llm.usage import UsageLLMClient
 
 
 class LLMProviderFactory:
     """Build LLM clients by provider name."""
 
-    @staticmethod
-    def create(provider: str = "openrouter") -> LLMClient:
+    _shared: dict[str, LLMClient] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def create(cls, provider: str = "openrouter") -> LLMClient:
         normalized_provider = provider.strip().lower()
 
         if normalized_provider == "openrouter":
             return OpenRouterClient()
 
+        if normalized_provider == "hedged":
+            if not settings.LLM_HEDGE_TARGETS:
+                raise ValueError(
+                    "LLM_HEDGE_TARGETS is required for the hedged provider"
+                )
+            targets = [Target.parse(value) for value in settings.LLM_HEDGE_TARGETS]
+            if any(target.provider == "hedged" for target in targets):
+                raise ValueError("LLM_HEDGE_TARGETS can't use the hedged provider")
+            return HedgedLLMClient(targets, client_for=cls.create)
+
         raise ValueError(f"Unsupported LLM provider: {provider}")
+
+    @classmethod
+    def shared(cls, provider: str = "openrouter") -> LLMClient:
+        """
+        Process-wide client, so that callers reuse its connection pool and
+        response cache, and share identical requests in flight. Each caller
+        is charged for its requests, shared or not.
+        """
+        normalized_provider = provider.strip().lower()
+
+        with cls._lock:
+            client = cls._shared.get(normalized_provider)
+            if client is None:
+                client = cls.create(normalized_provider)
+                if settings.LLM_COALESCE_REQUESTS:
+                    client = CoalescingLLMClient(client)
+                # Above coalescing, so that each caller sharing a request is
+                # checked against its quota and charged for it
+                client = UsageLLMClient(client)
+                # Installed even when caching is off, to accept `cache=False`
+                client = CachingLLMClient.from_settings(
+                    client, namespace=normalized_provider
+                )
+                cls._shared[normalized_provider] = client
+                on_shutdown(client.aclose)
+        return client
@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiohttp import web
+
+_completion_ids = itertools.count(1)
+
+
+def fake_completion(
+    content: str = "ok", *, model: str = "fake/model", usage: dict | None = None
+) -> dict[str, Any]:
+    """Chat completion response in the OpenAI format used by OpenRouter."""
+    return {
+        "id": f"gen-{next(_completion_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage
+        or {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+def fake_stream(
+    contents: list[str], *, model: str = "fake/model", done: bool = True
+) -> list[bytes]:
+    """Server-sent events of a streamed completion, one per content delta."""
+    completion_id = f"gen-{next(_completion_ids)}"
+    events = []
+    for content in contents:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "model": model,
+            "choices": [
+                {"index": 0, "delta": {"content": content}, "finish_reason": None}
+            ],
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n".encode())
+    if done:
+        events.append(b"data: [DONE]\n\n")
+    return events
+
+
+@dataclass
+class FakeReply:
+    """
+    Scripted answer: a JSON body with a status, a raw body, or a stream of
+    chunks written `chunk_delay` apart.
+    """
+
+    status: int = 200
+    json: Any = None
+    body: bytes | None = None
+    stream: list[bytes] | None = None
+    chunk_delay: float = 0.0
+    headers: dict[str, str] = field(default_factory=dict)
+    delay: float = 0.0
+
+
+@dataclass
+class RecordedRequest:
+    payload: dict[str, Any]
+    headers: dict[str, str]
+    peer: tuple
+    received_at: float = field(default_factory=time.perf_counter)
+
+
+class FakeOpenRouterServer:
+    """
+    Local HTTP stand-in for the OpenRouter chat completions endpoint.
+
+    Requests are recorded and answered with the queued `replies` in order,
+    then with `fake_completion()`, or `fake_stream()` for streamed requests,
+    after `latency` seconds.
+    """
+
+    path = "/api/v1/chat/completions"
+
+    def __init__(self, *, latency: float = 0.0):
+        self.latency = latency
+        self.replies: list[FakeReply] = []
+        self.requests: list[RecordedRequest] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url: str | None = None
+        self._runner: web.AppRunner | None = None
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self.handle)
+
+    @property
+    def endpoint(self) -> str:
+        if self.url is None:
+            raise RuntimeError("Fake OpenRouter server is not started")
+        return self.url + self.path
+
+    @property
+    def connections(self) -> int:
+        """Distinct client connections seen so far."""
+        return len({request.peer for request in self.requests})
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        self.requests.append(
+            RecordedRequest(
+                payload=payload,
+                headers=dict(request.headers),
+                peer=request.transport.get_extra_info("peername"),
+            )
+        )
+        if self.replies:
+            reply = self.replies.pop(0)
+        elif payload.get("stream"):
+            reply = FakeReply(stream=fake_stream(["o", "k"]))
+        else:
+            reply = FakeReply()
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = reply.delay or self.latency
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        if reply.stream is not None:
+            response = web.StreamResponse(status=reply.status, headers=reply.headers)
+            response.content_type = "text/event-stream"
+            await response.prepare(request)
+            try:
+                for chunk in reply.stream:
+                    await response.write(chunk)
+                    if reply.chunk_delay:
+                        await asyncio.sleep(reply.chunk_delay)
+                await response.write_eof()
+            except ConnectionResetError:
+                # The client stopped reading, e.g. after an error event
+                pass
+            return response
+
+        if reply.body is not None:
+            return web.Response(
+                status=reply.status, body=reply.body, headers=reply.headers
+            )
+        return web.json_response(
+            reply.json if reply.json is not None else fake_completion(),
+            status=reply.status,
+            headers=reply.headers,
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start listening, port 0 picks a free one. Returns the base URL."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        self.url = f"http://{bound_host}:{bound_port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        self.url = None
@@ -0,0 +1,359 @@
+import asyncio
+import concurrent.futures
+import functools
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+from django.conf import settings
+from llm.errors import LLMProviderError, LLMTimeoutError
+from llm.interfaces import LLMClient
+from llm.metrics import (
+    llm_hedge_attempt_duration_seconds,
+    llm_hedge_attempts_total,
+    llm_hedges_total,
+)
+
+# Latencies kept per target, and needed before the percentile is trusted
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+# Errors after which the next target is tried
+FAILOVER_ERRORS = (LLMProviderError, LLMTimeoutError)
+
+
+@dataclass(frozen=True)
+class Target:
+    provider: str
+    model: str
+
+    @classmethod
+    def parse(cls, value: str) -> "Target":
+        """`provider:model`, e.g. `openrouter:openai/gpt-4o-mini`."""
+        provider, separator, model = value.partition(":")
+        if not separator or not provider.strip() or not model.strip():
+            raise ValueError(f"Invalid LLM target, expected provider:model: {value}")
+        return cls(provider.strip().lower(), model.strip())
+
+
+class _Latencies:
+    def __init__(self):
+        self._samples: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> float | None:
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, math.ceil(percentile * len(samples)) - 1)]
+
+
+class HedgedLLMClient(LLMClient):
+    """
+    Sends each request to an ordered list of (provider, model) targets.
+
+    The first target gets the request. If it hasn't answered once the
+    `percentile` of its recent latencies has passed, the next target gets
+    it too, and the first response wins. The requests still running are
+    cancelled. A target failing with `LLMProviderError` or `LLMTimeoutError`
+    passes the request on to the next one straight away.
+
+    Targets choose the model, so the `model` argument of requests is ignored.
+    The sync API can't cancel the losing requests. It stops waiting for
+    them, and they finish in the background.
+
+    Latencies of winning requests are recorded, and so are those of losing
+    sync requests once they finish. Losing async requests are cancelled, and
+    a target that was hedged records the time until then, which is less than
+    its latency but more than its hedge delay, so that a target usually
+    losing doesn't only keep its fast samples.
+
+    Streamed completions aren't hedged. They go to one target at a time,
+    passing on to the next one only if a target fails before its first
+    chunk, since chunks already yielded can't be taken back.
+    """
+
+    def __init__(
+        self,
+        targets: list[Target],
+        *,
+        client_for: Callable[[str], LLMClient],
+        percentile: float | None = None,
+        default_delay: float | None = None,
+    ):
+        if not targets:
+            raise ValueError("At least one LLM target is required")
+        self.targets = list(targets)
+        self.percentile = (
+            percentile if percentile is not None else settings.LLM_HEDGE_PERCENTILE
+        )
+        if not 0 < self.percentile <= 1:
+            raise ValueError("LLM_HEDGE_PERCENTILE must be in (0, 1]")
+        self.default_delay = (
+            default_delay
+            if default_delay is not None
+            else settings.LLM_HEDGE_DELAY_SECONDS
+        )
+        self.default_model = self.targets[0].model
+
+        self.clients: dict[str, LLMClient] = {}
+        for target in self.targets:
+            if target.provider not in self.clients:
+                self.clients[target.provider] = client_for(target.provider)
+        self.latencies = {target: _Latencies() for target in self.targets}
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    thread_name_prefix="llm-hedge"
+                )
+            return self._executor
+
+    def hedge_delay(self, target: Target) -> float:
+        """How long `target` gets to answer before the next target is tried."""
+        delay = self.latencies[target].percentile(self.percentile)
+        return self.default_delay if delay is None else delay
+
+    def _next_hedge(self, started: int) -> float | None:
+        """Wait before the next target is tried, None once all were."""
+        if started == len(self.targets):
+            return None
+        return self.hedge_delay(self.targets[started - 1])
+
+    def _request(self, target: Target, request: dict[str, Any]) -> dict[str, Any]:
+        return {**request, "model": target.model}
+
+    def _finished(self, target: Target, started_at: float, outcome: str):
+        elapsed = time.perf_counter() - started_at
+        if outcome == "won":
+            # Failures are often fast, they would pull the percentile down
+            self.latencies[target].add(elapsed)
+        llm_hedge_attempt_duration_seconds.observe(
+            elapsed, target.provider, target.model
+        )
+        llm_hedge_attempts_total.inc(target.provider, target.model, outcome)
+
+    def _lost(self, target: Target, started_at: float):
+        llm_hedge_attempts_total.inc(target.provider, target.model, "lost")
+        elapsed = time.perf_counter() - started_at
+        if elapsed >= self.hedge_delay(target):
+            self.latencies[target].add(elapsed)
+
+    def _lost_finished(
+        self, target: Target, started_at: float, future: concurrent.futures.Future
+    ):
+        llm_hedge_attempts_total.inc(target.provider, target.model, "lost")
+        if not future.cancelled() and future.exception() is None:
+            self.latencies[target].add(time.perf_counter() - started_at)
+
+    def chat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        request = {
+            "messages": messages,
+            "system_message": system_message,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": tools,
+        }
+        started = 0
+        running: dict[concurrent.futures.Future, tuple[Target, float]] = {}
+        error: Exception | None = None
+
+        def start_next():
+            nonlocal started
+            if started < len(self.targets):
+                target = self.targets[started]
+                future = self._get_executor().submit(
+                    self.clients[target.provider].chat_completion,
+                    **self._request(target, request),
+                )
+                running[future] = (target, time.perf_counter())
+                started += 1
+
+        start_next()
+        while running:
+            done, _ = concurrent.futures.wait(
+                running,
+                timeout=self._next_hedge(started),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            if not done:
+                llm_hedges_total.inc()
+                start_next()
+                continue
+
+            for future in done:
+                target, started_at = running.pop(future)
+                try:
+                    response = future.result()
+                except FAILOVER_ERRORS as exc:
+                    self._finished(target, started_at, "failed")
+                    error = exc
+                    start_next()
+                    continue
+                except Exception:
+                    self._finished(target, started_at, "failed")
+                    self._abandon(running)
+                    raise
+
+                self._finished(target, started_at, "won")
+                self._abandon(running)
+                return response
+        raise error
+
+    def _abandon(self, running: dict[concurrent.futures.Future, tuple]):
+        for future, (target, started_at) in running.items():
+            if future.cancel():
+                llm_hedge_attempts_total.inc(target.provider, target.model, "lost")
+            else:
+                future.add_done_callback(
+                    functools.partial(self._lost_finished, target, started_at)
+                )
+
+    async def achat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        request = {
+            "messages": messages,
+            "system_message": system_message,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "tools": tools,
+        }
+        started = 0
+        running: dict[asyncio.Task, tuple[Target, float]] = {}
+        error: Exception | None = None
+
+        def start_next():
+            nonlocal started
+            if started < len(self.targets):
+                target = self.targets[started]
+                task = asyncio.create_task(
+                    self.clients[target.provider].achat_completion(
+                        **self._request(target, request)
+                    )
+                )
+                running[task] = (target, time.perf_counter())
+                started += 1
+
+        start_next()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=self._next_hedge(started),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    llm_hedges_total.inc()
+                    start_next()
+                    continue
+
+                for task in done:
+                    target, started_at = running.pop(task)
+                    try:
+                        response = task.result()
+                    except FAILOVER_ERRORS as exc:
+                        self._finished(target, started_at, "failed")
+                        error = exc
+                        start_next()
+                        continue
+                    except Exception:
+                        self._finished(target, started_at, "failed")
+                        raise
+
+                    self._finished(target, started_at, "won")
+                    return response
+            raise error
+        finally:
+            # Losers, or every request if the caller was cancelled
+            for task, (target, started_at) in running.items():
+                task.cancel()
+                self._lost(target, started_at)
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def stream_chat_completion(self, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        for index, target in enumerate(self.targets):
+            started_at = time.perf_counter()
+            stream = self.clients[target.provider].stream_chat_completion(
+                **self._request(target, kwargs)
+            )
+            try:
+                first = next(stream, None)
+            except FAILOVER_ERRORS:
+                self._finished(target, started_at, "failed")
+                if index == len(self.targets) - 1:
+                    raise
+                continue
+
+            # Time to the first chunk isn't comparable to the latencies
+            llm_hedge_attempts_total.inc(target.provider, target.model, "won")
+            if first is not None:
+                yield first
+                yield from stream
+            return
+
+    async def astream_chat_completion(
+        self, **kwargs: Any
+    ) -> AsyncIterator[dict[str, Any]]:
+        for index, target in enumerate(self.targets):
+            started_at = time.perf_counter()
+            stream = self.clients[target.provider].astream_chat_completion(
+                **self._request(target, kwargs)
+            )
+            try:
+                first = await anext(stream, None)
+            except FAILOVER_ERRORS:
+                self._finished(target, started_at, "failed")
+                if index == len(self.targets) - 1:
+                    raise
+                continue
+
+            llm_hedge_attempts_total.inc(target.provider, target.model, "won")
+            try:
+                if first is not None:
+                    yield first
+                    async for event in stream:
+                        yield event
+            finally:
+                await stream.aclose()
+            return
+
+    def supports_tools(self) -> bool:
+        return all(client.supports_tools() for client in self.clients.values())
+
+    async def aclose(self) -> None:
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            # Losing sync requests still running finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+        for client in self.clients.values():
+            await client.aclose()
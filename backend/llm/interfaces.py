@@ -1,7 +1,63 @@
+import asyncio
+import contextvars
+import functools
 from abc import ABC, abstractmethod
-from collections.abc import Iterator
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Any
 
+from django.conf import settings
+from llm.errors import LLMTimeoutError
+
+# Called with the number of finished requests and the size of the batch
+ProgressCallback = Callable[[int, int], None]
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one request of a batch: its response, or its error."""
+
+    response: dict[str, Any] | None = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def run_batch(
+    call: Callable[[dict[str, Any]], Awaitable[dict[str, Any]]],
+    requests: list[dict[str, Any]],
+    *,
+    concurrency: int,
+    timeout: float | None,
+    progress: ProgressCallback | None,
+) -> list[BatchResult]:
+    """Run `call` on each request, at most `concurrency` at a time."""
+    if concurrency <= 0:
+        raise ValueError("concurrency must be > 0")
+
+    results = [BatchResult() for _ in requests]
+    pending = iter(enumerate(requests))
+    finished = 0
+
+    async def worker():
+        nonlocal finished
+        for index, request in pending:
+            try:
+                results[index].response = await asyncio.wait_for(call(request), timeout)
+            except TimeoutError:
+                results[index].error = LLMTimeoutError("LLM request timed out")
+            except Exception as error:
+                results[index].error = error
+            finished += 1
+            if progress is not None:
+                progress(finished, len(requests))
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(requests)))))
+    return results
+
 
 class LLMClient(ABC):
     """Provider-agnostic interface for chat completion clients."""
@@ -19,6 +75,30 @@ class LLMClient(ABC):
     ) -> dict[str, Any]:
         """Send a chat completion request and return raw provider response."""
 
+    async def achat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Async version of `chat_completion`. Runs it in a thread unless the
+        implementation provides a native one.
+        """
+        return await asyncio.to_thread(
+            self.chat_completion,
+            messages=messages,
+            system_message=system_message,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            tools=tools,
+        )
+
     def stream_chat_completion(
         self,
         *,
@@ -32,6 +112,96 @@ class LLMClient(ABC):
         """Optional streaming API; implementations may override this method."""
         raise NotImplementedError("Streaming is not supported by this client")
 
+    async def astream_chat_completion(
+        self,
+        *,
+        messages: list[dict[str, str]],
+        system_message: str | None = None,
+        model: str | None = None,
+        temperature: float = 0.7,
+        max_tokens: int | None = None,
+        tools: list[dict[str, Any]] | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Async version of `stream_chat_completion`. Iterates it in a thread
+        unless the implementation provides a native one.
+        """
+        iterator = self.stream_chat_completion(
+            messages=messages,
+            system_message=system_message,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            tools=tools,
+        )
+        done = object()
+        try:
+            while (event := await asyncio.to_thread(next, iterator, done)) is not done:
+                yield event
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def chat_completion_many(
+        self,
+        requests: list[dict[str, Any]],
+        *,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+        progress: ProgressCallback | None = None,
+    ) -> list[BatchResult]:
+        """
+        Send a batch of `chat_completion` requests, given as dicts of its
+        arguments, `concurrency` at a time. Results are in the order of the
+        requests; a failed or timed out request doesn't fail the others.
+
+        Runs them in threads unless the implementation provides a pooled
+        path. A timed out request keeps its thread until it returns. Async
+        code uses `achat_completion_many` instead.
+        """
+        concurrency = concurrency or settings.LLM_BATCH_CONCURRENCY
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(concurrency, thread_name_prefix="llm") as pool:
+                return await run_batch(
+                    lambda request: loop.run_in_executor(
+                        pool,
+                        functools.partial(
+                            contextvars.copy_context().run,
+                            self.chat_completion,
+                            **request,
+                        ),
+                    ),
+                    requests,
+                    concurrency=concurrency,
+                    timeout=timeout,
+                    progress=progress,
+                )
+
+        return asyncio.run(run())
+
+    async def achat_completion_many(
+        self,
+        requests: list[dict[str, Any]],
+        *,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+        progress: ProgressCallback | None = None,
+    ) -> list[BatchResult]:
+        """Async version of `chat_completion_many`, using `achat_completion`."""
+        return await run_batch(
+            lambda request: self.achat_completion(**request),
+            requests,
+            concurrency=concurrency or settings.LLM_BATCH_CONCURRENCY,
+            timeout=timeout,
+            progress=progress,
+        )
+
     def supports_tools(self) -> bool:
         """Optional capability flag for tool-calling requests."""
         return False
+
+    async def aclose(self) -> None:
+        """Release pooled connections, if any."""
@@ -0,0 +1,63 @@
+from core.metrics import Counter, Histogram
+
+llm_requests_total = Counter(
+    "llm_requests_total",
+    "LLM chat completion requests by outcome.",
+    ("provider", "model", "outcome"),
+)
+llm_request_duration_seconds = Histogram(
+    "llm_request_duration_seconds",
+    "LLM chat completion latency, including retries.",
+    ("provider", "model"),
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+llm_stream_first_token_seconds = Histogram(
+    "llm_stream_first_token_seconds",
+    "Time until the first event of a streamed LLM completion.",
+    ("provider", "model"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0),
+)
+llm_cache_lookups_total = Counter(
+    "llm_cache_lookups_total",
+    "LLM response cache lookups by result.",
+    ("result",),
+)
+llm_coalesced_requests_total = Counter(
+    "llm_coalesced_requests_total",
+    "LLM requests that shared the upstream call of an identical one in flight.",
+    ("api",),
+)
+llm_rate_limit_wait_seconds_total = Counter(
+    "llm_rate_limit_wait_seconds_total",
+    "Time LLM requests waited for the client-side rate limiter.",
+    ("name",),
+)
+llm_circuit_breaker_rejections_total = Counter(
+    "llm_circuit_breaker_rejections_total",
+    "LLM requests failed fast while the provider was unavailable.",
+    ("name",),
+)
+llm_hedges_total = Counter(
+    "llm_hedges_total",
+    "LLM requests sent to another target because the previous one was slow.",
+)
+llm_hedge_attempts_total = Counter(
+    "llm_hedge_attempts_total",
+    "Requests of hedged LLM completions by target and outcome: won, lost or failed.",
+    ("provider", "model", "outcome"),
+)
+llm_hedge_attempt_duration_seconds = Histogram(
+    "llm_hedge_attempt_duration_seconds",
+    "Latency of the finished requests of hedged LLM completions, by target.",
+    ("provider", "model"),
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+llm_tokens_total = Counter(
+    "llm_tokens_total",
+    "Tokens of LLM requests reported by providers, by kind: prompt or completion.",
+    ("model", "kind"),
+)
+llm_quota_rejections_total = Counter(
+    "llm_quota_rejections_total",
+    "LLM requests refused because the user used up the daily token quota.",
+)
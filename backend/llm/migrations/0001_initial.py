@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LLMUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                ("model", models.CharField(max_length=128, verbose_name="Модель")),
+                (
+                    "requests",
+                    models.PositiveIntegerField(default=0, verbose_name="Запросы"),
+                ),
+                (
+                    "prompt_tokens",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Токены запросов"
+                    ),
+                ),
+                (
+                    "completion_tokens",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Токены ответов"
+                    ),
+                ),
+                (
+                    "latency_seconds",
+                    models.FloatField(
+                        default=0, verbose_name="Суммарное время ответа, с"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="llm_usage",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Использование LLM",
+                "verbose_name_plural": "Использование LLM",
+                "indexes": [
+                    models.Index(
+                        fields=["day", "model"], name="llm_llmusag_day_945a85_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "day", "model"), name="llm_usage_user_day_model"
+                    )
+                ],
+            },
+        ),
+    ]
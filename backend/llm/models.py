@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+UserModel = settings.AUTH_USER_MODEL
+
+
+class LLMUsage(models.Model):
+    """Daily LLM usage of a user per model, written in batches by `UsageTracker`."""
+
+    user = models.ForeignKey(
+        UserModel,
+        verbose_name=_("Пользователь"),
+        on_delete=models.CASCADE,
+        related_name="llm_usage",
+    )
+    day = models.DateField(verbose_name=_("День"))
+    model = models.CharField(max_length=128, verbose_name=_("Модель"))
+    requests = models.PositiveIntegerField(verbose_name=_("Запросы"), default=0)
+    prompt_tokens = models.PositiveBigIntegerField(
+        verbose_name=_("Токены запросов"), default=0
+    )
+    completion_tokens = models.PositiveBigIntegerField(
+        verbose_name=_("Токены ответов"), default=0
+    )
+    latency_seconds = models.FloatField(
+        verbose_name=_("Суммарное время ответа, с"), default=0
+    )
+
+    class Meta:
+        verbose_name = _("Использование LLM")
+        verbose_name_plural = _("Использование LLM")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day", "model"],
+                name="llm_usage_user_day_model",
+            )
+        ]
+        indexes = [models.Index(fields=["day", "model"])]
+
+    def __str__(self):
+        return f"{self.user} {self.day} {self.model}"
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
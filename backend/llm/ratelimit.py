@@ -0,0 +1,295 @@
+"""
+Client-side protection of LLM providers.
+
+`RateLimiter` spaces requests with token buckets on requests and estimated
+tokens per minute. It slows down when the provider answers 429 and pauses
+for as long as the provider's `Retry-After` or rate limit headers ask.
+
+`CircuitBreaker` fails requests fast while the provider keeps timing out or
+failing, and lets a single probe request through once `reset_timeout` passes.
+"""
+
+import email.utils
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+from typing import Any
+
+from core.metrics import REGISTRY, Family
+from llm.errors import LLMClientError, LLMProviderError, LLMTimeoutError
+from llm.metrics import (
+    llm_circuit_breaker_rejections_total,
+    llm_rate_limit_wait_seconds_total,
+)
+
+# Share of the configured rate kept after a 429, and regained per success
+DECREASE_FACTOR = 0.5
+INCREASE_FACTOR = 0.05
+MIN_RATE_FACTOR = 0.05
+
+_limiters: "weakref.WeakSet[RateLimiter]" = weakref.WeakSet()
+_breakers: "weakref.WeakSet[CircuitBreaker]" = weakref.WeakSet()
+
+
+class TokenBucket:
+    """
+    Refills at `rate` per minute up to `capacity`. Not thread-safe, callers
+    hold the lock of their `RateLimiter`.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount`, possibly on credit. Returns the wait until it's paid."""
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate / 60
+        )
+        self.updated_at = now
+        # Requests larger than the bucket would otherwise wait forever
+        self.tokens -= min(amount, self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens * 60 / self.rate
+
+
+def parse_retry_after(headers: Mapping[str, str] | None) -> float | None:
+    """Seconds to wait requested by `Retry-After` or rate limit headers."""
+    if not headers:
+        return None
+
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            moment = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, moment.timestamp() - time.time())
+
+    if headers.get("X-RateLimit-Remaining") == "0":
+        reset = headers.get("X-RateLimit-Reset")
+        try:
+            reset_at = float(reset)
+        except (TypeError, ValueError):
+            return None
+        # Either a timestamp in milliseconds or seconds, or a delay
+        if reset_at > 1e12:
+            reset_at /= 1000
+        if reset_at > 1e9:
+            return max(0.0, reset_at - time.time())
+        return reset_at
+    return None
+
+
+class RateLimiter:
+    """
+    Token buckets on requests and estimated tokens per minute, shared by the
+    requests of a client. A rate of 0 disables its bucket.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        requests_per_minute: float,
+        tokens_per_minute: float = 0,
+    ):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        # Fraction of the configured rates currently allowed
+        self.rate_factor = 1.0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+        _limiters.add(self)
+
+    def reserve(self, estimated_tokens: int) -> float:
+        """Seconds the caller must wait before sending its request."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.reserve(estimated_tokens, now))
+        if delay:
+            llm_rate_limit_wait_seconds_total.inc(self.name, amount=delay)
+        return delay
+
+    def on_response(self, headers: Mapping[str, str] | None):
+        """Pause if the provider's headers say the quota is used up."""
+        retry_after = parse_retry_after(headers)
+        with self._lock:
+            if retry_after:
+                self._pause(retry_after)
+            else:
+                self._set_rate_factor(self.rate_factor + INCREASE_FACTOR)
+
+    def on_rate_limited(self, headers: Mapping[str, str] | None, default: float):
+        """Slow down after a 429, pausing for `Retry-After` or `default`."""
+        retry_after = parse_retry_after(headers)
+        with self._lock:
+            self._pause(retry_after if retry_after is not None else default)
+            self._set_rate_factor(self.rate_factor * DECREASE_FACTOR)
+
+    def _pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _set_rate_factor(self, factor: float):
+        self.rate_factor = min(1.0, max(MIN_RATE_FACTOR, factor))
+        if self.requests is not None:
+            self.requests.rate = self.requests_per_minute * self.rate_factor
+        if self.tokens is not None:
+            self.tokens.rate = self.tokens_per_minute * self.rate_factor
+
+    @staticmethod
+    def estimate_tokens(payload: dict[str, Any]) -> int:
+        """Rough token count of a request: ~4 characters per prompt token."""
+        prompt = sum(
+            len(str(message.get("content") or "")) for message in payload["messages"]
+        )
+        return prompt // 4 + payload.get("max_tokens", 0)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed requests, i.e.
+    timeouts, network and 5xx errors, and rejects requests for
+    `reset_timeout` seconds. Then one probe request decides whether it closes.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, *, failure_threshold: int, reset_timeout: float):
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold must be > 0")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        _breakers.add(self)
+
+    def before_request(self) -> bool:
+        """
+        Raise `LLMProviderError` if the request must not be sent. Returns
+        whether the request is the probe, to be passed on to `record`.
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self._reject()
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self._reject()
+                self._probing = True
+                return True
+            return False
+
+    def _reject(self):
+        llm_circuit_breaker_rejections_total.inc(self.name)
+        raise LLMProviderError(f"{self.name} is unavailable, failing fast")
+
+    @staticmethod
+    def is_failure(error: BaseException) -> bool:
+        if isinstance(error, LLMTimeoutError):
+            return True
+        return isinstance(error, LLMProviderError) and (
+            error.status_code is None or error.status_code >= 500
+        )
+
+    def record(self, error: BaseException | None = None, *, probe: bool = False):
+        """
+        Outcome of a request let through by `before_request`. Only the probe
+        decides whether a half open breaker closes, requests sent before it
+        opened may still finish meanwhile.
+        """
+        with self._lock:
+            if probe:
+                self._probing = False
+            if error is not None and not isinstance(error, LLMClientError):
+                # Cancelled, says nothing about the provider
+                return
+
+            failed = error is not None and self.is_failure(error)
+            if probe:
+                if failed:
+                    self._open()
+                else:
+                    self.failures = 0
+                    self.state = self.CLOSED
+            elif self.state == self.CLOSED:
+                if failed:
+                    self.failures += 1
+                    if self.failures >= self.failure_threshold:
+                        self._open()
+                else:
+                    self.failures = 0
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+
+_BREAKER_STATES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2,
+}
+
+
+def _collect_state() -> list[Family]:
+    rates: dict[str, float] = {}
+    pauses: dict[str, float] = {}
+    now = time.monotonic()
+    for limiter in list(_limiters):
+        rates[limiter.name] = min(rates.get(limiter.name, 1.0), limiter.rate_factor)
+        pauses[limiter.name] = max(
+            pauses.get(limiter.name, 0.0), limiter.paused_until - now, 0.0
+        )
+    states: dict[str, int] = {}
+    for breaker in list(_breakers):
+        states[breaker.name] = max(
+            states.get(breaker.name, 0), _BREAKER_STATES[breaker.state]
+        )
+    return [
+        Family(
+            "llm_rate_limit_factor",
+            "gauge",
+            "Fraction of the configured LLM request rates currently allowed.",
+            [({"name": name}, rate) for name, rate in rates.items()],
+        ),
+        Family(
+            "llm_rate_limit_pause_seconds",
+            "gauge",
+            "Remaining pause of LLM requests requested by the provider.",
+            [({"name": name}, pause) for name, pause in pauses.items()],
+        ),
+        Family(
+            "llm_circuit_breaker_state",
+            "gauge",
+            "LLM circuit breaker state: 0 closed, 1 half open, 2 open.",
+            [({"name": name}, state) for name, state in states.items()],
+        ),
+    ]
+
+
+REGISTRY.register_collector(_collect_state)
@@ -0,0 +1,33 @@
+class SSEParser:
+    """
+    Incremental parser of a `text/event-stream` body.
+
+    `feed()` takes chunks as they arrive, split anywhere, and returns the data
+    of the events they complete. Comments, used as keep-alives, are skipped.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: list[str] = []
+
+    def feed(self, chunk: bytes) -> list[str]:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+
+        events = []
+        for raw_line in lines:
+            # Lines are decoded whole, so multibyte characters are never split
+            line = raw_line.rstrip(b"\r").decode("utf-8")
+            if not line:
+                if self._data:
+                    events.append("\n".join(self._data))
+                    self._data = []
+                continue
+
+            if line.startswith(":"):
+                continue
+
+            name, _, value = line.partition(":")
+            if name == "data":
+                self._data.append(value[1:] if value.startswith(" ") else value)
+        return events
@@ -1,13 +1,42 @@
+import asyncio
+import email.utils
 import json
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from unittest.mock import patch
 
-from django.test import SimpleTestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
+from core.caching import TTLCache
+from llm.cache import CachingLLMClient, DiskCache
 from llm.clients.openrouter import OpenRouterClient
-from llm.errors import LLMRateLimitError
+from llm.coalescing import CoalescingLLMClient
+from llm.errors import (
+    LLMProviderError,
+    LLMQuotaExceededError,
+    LLMRateLimitError,
+    LLMTimeoutError,
+)
+from llm.factory import LLMProviderFactory
+from llm.fakes import FakeOpenRouterServer, FakeReply, fake_completion, fake_stream
+from llm.hedging import HedgedLLMClient, Target
+from llm.interfaces import BatchResult, LLMClient
+from llm.models import LLMUsage
+from llm.ratelimit import CircuitBreaker, RateLimiter, parse_retry_after
+from llm.streaming import SSEParser
+from llm.usage import UsageLLMClient, UsageTracker, usage_for
 
 
 class FakeResponse:
+    headers = {}
+
     def __init__(self, payload: dict):
         self.payload = payload
 
@@ -64,3 +93,911 @@ class OpenRouterClientTests(SimpleTestCase):
             client = OpenRouterClient()
             with self.assertRaises(LLMRateLimitError):
                 client.chat_completion(messages=[{"role": "user", "content": "hi"}])
+
+
+@override_settings(
+    OPENROUTER_API_KEY="test-key",
+    LLM_DEFAULT_MODEL="openai/gpt-4o-mini",
+    LLM_REQUEST_TIMEOUT_SECONDS=5,
+    LLM_MAX_RETRIES=1,
+    LLM_MAX_CONNECTIONS=2,
+)
+class AsyncOpenRouterClientTests(SimpleTestCase):
+    @asynccontextmanager
+    async def serving(self, latency: float = 0.0):
+        server = FakeOpenRouterServer(latency=latency)
+        await server.start()
+        client = OpenRouterClient(endpoint=server.endpoint)
+        try:
+            yield server, client
+        finally:
+            await client.aclose()
+            await server.stop()
+
+    async def test_requests_reuse_pooled_connections(self):
+        async with self.serving() as (server, client):
+            server.replies.append(FakeReply(json=fake_completion("hello")))
+            result = await client.achat_completion(
+                messages=[{"role": "user", "content": "hi"}],
+                system_message="be brief",
+            )
+            for _ in range(3):
+                await client.achat_completion(messages=[{"role": "user", "content": "hi"}])
+
+        self.assertEqual(result["choices"][0]["message"]["content"], "hello")
+        request = server.requests[0]
+        self.assertEqual(request.headers["Authorization"], "Bearer test-key")
+        self.assertEqual(request.payload["model"], "openai/gpt-4o-mini")
+        self.assertEqual(request.payload["messages"][0]["role"], "system")
+        self.assertEqual(server.connections, 1)
+
+    async def test_connection_limit(self):
+        async with self.serving(latency=0.05) as (server, client):
+            await asyncio.gather(
+                *(
+                    client.achat_completion(messages=[{"role": "user", "content": str(i)}])
+                    for i in range(6)
+                )
+            )
+        self.assertEqual(server.max_in_flight, 2)
+
+    async def test_retries_rate_limit_without_blocking(self):
+        async with self.serving() as (server, client):
+            server.replies.append(FakeReply(status=429, json={}))
+            with patch.object(OpenRouterClient, "_retry_delay", return_value=0.01):
+                result = await client.achat_completion(
+                    messages=[{"role": "user", "content": "hi"}]
+                )
+            self.assertIn("choices", result)
+            self.assertEqual(len(server.requests), 2)
+
+            server.replies.append(FakeReply(status=500, json={"error": "boom"}))
+            with self.assertRaises(LLMProviderError) as raised:
+                await client.achat_completion(messages=[{"role": "user", "content": "hi"}])
+            self.assertEqual(raised.exception.status_code, 500)
+
+    async def test_cancellation(self):
+        async with self.serving() as (server, client):
+            server.replies.append(FakeReply(delay=1))
+            task = asyncio.create_task(
+                client.achat_completion(messages=[{"role": "user", "content": "hi"}])
+            )
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(len(server.requests), 1)
+
+    def test_factory_shares_one_client(self):
+        LLMProviderFactory._shared.clear()
+        try:
+            self.assertIs(LLMProviderFactory.shared(), LLMProviderFactory.shared(" OpenRouter "))
+        finally:
+            LLMProviderFactory._shared.clear()
+
+
+class FakeStreamResponse(FakeResponse):
+    def __init__(self, chunks: list):
+        self.chunks = list(chunks)
+
+    def read1(self, size):
+        if not self.chunks:
+            return b""
+        chunk = self.chunks.pop(0)
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+
+def contents(events):
+    return "".join(event["choices"][0]["delta"]["content"] for event in events)
+
+
+class SSEParserTests(SimpleTestCase):
+    def test_events_split_across_chunks(self):
+        parser = SSEParser()
+        body = ": keep-alive\r\n\r\ndata: {\"a\":\r\ndata: \"é\"}\r\n\r\ndata: [DONE]\n\n"
+        encoded = body.encode()
+        events = []
+        for i in range(len(encoded)):
+            events.extend(parser.feed(encoded[i : i + 1]))
+        self.assertEqual(events, ['{"a":\n"é"}', "[DONE]"])
+
+
+@override_settings(
+    OPENROUTER_API_KEY="test-key",
+    LLM_DEFAULT_MODEL="openai/gpt-4o-mini",
+    LLM_REQUEST_TIMEOUT_SECONDS=5,
+    LLM_MAX_RETRIES=0,
+)
+class StreamingTests(SimpleTestCase):
+    def test_sync_stream_yields_chunks(self):
+        chunks = [b": OPENROUTER PROCESSING\n\n", *fake_stream(["Hel", "lo"])]
+        response = FakeStreamResponse([b"".join(chunks)[:50], b"".join(chunks)[50:]])
+        with patch("urllib.request.urlopen", return_value=response) as mocked_urlopen:
+            events = list(
+                OpenRouterClient().stream_chat_completion(
+                    messages=[{"role": "user", "content": "hi"}]
+                )
+            )
+
+        self.assertEqual(contents(events), "Hello")
+        payload = json.loads(mocked_urlopen.call_args.args[0].data.decode("utf-8"))
+        self.assertTrue(payload["stream"])
+
+    def test_sync_stream_timeout(self):
+        response = FakeStreamResponse([fake_stream(["a"])[0], socket.timeout()])
+        with patch("urllib.request.urlopen", return_value=response):
+            stream = OpenRouterClient().stream_chat_completion(
+                messages=[{"role": "user", "content": "hi"}]
+            )
+            self.assertEqual(contents([next(stream)]), "a")
+            with self.assertRaises(LLMTimeoutError):
+                next(stream)
+
+    async def test_async_stream_yields_before_completion_ends(self):
+        server = FakeOpenRouterServer()
+        await server.start()
+        client = OpenRouterClient(endpoint=server.endpoint)
+        server.replies.append(
+            FakeReply(stream=fake_stream(["a", "b", "c"]), chunk_delay=0.2)
+        )
+        try:
+            start = time.perf_counter()
+            events, arrivals = [], []
+            async for event in client.astream_chat_completion(
+                messages=[{"role": "user", "content": "hi"}]
+            ):
+                events.append(event)
+                arrivals.append(time.perf_counter() - start)
+        finally:
+            await client.aclose()
+            await server.stop()
+
+        self.assertEqual(contents(events), "abc")
+        self.assertLess(arrivals[0], 0.15)
+        self.assertGreater(arrivals[-1], 0.35)
+
+    async def test_async_stream_errors(self):
+        server = FakeOpenRouterServer()
+        await server.start()
+        client = OpenRouterClient(endpoint=server.endpoint)
+        error = b'data: {"error": {"code": 502, "message": "upstream died"}}\n\n'
+        server.replies += [
+            FakeReply(stream=[*fake_stream(["a"], done=False), error]),
+            FakeReply(stream=fake_stream(["a"], done=False)),
+            FakeReply(status=429, json={}),
+        ]
+        try:
+            with self.assertRaisesMessage(LLMProviderError, "upstream died"):
+                async for _ in client.astream_chat_completion(
+                    messages=[{"role": "user", "content": "hi"}]
+                ):
+                    pass
+            with self.assertRaisesMessage(LLMProviderError, "ended unexpectedly"):
+                async for _ in client.astream_chat_completion(
+                    messages=[{"role": "user", "content": "hi"}]
+                ):
+                    pass
+            with self.assertRaises(LLMRateLimitError):
+                async for _ in client.astream_chat_completion(
+                    messages=[{"role": "user", "content": "hi"}]
+                ):
+                    pass
+        finally:
+            await client.aclose()
+            await server.stop()
+
+    async def test_default_async_stream_runs_sync_stream(self):
+        class SyncStreamingClient(LLMClient):
+            def chat_completion(self, **kwargs):
+                raise NotImplementedError
+
+            def stream_chat_completion(self, **kwargs):
+                yield {"choices": [{"delta": {"content": kwargs["model"]}}]}
+
+        events = [
+            event
+            async for event in SyncStreamingClient().astream_chat_completion(
+                messages=[], model="m"
+            )
+        ]
+        self.assertEqual(contents(events), "m")
+
+
+class CountingClient(LLMClient):
+    def __init__(self):
+        self.calls = 0
+        self.default_model = "fake/model"
+
+    def chat_completion(self, **kwargs):
+        self.calls += 1
+        return fake_completion(f"reply {self.calls}")
+
+
+class CachingLLMClientTests(SimpleTestCase):
+    messages = [{"role": "user", "content": "Name a herb"}]
+
+    def test_repeated_request_is_served_from_memory(self):
+        client = CountingClient()
+        cached = CachingLLMClient(client, memory=TTLCache(maxsize=10, ttl=60), max_temperature=0.5)
+
+        first = cached.chat_completion(messages=self.messages, temperature=0)
+        first["choices"] = []
+        second = cached.chat_completion(messages=self.messages, model="fake/model", temperature=0)
+
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(second["choices"][0]["message"]["content"], "reply 1")
+        cached.chat_completion(messages=self.messages, temperature=0, max_tokens=5)
+        self.assertEqual(client.calls, 2)
+
+    def test_warm_requests_and_opt_out_bypass_the_cache(self):
+        client = CountingClient()
+        cached = CachingLLMClient(client, memory=TTLCache(maxsize=10, ttl=60), max_temperature=0.5)
+
+        for _ in range(2):
+            cached.chat_completion(messages=self.messages, temperature=0.9)
+            cached.chat_completion(messages=self.messages, temperature=0, cache=False)
+        self.assertEqual(client.calls, 4)
+
+    def test_disk_cache_is_shared_between_clients(self):
+        with tempfile.TemporaryDirectory() as directory:
+            client = CountingClient()
+            for _ in range(2):
+                cached = CachingLLMClient(
+                    client,
+                    memory=TTLCache(maxsize=10, ttl=60),
+                    disk=DiskCache(directory, max_bytes=1024 * 1024, ttl=60),
+                    max_temperature=0.5,
+                )
+                response = cached.chat_completion(messages=self.messages, temperature=0)
+            self.assertEqual(client.calls, 1)
+            self.assertEqual(response["choices"][0]["message"]["content"], "reply 1")
+
+    def test_disk_entries_are_kept_per_provider(self):
+        with tempfile.TemporaryDirectory() as directory:
+            client = CountingClient()
+            for namespace in ("openrouter", "other", "openrouter"):
+                cached = CachingLLMClient(
+                    client, namespace=namespace, disk=DiskCache(directory, max_bytes=1024 * 1024, ttl=60)
+                )
+                cached.chat_completion(messages=self.messages, temperature=0)
+            self.assertEqual(client.calls, 2)
+
+    def test_disk_cache_evicts_least_recently_used_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            disk = DiskCache(directory, max_bytes=400, ttl=60)
+            disk.set("aa", "x" * 100)
+            disk.set("bb", "x" * 100)
+            time.sleep(0.01)
+            self.assertIsNotNone(disk.get("aa"))
+            disk.set("cc", "x" * 100)
+
+            self.assertIsNotNone(disk.get("aa"))
+            self.assertIsNone(disk.get("bb"))
+            self.assertIsNotNone(disk.get("cc"))
+
+    def test_disk_cache_expires_entries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            disk = DiskCache(directory, max_bytes=1024, ttl=60)
+            disk.set("aa", {"id": 1})
+            with patch("llm.cache.time.time", return_value=time.time() + 61):
+                self.assertIsNone(disk.get("aa"))
+
+    async def test_async_requests_share_the_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            client = CountingClient()
+            cached = CachingLLMClient(
+                client,
+                disk=DiskCache(directory, max_bytes=1024 * 1024, ttl=60),
+                max_temperature=0.5,
+            )
+            await cached.achat_completion(messages=self.messages, temperature=0)
+            cached.chat_completion(messages=self.messages, temperature=0)
+            self.assertEqual(client.calls, 1)
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_CACHE_SIZE=10, LLM_CACHE_DIR=None)
+    def test_factory_caches_shared_client(self):
+        LLMProviderFactory._shared.clear()
+        try:
+            self.assertIsInstance(LLMProviderFactory.shared(), CachingLLMClient)
+            self.assertIsInstance(LLMProviderFactory.create(), OpenRouterClient)
+        finally:
+            LLMProviderFactory._shared.clear()
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_CACHE_SIZE=0, LLM_CACHE_DIR=None)
+    def test_opt_out_is_accepted_without_cache(self):
+        LLMProviderFactory._shared.clear()
+        try:
+            client = LLMProviderFactory.shared()
+            with patch.object(OpenRouterClient, "chat_completion", return_value={"choices": []}) as send:
+                client.chat_completion(messages=self.messages, temperature=0, cache=False)
+            self.assertNotIn("cache", send.call_args.kwargs)
+        finally:
+            LLMProviderFactory._shared.clear()
+
+
+def contents_of(responses):
+    return [response["choices"][0]["message"]["content"] for response in responses]
+
+
+class BlockingClient(LLMClient):
+    def __init__(self, error: Exception | None = None):
+        self.calls = 0
+        self.error = error
+        self.release = threading.Event()
+
+    def chat_completion(self, **kwargs):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return fake_completion(kwargs["messages"][0]["content"])
+
+    async def achat_completion(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        if self.error is not None:
+            raise self.error
+        return fake_completion(kwargs["messages"][0]["content"])
+
+
+class CoalescingLLMClientTests(SimpleTestCase):
+    def ask(self, client, content="hi"):
+        return client.chat_completion(messages=[{"role": "user", "content": content}])
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        client = BlockingClient()
+        coalescing = CoalescingLLMClient(client)
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(self.ask, coalescing) for _ in range(4)]
+            futures.append(pool.submit(self.ask, coalescing, "other"))
+            time.sleep(0.2)
+            client.release.set()
+            responses = [future.result() for future in futures]
+
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(contents_of(responses), ["hi", "hi", "hi", "hi", "other"])
+        self.assertIsNot(responses[0], responses[1])
+        self.assertEqual(coalescing._calls, {})
+
+    def test_waiting_requests_receive_the_error(self):
+        client = BlockingClient(error=LLMRateLimitError("slow down"))
+        coalescing = CoalescingLLMClient(client)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(self.ask, coalescing) for _ in range(3)]
+            time.sleep(0.2)
+            client.release.set()
+            for future in futures:
+                with self.assertRaises(LLMRateLimitError):
+                    future.result()
+        self.assertEqual(client.calls, 1)
+
+    async def test_async_requests_share_one_call(self):
+        client = BlockingClient()
+        coalescing = CoalescingLLMClient(client)
+        messages = [{"role": "user", "content": "hi"}]
+
+        first = asyncio.create_task(coalescing.achat_completion(messages=messages))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(coalescing.achat_completion(messages=messages))
+        await asyncio.sleep(0)
+        # A caller giving up doesn't cancel the request of the others
+        first.cancel()
+        response = await second
+
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(contents_of([response]), ["hi"])
+        responses = await asyncio.gather(
+            coalescing.achat_completion(messages=messages),
+            coalescing.achat_completion(messages=messages, temperature=0),
+        )
+        self.assertEqual(client.calls, 3)
+        self.assertEqual(len(responses), 2)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_buckets_space_requests_and_tokens(self):
+        limiter = RateLimiter("test", requests_per_minute=120, tokens_per_minute=600)
+        self.assertEqual(limiter.reserve(100), 0)
+        self.assertEqual(limiter.reserve(100), 0)
+        # 100 tokens short, refilled at 10 per second
+        self.assertAlmostEqual(limiter.reserve(500), 10, delta=0.1)
+
+        limiter = RateLimiter("test", requests_per_minute=60)
+        for _ in range(60):
+            limiter.reserve(0)
+        self.assertAlmostEqual(limiter.reserve(0), 1, delta=0.1)
+
+    def test_rate_limit_errors_pause_and_slow_down(self):
+        limiter = RateLimiter("test", requests_per_minute=600)
+        limiter.on_rate_limited({"Retry-After": "2"}, default=1)
+        self.assertEqual(limiter.rate_factor, 0.5)
+        self.assertAlmostEqual(limiter.reserve(0), 2, delta=0.1)
+
+        limiter.on_response({})
+        self.assertEqual(limiter.rate_factor, 0.55)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after({"Retry-After": "3"}), 3)
+        self.assertAlmostEqual(
+            parse_retry_after({"Retry-After": email.utils.formatdate(time.time() + 60, usegmt=True)}),
+            60,
+            delta=2,
+        )
+        reset = str(int((time.time() + 10) * 1000))
+        self.assertAlmostEqual(
+            parse_retry_after({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset}), 10, delta=1
+        )
+        self.assertIsNone(parse_retry_after({"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": reset}))
+        self.assertIsNone(parse_retry_after(None))
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=1)
+    async def test_client_waits_for_retry_after(self):
+        server = FakeOpenRouterServer()
+        await server.start()
+        client = OpenRouterClient(endpoint=server.endpoint)
+        server.replies.append(FakeReply(status=429, json={}, headers={"Retry-After": "0.3"}))
+        try:
+            result = await client.achat_completion(messages=[{"role": "user", "content": "hi"}])
+        finally:
+            await client.aclose()
+            await server.stop()
+        self.assertIn("choices", result)
+        self.assertGreaterEqual(server.requests[1].received_at - server.requests[0].received_at, 0.3)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def fail(self, breaker, error):
+        breaker.record(error, probe=breaker.before_request())
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+        self.fail(breaker, LLMTimeoutError("timed out"))
+        self.fail(breaker, LLMProviderError("bad request", status_code=400))
+        self.fail(breaker, LLMRateLimitError("slow down"))
+        self.fail(breaker, LLMProviderError("bad gateway", status_code=502))
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        self.fail(breaker, LLMTimeoutError("timed out"))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaisesMessage(LLMProviderError, "failing fast"):
+            breaker.before_request()
+
+    def test_single_probe_closes_or_reopens(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        self.fail(breaker, LLMTimeoutError("timed out"))
+
+        self.assertTrue(breaker.before_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(LLMProviderError):
+            breaker.before_request()
+        breaker.record(LLMTimeoutError("timed out"), probe=True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        self.assertTrue(breaker.before_request())
+        breaker.record(probe=True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_requests_sent_before_opening_dont_decide_the_probe(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        self.assertFalse(breaker.before_request())
+        self.fail(breaker, LLMTimeoutError("timed out"))
+        self.assertTrue(breaker.before_request())
+
+        # The request sent while closed finishes during the probe
+        breaker.record()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(LLMProviderError):
+            breaker.before_request()
+
+        breaker.record(LLMTimeoutError("timed out"), probe=True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0)
+    def test_client_fails_fast_while_open(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+        client = OpenRouterClient(circuit_breaker=breaker)
+        with patch("urllib.request.urlopen", side_effect=TimeoutError) as mocked_urlopen:
+            with self.assertRaises(LLMTimeoutError):
+                client.chat_completion(messages=[{"role": "user", "content": "hi"}])
+            with self.assertRaisesMessage(LLMProviderError, "failing fast"):
+                client.chat_completion(messages=[{"role": "user", "content": "hi"}])
+        self.assertEqual(mocked_urlopen.call_count, 1)
+
+
+class SlowClient(LLMClient):
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def chat_completion(self, **kwargs):
+        content = kwargs["messages"][0]["content"]
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(float(content))
+            if content == "0.02":
+                raise LLMProviderError("boom", status_code=500)
+            return fake_completion(content)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def batch(*delays):
+    return [{"messages": [{"role": "user", "content": str(delay)}]} for delay in delays]
+
+
+class BatchTests(SimpleTestCase):
+    def test_default_batch_runs_requests_in_threads(self):
+        client = SlowClient()
+        progress = []
+        results = client.chat_completion_many(
+            batch(0.05, 0.02, 0.01, 0.5, 0.03),
+            concurrency=2,
+            timeout=0.2,
+            progress=lambda finished, total: progress.append((finished, total)),
+        )
+
+        self.assertEqual(client.max_in_flight, 2)
+        self.assertEqual(contents_of([results[0].response, results[2].response, results[4].response]), ["0.05", "0.01", "0.03"])
+        self.assertIsInstance(results[1].error, LLMProviderError)
+        self.assertIsInstance(results[3].error, LLMTimeoutError)
+        self.assertEqual([result.ok for result in results], [True, False, True, False, True])
+        self.assertEqual(progress, [(i, 5) for i in range(1, 6)])
+
+    def test_empty_batch(self):
+        self.assertEqual(SlowClient().chat_completion_many([]), [])
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0)
+    async def test_openrouter_batch_uses_the_pool(self):
+        server = FakeOpenRouterServer(latency=0.05)
+        await server.start()
+        client = OpenRouterClient(endpoint=server.endpoint)
+        server.replies += [FakeReply(), FakeReply(status=500, json={"error": "boom"})]
+        try:
+            results = await client.achat_completion_many(batch(*range(8)), concurrency=3)
+        finally:
+            await client.aclose()
+            await server.stop()
+
+        self.assertEqual(server.max_in_flight, 3)
+        self.assertLessEqual(server.connections, 3)
+        self.assertEqual(sum(not result.ok for result in results), 1)
+        self.assertTrue(all(isinstance(result, BatchResult) for result in results))
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0)
+    def test_sync_openrouter_batch_runs_on_its_own_loop(self):
+        server = FakeOpenRouterServer(latency=0.05)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+            client = OpenRouterClient(endpoint=server.endpoint)
+            results = client.chat_completion_many(batch(*range(6)), concurrency=3)
+            asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertCountEqual([request.payload["messages"][0]["content"] for request in server.requests], [str(i) for i in range(6)])
+        self.assertEqual(len(client._sessions), 0)
+
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0)
+    def test_openrouter_closes_sessions_of_other_loops(self):
+        server = FakeOpenRouterServer()
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+            client = OpenRouterClient(endpoint=server.endpoint)
+            messages = [{"role": "user", "content": "hi"}]
+
+            asyncio.run(client.achat_completion(messages=messages))
+            [(first, _)] = client._sessions.values()
+            self.assertTrue(first.closed)
+            asyncio.run(client.achat_completion(messages=messages))
+            self.assertEqual(len(client._sessions), 1)
+
+            # Used by a loop of another thread, closed in that loop
+            asyncio.run_coroutine_threadsafe(client.achat_completion(messages=messages), loop).result()
+            sessions = [session for session, _ in client._sessions.values()]
+            asyncio.run(client.aclose())
+            asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+        self.assertTrue(all(session.closed for session in sessions))
+        self.assertEqual(len(client._sessions), 0)
+
+
+class ScriptedClient(LLMClient):
+    """Answers per model after a delay, or raises the scripted error."""
+
+    def __init__(self, script):
+        self.script = script
+        self.started = []
+        self.cancelled = []
+
+    def chat_completion(self, *, model=None, **kwargs):
+        self.started.append(model)
+        delay, error = self.script[model]
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return fake_completion(model)
+
+    async def achat_completion(self, *, model=None, **kwargs):
+        self.started.append(model)
+        delay, error = self.script[model]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if error is not None:
+            raise error
+        return fake_completion(model)
+
+    def stream_chat_completion(self, *, model=None, **kwargs):
+        self.started.append(model)
+        _, error = self.script[model]
+        if error is not None:
+            raise error
+        yield {"model": model, "chunk": 1}
+        yield {"model": model, "chunk": 2}
+
+    async def astream_chat_completion(self, *, model=None, **kwargs):
+        for event in self.stream_chat_completion(model=model, **kwargs):
+            yield event
+
+
+class HedgedLLMClientTests(SimpleTestCase):
+    messages = [{"role": "user", "content": "hi"}]
+
+    def hedged(self, script, **options):
+        client = ScriptedClient(script)
+        targets = [Target.parse(f"fake:{model}") for model in script]
+        return client, HedgedLLMClient(targets, client_for=lambda provider: client, **options)
+
+    async def test_slow_target_is_hedged_and_cancelled(self):
+        client, hedged = self.hedged({"slow": (1, None), "fast": (0.01, None)}, default_delay=0.05)
+        response = await hedged.achat_completion(messages=self.messages)
+
+        self.assertEqual(contents_of([response]), ["fast"])
+        self.assertEqual(client.started, ["slow", "fast"])
+        self.assertEqual(client.cancelled, ["slow"])
+
+    async def test_fast_target_is_not_hedged(self):
+        client, hedged = self.hedged({"a": (0.01, None), "b": (0.01, None)}, default_delay=0.5)
+        response = await hedged.achat_completion(messages=self.messages)
+        self.assertEqual(contents_of([response]), ["a"])
+        self.assertEqual(client.started, ["a"])
+
+    async def test_streams_fail_over_before_the_first_chunk(self):
+        script = {"down": (0, LLMProviderError("bad gateway", status_code=502)), "up": (0, None)}
+        client, hedged = self.hedged(script)
+        events = list(hedged.stream_chat_completion(messages=self.messages))
+        self.assertEqual([(event["model"], event["chunk"]) for event in events], [("up", 1), ("up", 2)])
+
+        events = [event async for event in hedged.astream_chat_completion(messages=self.messages)]
+        self.assertEqual(len(events), 2)
+        self.assertEqual(client.started, ["down", "up", "down", "up"])
+
+        client, hedged = self.hedged({"down": script["down"]})
+        with self.assertRaises(LLMProviderError):
+            list(hedged.stream_chat_completion(messages=self.messages))
+
+    async def test_fails_over_on_provider_errors(self):
+        client, hedged = self.hedged(
+            {
+                "down": (0, LLMProviderError("bad gateway", status_code=502)),
+                "timeout": (0, LLMTimeoutError("timed out")),
+                "up": (0, None),
+            },
+            default_delay=5,
+        )
+        response = await hedged.achat_completion(messages=self.messages)
+        self.assertEqual(contents_of([response]), ["up"])
+
+        _, hedged = self.hedged({"limited": (0, LLMRateLimitError("slow down")), "up": (0, None)})
+        with self.assertRaises(LLMRateLimitError):
+            await hedged.achat_completion(messages=self.messages)
+
+        _, hedged = self.hedged({"a": (0, LLMTimeoutError("a")), "b": (0, LLMProviderError("b"))})
+        with self.assertRaisesMessage(LLMProviderError, "b"):
+            await hedged.achat_completion(messages=self.messages)
+
+    def test_sync_requests_are_hedged(self):
+        client, hedged = self.hedged({"slow": (0.5, None), "fast": (0.01, None)}, default_delay=0.05)
+        started_at = time.perf_counter()
+        response = hedged.chat_completion(messages=self.messages)
+
+        self.assertEqual(contents_of([response]), ["fast"])
+        self.assertLess(time.perf_counter() - started_at, 0.4)
+
+    async def test_latencies_of_losing_requests_are_recorded(self):
+        _, hedged = self.hedged({"slow": (1, None), "fast": (0.01, None)}, default_delay=0.05)
+        slow, fast = hedged.targets
+        await hedged.achat_completion(messages=self.messages)
+        [cancelled_at] = hedged.latencies[slow]._samples
+        self.assertGreaterEqual(cancelled_at, 0.05)
+        # A hedge losing before its own delay has no bound worth keeping
+        self.assertEqual(len(hedged.latencies[fast]._samples), 1)
+
+    def test_sync_losers_record_their_latency_once_finished(self):
+        _, hedged = self.hedged({"slow": (0.2, None), "fast": (0.01, None)}, default_delay=0.05)
+        slow, _ = hedged.targets
+        hedged.chat_completion(messages=self.messages)
+        self.assertEqual(len(hedged.latencies[slow]._samples), 0)
+
+        executor = hedged._executor
+        asyncio.run(hedged.aclose())
+        self.assertIsNone(hedged._executor)
+        executor.shutdown(wait=True)
+        [finished_at] = hedged.latencies[slow]._samples
+        self.assertGreaterEqual(finished_at, 0.2)
+
+    def test_hedge_delay_follows_latency_percentile(self):
+        _, hedged = self.hedged({"a": (0, None), "b": (0, None)}, percentile=0.9, default_delay=3)
+        target = hedged.targets[0]
+        self.assertEqual(hedged.hedge_delay(target), 3)
+        for latency in range(1, 101):
+            hedged.latencies[target].add(latency / 100)
+        self.assertEqual(hedged.hedge_delay(target), 0.9)
+
+    @override_settings(OPENROUTER_API_KEY="test-key", LLM_HEDGE_TARGETS=["openrouter:a/b:free", "openrouter:c/d"])
+    def test_factory_builds_hedged_client(self):
+        client = LLMProviderFactory.create("hedged")
+        self.assertEqual(client.targets, [Target("openrouter", "a/b:free"), Target("openrouter", "c/d")])
+        self.assertEqual(list(client.clients), ["openrouter"])
+        with self.assertRaises(ValueError):
+            Target.parse("openrouter")
+
+
+class UsageClient(LLMClient):
+    def chat_completion(self, *, model=None, **kwargs):
+        return fake_completion(model=model or "fake/model", usage={"prompt_tokens": 30, "completion_tokens": 20})
+
+    def stream_chat_completion(self, **kwargs):
+        yield {"model": "fake/model", "choices": [{"delta": {"content": "o"}}]}
+        yield {"model": "fake/model", "choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}}
+
+
+@override_settings(LLM_USER_DAILY_TOKEN_QUOTA=0, LLM_USAGE_FLUSH_SIZE=100, LLM_USAGE_FLUSH_INTERVAL_SECONDS=3600)
+class UsageTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="gardener")
+        self.tracker = UsageTracker()
+        self.client_ = UsageLLMClient(UsageClient(), tracker=self.tracker)
+
+    def ask(self, **kwargs):
+        return self.client_.chat_completion(messages=[{"role": "user", "content": "hi"}], **kwargs)
+
+    def test_usage_is_summed_and_written_in_one_batch(self):
+        with usage_for(self.user.pk):
+            self.ask()
+            self.ask()
+            self.ask(model="other/model")
+            list(self.client_.stream_chat_completion(messages=[]))
+        # Requests without a user are not recorded
+        self.ask()
+        self.assertFalse(LLMUsage.objects.exists())
+
+        with self.assertNumQueries(5):
+            self.assertEqual(self.tracker.flush(), 2)
+        self.assertEqual(self.tracker.flush(), 0)
+
+        usage = LLMUsage.objects.get(user=self.user, model="fake/model")
+        self.assertEqual((usage.requests, usage.prompt_tokens, usage.completion_tokens), (3, 63, 42))
+        self.assertEqual(usage.day, timezone.localdate())
+        self.assertEqual(LLMUsage.objects.get(model="other/model").total_tokens, 50)
+
+        with usage_for(self.user.pk):
+            self.ask()
+        self.tracker.flush()
+        self.assertEqual(LLMUsage.objects.get(user=self.user, model="fake/model").requests, 4)
+
+    def test_flush_is_due_after_size_or_interval(self):
+        with self.settings(LLM_USAGE_FLUSH_SIZE=2):
+            self.assertFalse(self.tracker.record(self.user.pk, "a", 1, 1, 0.1))
+            self.assertTrue(self.tracker.record(self.user.pk, "b", 1, 1, 0.1))
+        with self.settings(LLM_USAGE_FLUSH_INTERVAL_SECONDS=0):
+            with usage_for(self.user.pk):
+                self.ask()
+        self.assertEqual(LLMUsage.objects.count(), 3)
+
+    def test_idle_tracker_flushes_on_the_interval(self):
+        flushed = threading.Event()
+        with self.settings(LLM_USAGE_FLUSH_INTERVAL_SECONDS=0.05), patch.object(self.tracker, "_flush_and_close", side_effect=flushed.set):
+            self.assertFalse(self.tracker.record(self.user.pk, "fake/model", 1, 1, 0.1))
+            # No other request comes to flush
+            self.assertTrue(flushed.wait(5))
+            self.tracker.clear()
+
+    def test_quota_counts_saved_and_pending_tokens(self):
+        LLMUsage.objects.create(user=self.user, day=timezone.localdate(), model="fake/model", prompt_tokens=60)
+        with self.settings(LLM_USER_DAILY_TOKEN_QUOTA=150), usage_for(self.user.pk):
+            self.ask()
+            self.assertEqual(self.tracker.tokens_used(self.user.pk), 110)
+            self.tracker.flush()
+            self.assertEqual(self.tracker.tokens_used(self.user.pk), 110)
+            self.ask()
+            with self.assertRaises(LLMQuotaExceededError):
+                self.ask()
+
+    def test_coalesced_requests_are_checked_and_charged_per_user(self):
+        neighbour = get_user_model().objects.create_user(username="neighbour")
+        for user in (self.user, neighbour):
+            self.tracker.used.set((user.pk, timezone.localdate()), 0)
+        self.tracker.record(self.user.pk, "fake/model", 60, 0, 0)
+        upstream = BlockingClient()
+        client = UsageLLMClient(CoalescingLLMClient(upstream), tracker=self.tracker)
+
+        def ask(user_id):
+            with usage_for(user_id):
+                return client.chat_completion(messages=[{"role": "user", "content": "hi"}])
+
+        with self.settings(LLM_USER_DAILY_TOKEN_QUOTA=50), ThreadPoolExecutor(max_workers=3) as pool:
+            over_quota = pool.submit(ask, self.user.pk)
+            futures = [pool.submit(ask, neighbour.pk) for _ in range(2)]
+            time.sleep(0.2)
+            upstream.release.set()
+            with self.assertRaises(LLMQuotaExceededError):
+                over_quota.result()
+            self.assertEqual(contents_of([future.result() for future in futures]), ["hi", "hi"])
+
+        self.assertEqual(upstream.calls, 1)
+        self.assertEqual(self.tracker.tokens_used(neighbour.pk), 30)
+        self.assertEqual(self.tracker.tokens_used(self.user.pk), 60)
+
+    async def test_async_requests_check_quota(self):
+        with self.settings(LLM_USER_DAILY_TOKEN_QUOTA=50), usage_for(self.user.pk):
+            await self.client_.achat_completion(messages=[])
+            with self.assertRaises(LLMQuotaExceededError):
+                await self.client_.achat_completion(messages=[])
+
+    @override_settings(
+        STORAGES={"staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+    )
+    def test_admin_shows_usage_summary(self):
+        other = get_user_model().objects.create_user(username="farmer")
+        today = timezone.localdate()
+        LLMUsage.objects.create(user=self.user, day=today, model="a", requests=2, prompt_tokens=10, completion_tokens=5)
+        LLMUsage.objects.create(user=other, day=today, model="a", requests=1, prompt_tokens=100, completion_tokens=50)
+        admin_user = get_user_model().objects.create_superuser(username="admin")
+        self.client.force_login(admin_user)
+
+        response = self.client.get(reverse("admin:llm_llmusage_changelist"))
+
+        self.assertEqual(response.status_code, 200)
+        changelist = response.context["cl"]
+        self.assertEqual(changelist.usage_totals["total_tokens"], 165)
+        self.assertEqual(changelist.usage_totals["users"], 2)
+        self.assertEqual([row["user__username"] for row in changelist.top_users], ["farmer", "gardener"])
+        self.assertContains(response, "<td>165</td>", html=True)
+
+
+@override_settings(LLM_USER_DAILY_TOKEN_QUOTA=1000, LLM_USAGE_FLUSH_SIZE=100, LLM_USAGE_FLUSH_INTERVAL_SECONDS=0)
+class UsageFromEventLoopTests(TransactionTestCase):
+    def test_sync_requests_use_the_database_off_the_loop(self):
+        user = get_user_model().objects.create_user(username="gardener")
+        client = UsageLLMClient(UsageClient(), tracker=UsageTracker())
+
+        async def ask():
+            with usage_for(user.pk):
+                return client.chat_completion(messages=[])
+
+        # The quota is loaded and the usage flushed without SynchronousOnlyOperation
+        asyncio.run(ask())
+        self.assertEqual(LLMUsage.objects.get(user=user).total_tokens, 50)
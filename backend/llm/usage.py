@@ -0,0 +1,382 @@
+"""
+Accounting of LLM usage per user.
+
+Callers name the user of their requests with `usage_for(user_id)`.
+`UsageLLMClient` records the tokens and latency of each request it sends in
+`usage_tracker`, which sums them in memory per user, day and model and adds
+the sums to `LLMUsage` rows in batches. Requests of a user who has used up
+`LLM_USER_DAILY_TOKEN_QUOTA` tokens today fail with `LLMQuotaExceededError`
+before they are sent.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, TypeVar
+
+from core.caching import TTLCache
+from core.db import db_executor
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from llm.errors import LLMQuotaExceededError
+from llm.interfaces import LLMClient
+from llm.metrics import llm_quota_rejections_total, llm_tokens_total
+from llm.models import LLMUsage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Users whose tokens used today are cached, and for how long, so that usage
+# flushed by other workers counts after at most this delay
+USED_CACHE_SIZE = 10000
+USED_CACHE_TTL = 60
+
+_user_id: ContextVar[int | None] = ContextVar("llm_usage_user_id", default=None)
+
+
+@contextmanager
+def usage_for(user_id: int | None) -> Iterator[None]:
+    """Charge LLM requests made in the block to the user."""
+    token = _user_id.set(user_id)
+    try:
+        yield
+    finally:
+        _user_id.reset(token)
+
+
+@dataclass
+class Usage:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_seconds: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def extract_usage(response: dict[str, Any] | None) -> tuple[int, int]:
+    """Prompt and completion tokens reported in a response or stream chunk."""
+    usage = (response or {}).get("usage") or {}
+    return int(usage.get("prompt_tokens") or 0), int(
+        usage.get("completion_tokens") or 0
+    )
+
+
+def _run_off_loop(func: Callable[..., T], *args: Any) -> T:
+    """
+    Call `func`, which uses the ORM, for a sync request. On another thread if
+    an event loop runs on this one, where Django refuses ORM calls.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return func(*args)
+
+    def call():
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(1, thread_name_prefix="llm-usage") as executor:
+        return executor.submit(call).result()
+
+
+class UsageTracker:
+    """
+    Sums LLM usage in memory and writes it behind, every
+    `LLM_USAGE_FLUSH_INTERVAL_SECONDS` or `LLM_USAGE_FLUSH_SIZE` sums. Until
+    `shutdown`, a daemon thread started with the first usage recorded also
+    flushes on the interval, when no request comes to do it.
+
+    Quotas count the tokens in the database, cached for a minute, and those
+    not written yet. Requests running at the same time may all pass the
+    check, so a user can go over the quota by the size of those requests.
+    """
+
+    def __init__(self):
+        self._pending: dict[tuple[int, date, str], Usage] = {}
+        # Tokens not in the database yet, per user and day
+        self._unsaved: dict[tuple[int, date], int] = {}
+        self._used: TTLCache | None = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Set to stop the thread flushing periodically
+        self._stop_flushing: threading.Event | None = None
+
+    @property
+    def used(self) -> TTLCache:
+        if self._used is None:
+            self._used = TTLCache(maxsize=USED_CACHE_SIZE, ttl=USED_CACHE_TTL)
+        return self._used
+
+    def record(
+        self,
+        user_id: int | None,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_seconds: float,
+    ) -> bool:
+        """Add the usage of a request. True once a flush is due."""
+        llm_tokens_total.inc(model, "prompt", amount=prompt_tokens)
+        llm_tokens_total.inc(model, "completion", amount=completion_tokens)
+        if user_id is None:
+            return False
+
+        day = timezone.localdate()
+        with self._lock:
+            usage = self._pending.setdefault((user_id, day, model), Usage())
+            usage.requests += 1
+            usage.prompt_tokens += prompt_tokens
+            usage.completion_tokens += completion_tokens
+            usage.latency_seconds += latency_seconds
+            self._unsaved[user_id, day] = (
+                self._unsaved.get((user_id, day), 0) + prompt_tokens + completion_tokens
+            )
+            if self._stop_flushing is None:
+                self._stop_flushing = threading.Event()
+                threading.Thread(
+                    target=self._flush_periodically,
+                    args=(self._stop_flushing,),
+                    name="llm-usage-flush",
+                    daemon=True,
+                ).start()
+            return (
+                len(self._pending) >= settings.LLM_USAGE_FLUSH_SIZE
+                or time.monotonic() - self._last_flush
+                >= settings.LLM_USAGE_FLUSH_INTERVAL_SECONDS
+            )
+
+    def _flush_periodically(self, stop: threading.Event):
+        interval = settings.LLM_USAGE_FLUSH_INTERVAL_SECONDS
+        if interval <= 0:
+            # Each request flushes
+            return
+        while not stop.wait(interval):
+            if time.monotonic() - self._last_flush >= interval:
+                try:
+                    self._flush_and_close()
+                except Exception:
+                    logger.exception("Failed to save LLM usage")
+
+    def _load_used(self, user_id: int, day: date) -> int:
+        saved = LLMUsage.objects.filter(user_id=user_id, day=day).aggregate(
+            tokens=Sum(F("prompt_tokens") + F("completion_tokens"))
+        )["tokens"]
+        self.used.set((user_id, day), saved or 0)
+        return saved or 0
+
+    def tokens_used(self, user_id: int, day: date | None = None) -> int:
+        """Tokens the user has used on `day`, today by default."""
+        day = day or timezone.localdate()
+        saved = self.used.get((user_id, day))
+        if saved is None:
+            saved = _run_off_loop(self._load_used, user_id, day)
+        with self._lock:
+            return saved + self._unsaved.get((user_id, day), 0)
+
+    @staticmethod
+    def _quota_applies(user_id: int | None) -> bool:
+        return user_id is not None and settings.LLM_USER_DAILY_TOKEN_QUOTA > 0
+
+    def check_quota(self, user_id: int | None):
+        if not self._quota_applies(user_id):
+            return
+        quota = settings.LLM_USER_DAILY_TOKEN_QUOTA
+        if self.tokens_used(user_id) >= quota:
+            llm_quota_rejections_total.inc()
+            raise LLMQuotaExceededError(
+                f"User {user_id} has used up the daily quota of {quota} LLM tokens"
+            )
+
+    async def acheck_quota(self, user_id: int | None):
+        if not self._quota_applies(user_id):
+            return
+        day = timezone.localdate()
+        if self.used.get((user_id, day)) is None:
+            await db_executor.run(self._load_used, user_id, day)
+        self.check_quota(user_id)
+
+    def flush(self) -> int:
+        """Add the pending sums to the database. Returns the rows written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._last_flush = time.monotonic()
+            if not pending:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    LLMUsage.objects.bulk_create(
+                        [
+                            LLMUsage(user_id=user_id, day=day, model=model)
+                            for user_id, day, model in pending
+                        ],
+                        ignore_conflicts=True,
+                    )
+                    # Rows in a fixed order, so that workers don't deadlock
+                    for (user_id, day, model), usage in sorted(pending.items()):
+                        LLMUsage.objects.filter(
+                            user_id=user_id, day=day, model=model
+                        ).update(
+                            requests=F("requests") + usage.requests,
+                            prompt_tokens=F("prompt_tokens") + usage.prompt_tokens,
+                            completion_tokens=F("completion_tokens")
+                            + usage.completion_tokens,
+                            latency_seconds=F("latency_seconds")
+                            + usage.latency_seconds,
+                        )
+            except DatabaseError:
+                logger.exception("Failed to save LLM usage, retrying later")
+                with self._lock:
+                    for key, usage in pending.items():
+                        merged = self._pending.setdefault(key, Usage())
+                        merged.requests += usage.requests
+                        merged.prompt_tokens += usage.prompt_tokens
+                        merged.completion_tokens += usage.completion_tokens
+                        merged.latency_seconds += usage.latency_seconds
+                return 0
+
+            with self._lock:
+                for (user_id, day, _), usage in pending.items():
+                    key = (user_id, day)
+                    self._unsaved[key] -= usage.total_tokens
+                    if not self._unsaved[key]:
+                        del self._unsaved[key]
+                    saved = self.used.get(key)
+                    if saved is not None:
+                        self.used.set(key, saved + usage.total_tokens)
+            return len(pending)
+
+    def _flush_and_close(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def _stop_flushing_periodically(self):
+        with self._lock:
+            if self._stop_flushing is not None:
+                self._stop_flushing.set()
+                self._stop_flushing = None
+
+    async def shutdown(self):
+        """Stop the periodic flush and save pending usage on a thread of its own."""
+        self._stop_flushing_periodically()
+        await asyncio.to_thread(self._flush_and_close)
+
+    def clear(self):
+        self._stop_flushing_periodically()
+        with self._lock:
+            self._pending.clear()
+            self._unsaved.clear()
+            self._used = None
+
+
+usage_tracker = UsageTracker()
+
+
+class UsageLLMClient(LLMClient):
+    """Records the usage of the requests of a client and enforces quotas."""
+
+    def __init__(self, client: LLMClient, tracker: UsageTracker | None = None):
+        self.client = client
+        self.tracker = tracker or usage_tracker
+        self.default_model = getattr(client, "default_model", None)
+
+    def _model(self, response: dict[str, Any] | None, requested: str | None) -> str:
+        return (response or {}).get("model") or requested or self.default_model or "-"
+
+    def chat_completion(self, **kwargs: Any) -> dict[str, Any]:
+        user_id = _user_id.get()
+        self.tracker.check_quota(user_id)
+
+        start = time.perf_counter()
+        response = self.client.chat_completion(**kwargs)
+        if self.tracker.record(
+            user_id,
+            self._model(response, kwargs.get("model")),
+            *extract_usage(response),
+            time.perf_counter() - start,
+        ):
+            _run_off_loop(self.tracker.flush)
+        return response
+
+    async def achat_completion(self, **kwargs: Any) -> dict[str, Any]:
+        user_id = _user_id.get()
+        await self.tracker.acheck_quota(user_id)
+
+        start = time.perf_counter()
+        response = await self.client.achat_completion(**kwargs)
+        if self.tracker.record(
+            user_id,
+            self._model(response, kwargs.get("model")),
+            *extract_usage(response),
+            time.perf_counter() - start,
+        ):
+            await db_executor.run(self.tracker.flush)
+        return response
+
+    def stream_chat_completion(self, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        user_id = _user_id.get()
+        self.tracker.check_quota(user_id)
+
+        start = time.perf_counter()
+        # Usage comes with the last chunk
+        last = None
+        try:
+            for event in self.client.stream_chat_completion(**kwargs):
+                if last is None or event.get("usage"):
+                    last = event
+                yield event
+        finally:
+            if self.tracker.record(
+                user_id,
+                self._model(last, kwargs.get("model")),
+                *extract_usage(last),
+                time.perf_counter() - start,
+            ):
+                _run_off_loop(self.tracker.flush)
+
+    async def astream_chat_completion(
+        self, **kwargs: Any
+    ) -> AsyncIterator[dict[str, Any]]:
+        user_id = _user_id.get()
+        await self.tracker.acheck_quota(user_id)
+
+        start = time.perf_counter()
+        last = None
+        try:
+            async for event in self.client.astream_chat_completion(**kwargs):
+                if last is None or event.get("usage"):
+                    last = event
+                yield event
+        finally:
+            if self.tracker.record(
+                user_id,
+                self._model(last, kwargs.get("model")),
+                *extract_usage(last),
+                time.perf_counter() - start,
+            ):
+                await db_executor.run(self.tracker.flush)
+
+    def supports_tools(self) -> bool:
+        return self.client.supports_tools()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()